@@ -0,0 +1,78 @@
+"""
+特效识别基准：对比逐张调用与批量调用视觉模型的耗时、请求数与 token 消耗。
+
+用法：python -m benchmark.effects_batch --images 1 4 8 --latency 0.8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmark.fake_services import FakeLLMServer, configure_env
+
+SERVER = FakeLLMServer()
+
+
+def make_images(directory: str, count: int):
+    paths = []
+    rng = np.random.default_rng(0)
+    for index in range(count):
+        path = os.path.join(directory, f"{index}.jpg")
+        cv2.imwrite(path, rng.integers(0, 255, (1440, 1920, 3), dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+async def measure(func, paths):
+    requests, tokens = SERVER.requests, SERVER.prompt_tokens
+    start = time.perf_counter()
+    await func(paths)
+    return (
+        time.perf_counter() - start,
+        SERVER.requests - requests,
+        SERVER.prompt_tokens - tokens,
+    )
+
+
+async def bench(counts):
+    from kvidgen.core.agents.editor import ImageEffectsArtist
+
+    artist = ImageEffectsArtist()
+    print(
+        f"{'images':>7} {'mode':>10} {'seconds':>8} {'calls':>6} {'prompt_tokens':>14}"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = make_images(tmp_dir, max(counts))
+        for count in counts:
+            for mode, func in (
+                ("per-image", artist._run_each),
+                ("batched", artist.run_batch),
+            ):
+                seconds, calls, tokens = await measure(func, paths[:count])
+                print(f"{count:>7} {mode:>10} {seconds:>8.3f} {calls:>6} {tokens:>14}")
+
+
+async def run(args):
+    SERVER.latency = args.latency
+    SERVER.per_image_latency = args.per_image_latency
+    async with SERVER:
+        configure_env(OPENAI_GPT_BASE_URL=SERVER.api_base)
+        await bench(args.images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--per-image-latency", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""
+本地替身服务，供基准测试在离线环境下模拟外部依赖。
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import struct
+from typing import Optional
+
+from aiohttp import web
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, 单声道
+_MP3_FRAME_HEADER = struct.pack(">I", 0xFFFB90C4)
+_MP3_FRAME_SIZE = 417
+_MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def fake_mp3(duration: float) -> bytes:
+    """生成指定时长的静音 MP3 字节流。"""
+    frame = _MP3_FRAME_HEADER + b"\x00" * (_MP3_FRAME_SIZE - len(_MP3_FRAME_HEADER))
+    return frame * max(1, int(duration / _MP3_FRAME_SECONDS))
+
+
+def configure_env(**overrides: str) -> None:
+    """
+    为 kvidgen.core.config.Settings 填充必需的环境变量，需在导入 kvidgen 前调用。
+    """
+    defaults = {
+        "PROJECT_NAME": "kvidgen-benchmark",
+        "SERVER_NAME": "127.0.0.1",
+        "TTS_APPID": "fake",
+        "TTS_ACCESS_TOKEN": "fake",
+        "TTS_CLUSTER": "fake",
+        "BUCKET_NAME": "fake",
+        "ACCESS_KEY_ID": "fake",
+        "ACCESS_KEY_SECRET": "fake",
+        "ENDPOINT": "http://127.0.0.1:1",
+        "OPENAI_GPT_MODEL_NAME": "fake",
+        "OPENAI_GPT_BASE_URL": "http://127.0.0.1:1/v1",
+        "OPENAI_GPT_API_KEY": "fake",
+    }
+    defaults.update(overrides)
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+class FakeService:
+    """基于 aiohttp 的替身服务基类，监听本地随机端口。"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.app = web.Application()
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> "FakeService":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+class FakeTTSServer(FakeService):
+    """
+    模拟火山引擎 TTS HTTP 接口，按文本长度返回对应时长的静音 MP3。
+    :param latency: 每次请求的固定延迟（秒）。
+    :param chars_per_second: 语速，用于计算返回音频时长。
+    :param fail_every: 每 N 次请求失败一次（HTTP 返回 503，流式返回可重试的错误帧），
+        用于验证重试，0 表示不失败。
+    :param stream_frames: 流式接口将音频拆分发送的消息数。
+    :param stream_interval: 流式接口相邻两条音频消息的间隔（秒）。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        chars_per_second: float = 5.0,
+        fail_every: int = 0,
+        stream_frames: int = 10,
+        stream_interval: float = 0.05,
+    ):
+        super().__init__(latency)
+        self.chars_per_second = chars_per_second
+        self.fail_every = fail_every
+        self.stream_frames = stream_frames
+        self.stream_interval = stream_interval
+        self.app.router.add_post("/api/v1/tts", self.handle_tts)
+        self.app.router.add_get("/api/v1/tts/ws_binary", self.handle_tts_stream)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/api/v1/tts"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/api/v1/tts/ws_binary"
+
+    async def handle_tts_stream(self, request: web.Request) -> web.WebSocketResponse:
+        """按 WebSocket 二进制协议分块返回音频，最后一块序号取负。"""
+        self.requests += 1
+        seq = self.requests
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        message = await ws.receive_bytes()
+        header_size = (message[0] & 0x0F) * 4
+        payload = json.loads(gzip.decompress(message[header_size + 4 :]))
+        await asyncio.sleep(self.latency)
+        if self.fail_every and seq % self.fail_every == 0:
+            error = gzip.compress(json.dumps({"message": "busy"}).encode())
+            await ws.send_bytes(
+                bytes([0x11, 0xF0, 0x11, 0x00])
+                + (3031).to_bytes(4, "big")
+                + len(error).to_bytes(4, "big")
+                + error
+            )
+            await ws.close()
+            return ws
+
+        audio = fake_mp3(len(payload["request"]["text"]) / self.chars_per_second)
+        step = -(-len(audio) // self.stream_frames)
+        # 确认消息
+        await ws.send_bytes(bytes([0x11, 0xB0, 0x10, 0x00]))
+        for index, offset in enumerate(range(0, len(audio), step), start=1):
+            frame = audio[offset : offset + step]
+            sequence = -index if offset + step >= len(audio) else index
+            await ws.send_bytes(
+                bytes([0x11, 0xB1, 0x10, 0x00])
+                + sequence.to_bytes(4, "big", signed=True)
+                + len(frame).to_bytes(4, "big")
+                + frame
+            )
+            await asyncio.sleep(self.stream_interval)
+        await ws.close()
+        return ws
+
+    async def handle_tts(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        seq = self.requests
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        if self.fail_every and seq % self.fail_every == 0:
+            return web.json_response({"code": 3050, "message": "busy"}, status=503)
+        text = payload["request"]["text"]
+        audio = fake_mp3(len(text) / self.chars_per_second)
+        return web.json_response(
+            {
+                "reqid": payload["request"]["reqid"],
+                "code": 3000,
+                "message": "Success",
+                "data": base64.b64encode(audio).decode(),
+            }
+        )
+
+
+class FakeAssetServer(FakeService):
+    """
+    静态素材服务（图片、背景音乐），支持 Range 续传。
+    :param files: 文件名到内容的映射，通过 /assets/{name} 访问。
+    :param truncate_every: 每 N 次请求只返回一半内容后断开，用于验证续传，0 表示不断开。
+    """
+
+    def __init__(
+        self,
+        files: Optional[dict] = None,
+        latency: float = 0.0,
+        truncate_every: int = 0,
+    ):
+        super().__init__(latency)
+        self.files = files or {}
+        self.truncate_every = truncate_every
+        self.app.router.add_get("/assets/{name}", self.handle_asset)
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/assets/{name}"
+
+    async def handle_asset(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        seq = self.requests
+        await asyncio.sleep(self.latency)
+        content = self.files.get(request.match_info["name"])
+        if content is None:
+            raise web.HTTPNotFound()
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            raise web.HTTPNotModified(headers={"ETag": etag})
+
+        offset = 0
+        range_header = request.headers.get("Range", "")
+        if range_header.startswith("bytes="):
+            offset = int(range_header[6:].split("-")[0])
+            if offset >= len(content):
+                raise web.HTTPRequestRangeNotSatisfiable()
+        body = content[offset:]
+        response = web.StreamResponse(status=206 if offset else 200)
+        response.content_length = len(body)
+        response.headers["ETag"] = etag
+        if offset:
+            response.headers["Content-Range"] = (
+                f"bytes {offset}-{len(content) - 1}/{len(content)}"
+            )
+        await response.prepare(request)
+        if self.truncate_every and seq % self.truncate_every == 0:
+            await response.write(body[: len(body) // 2])
+            request.transport.close()
+            return response
+        await response.write(body)
+        await response.write_eof()
+        return response
+
+
+class FakeOSSServer(FakeService):
+    """
+    模拟 OSS 的对象上传接口（路径风格 /{bucket}/{key}），只记录大小与 ETag，不保存内容。
+    支持普通上传与分片上传（初始化、上传分片、列举分片、完成、取消）。
+    :param latency: 每次请求的固定延迟（秒）。
+    :param bandwidth: 单个连接的上传带宽（字节/秒），模拟上行链路，0 表示不限。
+    """
+
+    def __init__(self, latency: float = 0.05, bandwidth: float = 0.0):
+        super().__init__(latency)
+        self.bandwidth = bandwidth
+        self.objects: dict = {}
+        self.uploads: dict = {}
+        self.bytes_received = 0
+        self._upload_ids = 0
+        self.app.router.add_route("*", "/{bucket}/{key:.+}", self.handle_object)
+
+    async def _receive(self, request: web.Request) -> tuple:
+        """按带宽限制读取请求体，返回 (大小, MD5)。"""
+        size, digest = 0, hashlib.md5()
+        async for chunk in request.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            digest.update(chunk)
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+        self.bytes_received += size
+        return size, digest.hexdigest()
+
+    @staticmethod
+    def _xml(root: str, body: str) -> web.Response:
+        return web.Response(
+            text=f'<?xml version="1.0" encoding="UTF-8"?><{root}>{body}</{root}>',
+            content_type="application/xml",
+        )
+
+    async def handle_object(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        key = request.match_info["key"]
+        query = request.query
+        if request.method == "PUT" and "uploadId" in query:
+            upload = self.uploads.get(query["uploadId"])
+            if upload is None:
+                raise web.HTTPNotFound()
+            size, etag = await self._receive(request)
+            upload[int(query["partNumber"])] = (size, etag)
+            return web.Response(headers={"ETag": f'"{etag}"'})
+        if request.method == "PUT":
+            size, etag = await self._receive(request)
+            self.objects[key] = (size, etag)
+            return web.Response(headers={"ETag": f'"{etag}"'})
+        if request.method == "POST" and "uploads" in query:
+            self._upload_ids += 1
+            upload_id = f"upload-{self._upload_ids}"
+            self.uploads[upload_id] = {}
+            return self._xml(
+                "InitiateMultipartUploadResult",
+                f"<Key>{key}</Key><UploadId>{upload_id}</UploadId>",
+            )
+        if request.method == "POST" and "uploadId" in query:
+            await request.read()
+            parts = self.uploads.pop(query["uploadId"], None)
+            if parts is None:
+                raise web.HTTPNotFound()
+            size = sum(part_size for part_size, _ in parts.values())
+            self.objects[key] = (size, f"multipart-{len(parts)}")
+            return self._xml("CompleteMultipartUploadResult", f"<Key>{key}</Key>")
+        if request.method == "GET" and "uploadId" in query:
+            parts = self.uploads.get(query["uploadId"])
+            if parts is None:
+                raise web.HTTPNotFound()
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber>"
+                f"<LastModified>2024-01-01T00:00:00.000Z</LastModified>"
+                f'<ETag>"{etag}"</ETag><Size>{size}</Size></Part>'
+                for number, (size, etag) in sorted(parts.items())
+            )
+            return self._xml(
+                "ListPartsResult",
+                "<IsTruncated>false</IsTruncated>"
+                f"<NextPartNumberMarker>{max(parts, default=0)}</NextPartNumberMarker>"
+                f"{body}",
+            )
+        if request.method == "DELETE" and "uploadId" in query:
+            self.uploads.pop(query["uploadId"], None)
+            return web.Response(status=204)
+        raise web.HTTPMethodNotAllowed(request.method, ["PUT", "POST", "GET"])
+
+
+FAKE_STORY = (
+    "生命是如此脆弱，却又充满希望。小雨今年八岁，本该在校园里奔跑，"
+    "却因白血病住进了医院。每一次化疗，她都紧紧握着妈妈的手说：“我不怕。”"
+    "为了治疗，这个普通的家庭已经花光了所有积蓄，后续的骨髓移植还需要三十万元。"
+    "医生说，只要坚持治疗，小雨就有很大的希望康复。"
+    "您的每一份善意，都可能让这个孩子重新回到阳光下。请伸出援手，和我们一起守护她的明天。"
+)
+
+
+class FakeLLMServer(FakeService):
+    """
+    模拟 OpenAI 兼容的 /v1/chat/completions 接口。
+    含图片的请求返回特效 JSON（多图时返回批量格式），纯文本请求返回固定文案。
+    stream=true 时以 SSE 逐段返回，模拟逐 token 生成；请求 stream_options.include_usage 时
+    最后附带用量分块。
+    :param latency: 每次请求的基础延迟（秒），流式时为首个片段前的延迟。
+    :param per_image_latency: 每张图片额外增加的延迟（秒）。
+    :param stream_chunk_chars: 流式时每个片段的字符数。
+    :param stream_interval: 每生成一个片段的耗时（秒），非流式时按总片段数累计。
+    :param fail_every: 每 N 次请求返回一次 429，用于验证限流重试，0 表示不失败。
+    :param slow_every: 每 N 次请求额外延迟 slow_latency 秒，模拟长尾，0 表示关闭。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        per_image_latency: float = 0.1,
+        stream_chunk_chars: int = 4,
+        stream_interval: float = 0.02,
+        fail_every: int = 0,
+        slow_every: int = 0,
+        slow_latency: float = 5.0,
+    ):
+        super().__init__(latency)
+        self.per_image_latency = per_image_latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_interval = stream_interval
+        self.fail_every = fail_every
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.app.router.add_post("/v1/chat/completions", self.handle_chat)
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/v1"
+
+    @staticmethod
+    def _count(messages) -> tuple:
+        text_chars = 0
+        image_tokens = 0
+        images = 0
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                text_chars += len(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    images += 1
+                    detail = part["image_url"].get("detail", "auto")
+                    image_tokens += 85 if detail == "low" else 765
+                else:
+                    text_chars += len(part.get("text", ""))
+        # 中文文本约每 1.5 个字符一个 token
+        return images, int(text_chars / 1.5) + image_tokens
+
+    def _content(self, images: int) -> str:
+        if images == 0:
+            return FAKE_STORY
+        if images == 1:
+            return json.dumps({"effects": ["zoom", "fade_in"], "reason": "fake"})
+        return json.dumps(
+            {
+                "images": [
+                    {"index": i, "effects": ["zoom", "fade_in"], "reason": "fake"}
+                    for i in range(images)
+                ]
+            }
+        )
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        seq = self.requests
+        payload = await request.json()
+        if self.fail_every and seq % self.fail_every == 0:
+            return web.json_response(
+                {"error": {"message": "rate limited", "type": "rate_limit"}},
+                status=429,
+                headers={"Retry-After": "0.1"},
+            )
+        images, prompt_tokens = self._count(payload["messages"])
+        delay = self.latency + self.per_image_latency * images
+        if self.slow_every and seq % self.slow_every == 0:
+            delay += self.slow_latency
+        await asyncio.sleep(delay)
+        content = self._content(images)
+        completion_tokens = int(len(content) / 1.5)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if payload.get("stream"):
+            return await self._stream(request, payload, content, usage)
+        # 非流式同样需要等待全部 token 生成完毕
+        await asyncio.sleep(
+            len(content) // self.stream_chunk_chars * self.stream_interval
+        )
+        return web.json_response(
+            {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": payload.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    async def _stream(
+        self, request: web.Request, payload: dict, content: str, usage: dict
+    ) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish_reason: Optional[str] = None):
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": payload.get("model", "fake"),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({"role": "assistant", "content": ""})
+        for i in range(0, len(content), self.stream_chunk_chars):
+            await send({"content": content[i : i + self.stream_chunk_chars]})
+            await asyncio.sleep(self.stream_interval)
+        await send({}, "stop")
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": payload.get("model", "fake"),
+                "choices": [],
+                "usage": usage,
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
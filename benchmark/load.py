@@ -0,0 +1,395 @@
+"""
+端到端压测：启动大模型、语音合成、OSS 与素材替身服务，以子进程运行 uvicorn 服务并指向这些替身，
+按指定并发调用 /video/generate，输出吞吐量、延迟分位数与各步骤耗时分布。
+
+默认关闭结果、语音合成、特效决策与下载缓存，测量冷启动的完整管道；--warm-caches 保留服务配置。
+渲染与音视频合并需要本机安装 ffmpeg。
+
+用法：python -m benchmark.load -n 20 -c 4 --images 6 --llm-latency 0.5 --tts-latency 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import aiohttp
+import cv2
+import numpy as np
+
+from benchmark.fake_services import (
+    FakeAssetServer,
+    FakeLLMServer,
+    FakeOSSServer,
+    FakeTTSServer,
+    fake_mp3,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_image(index: int, width: int, height: int) -> bytes:
+    """生成各不相同的测试图片：随机色块叠加噪声，感知哈希互不相近。"""
+    rng = np.random.default_rng(index)
+    blocks = rng.integers(0, 255, (6, 8, 3), dtype=np.uint8)
+    image = cv2.resize(blocks, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.normal(0, 10, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def make_request(index: int, args, assets: FakeAssetServer) -> dict:
+    """第 index 个请求的参数，--distinct 个筹款活动循环使用，各活动的图片互不相同。"""
+    campaign = index % args.distinct
+    images = [
+        assets.url(f"{(campaign * args.images + i) % args.image_pool}.jpg")
+        for i in range(args.images)
+    ]
+    request = {
+        "patient_info": {
+            "fundraiser_name": "李女士",
+            "fundraiser_patient_relation": "母亲",
+            "patient_name": f"压测患者{campaign}",
+            "patient_age": 8,
+            "patient_gender": "女",
+            "illness_type": "急性淋巴细胞白血病",
+            "hospital_name": "市儿童医院",
+            "spent_amount": 120000,
+            "target_amount": 300000,
+        },
+        "fundraising_text": f"第 {campaign} 号筹款活动：孩子需要骨髓移植，恳请大家帮助。",
+        "image_urls": images,
+        "background_music_url": assets.url("music.mp3"),
+    }
+    if args.deadline:
+        request["deadline_seconds"] = args.deadline
+    return request
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * q) - 1)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(args, cache_dir: str, llm, tts, oss) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PROJECT_NAME": "kvidgen-benchmark",
+            "SERVER_NAME": "127.0.0.1",
+            "CACHE_DIR": cache_dir,
+            "OPENAI_GPT_MODEL_NAME": "fake",
+            "OPENAI_GPT_BASE_URL": llm.api_base,
+            "OPENAI_GPT_API_KEY": "fake",
+            "TTS_APPID": "fake",
+            "TTS_ACCESS_TOKEN": "fake",
+            "TTS_CLUSTER": "fake",
+            "TTS_API_URL": tts.api_url,
+            "TTS_WS_URL": tts.ws_url,
+            "ENDPOINT": oss.base_url,
+            "BUCKET_NAME": "kvidgen-benchmark",
+            "ACCESS_KEY_ID": "fake",
+            "ACCESS_KEY_SECRET": "fake",
+        }
+    )
+    if not args.warm_caches:
+        for name in (
+            "RESULT_CACHE_ENABLED",
+            "TTS_CACHE_ENABLED",
+            "IMAGE_EFFECTS_CACHE_ENABLED",
+            "DOWNLOAD_CACHE_ENABLED",
+        ):
+            env[name] = "false"
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                async with session.get(f"{url}/api/management/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s")
+
+
+async def send(session: aiohttp.ClientSession, url: str, payload: dict) -> dict:
+    start = time.perf_counter()
+    try:
+        async with session.post(
+            f"{url}/api/video/generate", params={"include_usage": "true"}, json=payload
+        ) as response:
+            text = await response.text()
+            status = response.status
+    except Exception as e:
+        return {
+            "status": None,
+            "latency": time.perf_counter() - start,
+            "error": repr(e),
+        }
+    result = {"status": status, "latency": time.perf_counter() - start}
+    try:
+        body = json.loads(text)
+    except ValueError:
+        body = {"message": f"{status} {text[:200]}"}
+    if status == 200:
+        result["usage"] = (body.get("metadata") or {}).get("usage", {})
+    else:
+        result["error"] = body.get("message") or json.dumps(body, ensure_ascii=False)
+    return result
+
+
+async def drive(url: str, args, assets: FakeAssetServer) -> tuple:
+    """闭环压测：concurrency 个客户端各自发完一个请求再发下一个。"""
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for index in range(args.warmup):
+            await send(session, url, make_request(args.requests + index, args, assets))
+
+        results = []
+        counter = iter(range(args.requests))
+
+        async def client():
+            for index in counter:
+                result = await send(session, url, make_request(index, args, assets))
+                results.append(result)
+                mark = "." if result["status"] == 200 else "x"
+                print(mark, end="", flush=True)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        print()
+    return results, elapsed
+
+
+def summarize(results: List[dict], elapsed: float, args, services: dict) -> dict:
+    succeeded = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in succeeded]
+    summary = {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(succeeded) / elapsed, 4) if elapsed else 0.0,
+        "errors": sorted({r["error"] for r in results if "error" in r})[:5],
+        "service_requests": {name: s.requests for name, s in services.items()},
+    }
+    if latencies:
+        summary["latency_seconds"] = {
+            "mean": round(statistics.mean(latencies), 3),
+            **{
+                f"p{int(q * 100)}": round(percentile(latencies, q), 3)
+                for q in (0.5, 0.9, 0.95, 0.99)
+            },
+            "max": round(max(latencies), 3),
+        }
+
+    breakdown = {}
+    for kind in ("queue", "step", "call"):
+        names = {
+            name for r in succeeded for name in r["usage"].get(f"{kind}_seconds", {})
+        }
+        for name in sorted(names):
+            values = [r["usage"][f"{kind}_seconds"].get(name, 0.0) for r in succeeded]
+            cpu = [r["usage"]["cpu_seconds_by_step"].get(name, 0.0) for r in succeeded]
+            breakdown[f"{kind}:{name}"] = {
+                "mean": round(statistics.mean(values), 3),
+                "p50": round(percentile(values, 0.5), 3),
+                "p95": round(percentile(values, 0.95), 3),
+                "cpu_mean": round(statistics.mean(cpu), 3) if kind == "step" else None,
+            }
+    summary["breakdown"] = breakdown
+
+    if succeeded:
+        usages = [r["usage"] for r in succeeded]
+        fps = [u["render_fps"] for u in usages if u.get("render_fps")]
+        summary["resources"] = {
+            "cpu_seconds_mean": round(
+                statistics.mean(u["cpu_seconds"] for u in usages), 3
+            ),
+            "peak_rss_bytes_max": max(u["peak_rss_bytes"] for u in usages),
+            "frames_rendered_mean": round(
+                statistics.mean(u["frames_rendered"] for u in usages)
+            ),
+            "render_fps_mean": round(statistics.mean(fps), 1) if fps else None,
+            "bytes_uploaded_mean": round(
+                statistics.mean(u["bytes_uploaded"] for u in usages)
+            ),
+            "llm_tokens_mean": round(
+                statistics.mean(
+                    u["llm_input_tokens"] + u["llm_output_tokens"] for u in usages
+                )
+            ),
+        }
+    return summary
+
+
+def print_summary(summary: dict, args) -> None:
+    print(
+        f"requests {summary['requests']}  concurrency {args.concurrency}  "
+        f"workers {args.workers}  succeeded {summary['succeeded']}  "
+        f"failed {summary['failed']}"
+    )
+    print(
+        f"elapsed {summary['elapsed_seconds']:.1f}s  "
+        f"throughput {summary['throughput_rps']:.3f} req/s "
+        f"({summary['throughput_rps'] * 60:.1f} videos/min)"
+    )
+    latency = summary.get("latency_seconds")
+    if latency:
+        print("latency(s) " + "  ".join(f"{k} {v:.2f}" for k, v in latency.items()))
+    if summary["breakdown"]:
+        print(
+            f"\n{'stage':<36} {'mean(s)':>8} {'p50(s)':>8} {'p95(s)':>8} {'cpu(s)':>8}"
+        )
+        for name, row in summary["breakdown"].items():
+            cpu = f"{row['cpu_mean']:>8.2f}" if row["cpu_mean"] is not None else ""
+            print(
+                f"{name:<36} {row['mean']:>8.2f} {row['p50']:>8.2f} "
+                f"{row['p95']:>8.2f} {cpu}"
+            )
+    if summary.get("resources"):
+        print(
+            "\nper request: "
+            + "  ".join(f"{k} {v}" for k, v in summary["resources"].items())
+        )
+    print(
+        "service requests: "
+        + "  ".join(f"{k} {v}" for k, v in summary["service_requests"].items())
+    )
+    for error in summary["errors"]:
+        print(f"error: {error}")
+
+
+async def run(args):
+    width, height = map(int, args.image_size.split("x"))
+    files = {f"{i}.jpg": make_image(i, width, height) for i in range(args.image_pool)}
+    files["music.mp3"] = fake_mp3(args.music_seconds)
+
+    llm = FakeLLMServer(latency=args.llm_latency)
+    tts = FakeTTSServer(latency=args.tts_latency)
+    oss = FakeOSSServer(latency=args.oss_latency, bandwidth=args.oss_bandwidth * 1e6)
+    assets = FakeAssetServer(files, latency=args.asset_latency)
+    services = {"llm": llm, "tts": tts, "oss": oss, "assets": assets}
+
+    async with llm, tts, oss, assets:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            log_path = args.server_log or os.path.join(tmp_dir, "server.log")
+            with open(log_path, "w") as log:
+                process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "uvicorn",
+                        "kvidgen.main:app",
+                        "--host",
+                        "127.0.0.1",
+                        "--port",
+                        str(port),
+                        "--workers",
+                        str(args.workers),
+                    ],
+                    cwd=ROOT,
+                    env=server_env(args, os.path.join(tmp_dir, "cache"), llm, tts, oss),
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                )
+                try:
+                    await wait_ready(url, process)
+                    results, elapsed = await drive(url, args, assets)
+                except BaseException:
+                    with open(log_path) as file:
+                        print(file.read()[-4000:], file=sys.stderr)
+                    raise
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+    summary = summarize(results, elapsed, args, services)
+    print_summary(summary, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(
+                {"args": vars(args), "summary": summary, "results": results},
+                file,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-n", "--requests", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 数")
+    parser.add_argument("--warmup", type=int, default=1, help="不计入结果的预热请求数")
+    parser.add_argument(
+        "--timeout", type=float, default=900.0, help="单个请求超时（秒）"
+    )
+    parser.add_argument("--images", type=int, default=6, help="每个请求的图片数")
+    parser.add_argument("--image-pool", type=int, default=48, help="不同图片的总数")
+    parser.add_argument("--image-size", default="1920x1440")
+    parser.add_argument("--music-seconds", type=float, default=120.0)
+    parser.add_argument(
+        "--distinct",
+        type=int,
+        default=1_000_000,
+        help="不同筹款活动数，小于请求数时相同请求会命中结果缓存或合并",
+    )
+    parser.add_argument("--deadline", type=float, help="请求的 deadline_seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--oss-latency", type=float, default=0.05)
+    parser.add_argument(
+        "--oss-bandwidth",
+        type=float,
+        default=0.0,
+        help="单连接上传带宽（MB/s），0 为不限",
+    )
+    parser.add_argument("--asset-latency", type=float, default=0.05)
+    parser.add_argument("--warm-caches", action="store_true", help="保留服务的缓存配置")
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="额外的服务配置，如 --env RENDER_PROFILE=720p，可重复",
+    )
+    parser.add_argument("--json", help="将参数、汇总与逐个请求的结果写入 JSON 文件")
+    parser.add_argument(
+        "--server-log", help="保留被测服务的日志文件，默认压测结束后删除"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
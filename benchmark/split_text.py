@@ -0,0 +1,90 @@
+"""
+文本分段基准：对比旧版逐字符切分与线性切分在长文本上的耗时与分段均衡度。
+分段有序、无损且不超过长度上限的性质由 tests/common_test.py 校验。
+
+用法：python -m benchmark.split_text --chars 10000 --max-len 280
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from kvidgen.utils.common import split_text
+
+_SENTENCES = [
+    "生命是如此脆弱，却又充满希望。",
+    "每周三次的透析治疗，已经耗尽了这个家庭所有的积蓄！",
+    "她说：“我想再陪孩子长大。”",
+    "Every donation, however small, brings her one step closer to recovery. ",
+    "医生告诉我们，只要坚持治疗，就还有机会",
+    "\n",
+]
+
+
+def legacy_split_text(text, max_len=280):
+    """重构前的实现，仅作对照。"""
+    if len(text) <= max_len:
+        return [text]
+    split_chars = ["\n\r", "\n", "。"]
+    result = []
+    current_paragraph = ""
+    for char in text:
+        current_paragraph += char
+        if len(current_paragraph) > max_len:
+            last_split_char_index = -1
+            for split_char in split_chars:
+                index = current_paragraph.rfind(split_char)
+                if index > last_split_char_index:
+                    last_split_char_index = index
+            if last_split_char_index != -1:
+                result.append(current_paragraph[: last_split_char_index + 1])
+                current_paragraph = current_paragraph[last_split_char_index + 1 :]
+            else:
+                result.append(current_paragraph[:max_len])
+                current_paragraph = current_paragraph[max_len:]
+    if current_paragraph:
+        result.append(current_paragraph)
+    return result
+
+
+def make_text(chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = rng.choice(_SENTENCES)
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def measure(func, text: str, max_len: int, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = func(text, max_len)
+    return (time.perf_counter() - start) / repeat, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, default=10000)
+    parser.add_argument("--max-len", type=int, default=280)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    text = make_text(args.chars, 0)
+    print(
+        f"{'impl':>8} {'ms/call':>10} {'chunks':>7} {'min':>5} {'max':>5} {'stdev':>7}"
+    )
+    for name, func in (("legacy", legacy_split_text), ("linear", split_text)):
+        elapsed, chunks = measure(func, text, args.max_len, args.repeat)
+        lengths = [len(chunk) for chunk in chunks]
+        print(
+            f"{name:>8} {elapsed * 1000:>10.2f} {len(chunks):>7} {min(lengths):>5} "
+            f"{max(lengths):>5} {statistics.pstdev(lengths):>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
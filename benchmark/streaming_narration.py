@@ -0,0 +1,93 @@
+"""
+流式解说基准：对比先生成完整文案再合成语音与边生成边按句合成的耗时。
+
+用法：python -m benchmark.streaming_narration --llm-interval 0.02 --tts-latency 0.3
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from benchmark.fake_services import FakeLLMServer, FakeTTSServer, configure_env
+
+LLM = FakeLLMServer()
+TTS = FakeTTSServer()
+
+
+async def measure(steps):
+    """返回 (首段音频就绪耗时, 总耗时, 分段数)。"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data = {
+            "tmp_dir": tmp_dir,
+            "patient_name": "bench",
+            "fundraiser_info": "",
+            "patient_info": "",
+            "story": "",
+        }
+        start = time.perf_counter()
+        first_audio = None
+
+        async def watch():
+            nonlocal first_audio
+            while "narration_duration" not in data:
+                await asyncio.sleep(0.005)
+            first_audio = time.perf_counter() - start
+
+        watcher = asyncio.ensure_future(watch())
+        for step in steps:
+            data = await step.process(data)
+        total = time.perf_counter() - start
+        watcher.cancel()
+        return first_audio or total, total, len(data["tts_chunks"])
+
+
+async def bench(rounds: int):
+    from kvidgen.core.pipline import (
+        StreamingNarrationStep,
+        TextGenerationStep,
+        TTSSynthesisStep,
+    )
+    from kvidgen.utils.http_client import HttpClientManager
+    from kvidgen.utils.tts_client import TTSClient
+
+    TTSClient().api_url = TTS.api_url
+    print(f"{'mode':>10} {'first_audio(s)':>15} {'total(s)':>9} {'chunks':>7}")
+    try:
+        for _ in range(rounds):
+            for mode, steps in (
+                ("blocking", [TextGenerationStep(), TTSSynthesisStep()]),
+                ("streaming", [StreamingNarrationStep()]),
+            ):
+                first_audio, total, chunks = await measure(steps)
+                print(f"{mode:>10} {first_audio:>15.3f} {total:>9.3f} {chunks:>7}")
+    finally:
+        await HttpClientManager().shutdown()
+
+
+async def run(args):
+    LLM.latency = args.llm_latency
+    LLM.stream_interval = args.llm_interval
+    TTS.latency = args.tts_latency
+    async with LLM, TTS:
+        configure_env(
+            OPENAI_GPT_BASE_URL=LLM.api_base,
+            TTS_CACHE_ENABLED="false",
+            TTS_MAX_CHUNK_CHARS=str(args.max_chars),
+        )
+        await bench(args.rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-interval", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--max-chars", type=int, default=80)
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
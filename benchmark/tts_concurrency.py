@@ -0,0 +1,52 @@
+"""
+TTS 分段并发合成基准：对比不同分段数量下顺序合成与并发合成的耗时。
+
+用法：python -m benchmark.tts_concurrency --latency 0.3 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from benchmark.fake_services import FakeTTSServer, configure_env
+
+configure_env()
+
+from kvidgen.utils.tts_client import TTSClient  # noqa: E402
+
+
+async def bench(latency: float, concurrency: int, chunk_counts):
+    async with FakeTTSServer(latency=latency) as server:
+        client = TTSClient()
+        client.api_url = server.api_url
+        print(
+            f"{'chunks':>8} {'sequential(s)':>14} {'concurrent(s)':>14} {'speedup':>8}"
+        )
+        for count in chunk_counts:
+            chunks = ["测试文本。" * 50] * count
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                start = time.perf_counter()
+                await client.synthesize_chunks(chunks, tmp_dir, concurrency=1)
+                sequential = time.perf_counter() - start
+
+                start = time.perf_counter()
+                await client.synthesize_chunks(chunks, tmp_dir, concurrency=concurrency)
+                concurrent = time.perf_counter() - start
+            print(
+                f"{count:>8} {sequential:>14.3f} {concurrent:>14.3f} "
+                f"{sequential / concurrent:>7.2f}x"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    asyncio.run(bench(args.latency, args.concurrency, args.chunks))
+
+
+if __name__ == "__main__":
+    main()
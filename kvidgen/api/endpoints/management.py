@@ -1,7 +1,20 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from loguru import logger
 
+from kvidgen.core.agents.effects_cache import EffectDecisionCache
+from kvidgen.core.agents.governor import LLMGovernor
+from kvidgen.core.config import settings
+from kvidgen.core.workspace import WorkspaceManager
 from kvidgen.models.http import HttpResponse
+from kvidgen.service.admission import AdmissionController
+from kvidgen.service.jobs import JobManager
+from kvidgen.service.result_cache import VideoResultCache
+from kvidgen.utils.download_cache import DownloadCache
+from kvidgen.utils.http_client import HttpClientManager
+from kvidgen.utils.metrics import render_metrics
+from kvidgen.utils.process_pool import ProcessPoolManager
+from kvidgen.utils.tts_client import TTSClient
 
 router = APIRouter()
 
@@ -14,3 +27,121 @@ router = APIRouter()
 async def get_health():
     logger.info("health check")
     return HttpResponse.ok([])
+
+
+@router.get(
+    "/caches",
+    response_model=HttpResponse,
+    description="缓存命中统计",
+    name="caches",
+)
+async def get_caches():
+    tts_cache = TTSClient().cache
+    return HttpResponse.ok(
+        {
+            "tts": tts_cache.stats() if tts_cache else None,
+            "downloads": (
+                DownloadCache().stats() if settings.DOWNLOAD_CACHE_ENABLED else None
+            ),
+            "image_effects": (
+                EffectDecisionCache().stats()
+                if settings.IMAGE_EFFECTS_CACHE_ENABLED
+                else None
+            ),
+            "results": (
+                VideoResultCache().stats() if settings.RESULT_CACHE_ENABLED else None
+            ),
+            "workspaces": (
+                WorkspaceManager().stats() if settings.WORKSPACE_ENABLED else None
+            ),
+        }
+    )
+
+
+@router.get(
+    "/http",
+    response_model=HttpResponse,
+    description="共享 HTTP 连接池统计",
+    name="http",
+)
+async def get_http_pool():
+    return HttpResponse.ok(HttpClientManager().stats())
+
+
+@router.get(
+    "/llm",
+    response_model=HttpResponse,
+    description="大模型调用治理统计",
+    name="llm",
+)
+async def get_llm_governor():
+    return HttpResponse.ok(LLMGovernor().stats())
+
+
+@router.get(
+    "/jobs",
+    response_model=HttpResponse,
+    description="异步任务队列统计",
+    name="jobs",
+)
+async def get_jobs():
+    return HttpResponse.ok(JobManager().stats())
+
+
+@router.get(
+    "/load",
+    response_model=HttpResponse,
+    description="当前负载：准入控制积压、CPU 进程池、异步任务与大模型在途调用",
+    name="load",
+)
+async def get_load():
+    return HttpResponse.ok(
+        {
+            "admission": AdmissionController().stats(),
+            "cpu_pool": ProcessPoolManager().stats(),
+            "jobs": JobManager().stats(),
+            "llm_in_flight": LLMGovernor().in_flight,
+        }
+    )
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    description="Prometheus 文本格式的指标：步骤与外部调用耗时、CPU 时间、传输字节数及当前负载",
+    name="metrics",
+)
+async def get_metrics():
+    admission = AdmissionController()
+    jobs = JobManager()
+    pool = ProcessPoolManager()
+    text = render_metrics(
+        {
+            "kvidgen_admission_running": (
+                "准入控制中正在运行的管道数",
+                lambda: admission.stats()["running"],
+            ),
+            "kvidgen_admission_queued": (
+                "准入控制中排队的管道数",
+                lambda: admission.stats()["queued"],
+            ),
+            "kvidgen_admission_backlog_seconds": (
+                "预计积压（秒）",
+                admission.backlog_seconds,
+            ),
+            "kvidgen_jobs_queued": (
+                "排队中的异步任务数",
+                lambda: jobs.stats()["queued"],
+            ),
+            "kvidgen_jobs_running": ("运行中的异步任务数", lambda: jobs.running),
+            "kvidgen_cpu_pool_in_flight": (
+                "CPU 进程池在途任务数",
+                lambda: pool.in_flight,
+            ),
+            "kvidgen_llm_in_flight": (
+                "大模型在途调用数",
+                lambda: LLMGovernor().in_flight,
+            ),
+        }
+    )
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
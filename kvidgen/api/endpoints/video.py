@@ -1,8 +1,20 @@
+import json
+from typing import List
+
 from fastapi import APIRouter
+from starlette import status
+from starlette.responses import StreamingResponse
 
+from kvidgen.core.config import settings
 from kvidgen.models.http import HttpResponse
 from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.service.admission import Overloaded
+from kvidgen.service.batch import generate_batch
+from kvidgen.service.job_store import JobPriority, JobStatus
+from kvidgen.service.jobs import JobManager, JobQueueFull
 from kvidgen.service.video import generate_video
+from kvidgen.utils.metrics import track_usage
+from kvidgen.utils.oss_client import AliyunOssClient
 
 router = APIRouter()
 
@@ -10,9 +22,123 @@ router = APIRouter()
 @router.post(
     "/generate",
     response_model=HttpResponse,
-    description="生成筹款视频",
+    description="生成筹款视频，返回视频链接。实际渲染档位与为赶上截止时间所做的降级"
+    "记录在 metadata，请求带 deadline_seconds 时写入响应体；"
+    "本次请求的资源用量记录在 metadata.usage，include_usage 为 true 时写入响应体",
     name="generate",
 )
-async def generate(param: FundraisingRequest):
-    video: str = await generate_video(param)
-    return HttpResponse.ok(video)
+async def generate(param: FundraisingRequest, include_usage: bool = False):
+    try:
+        with track_usage() as usage:
+            result = await generate_video(param)
+    except Overloaded as e:
+        return HttpResponse.err(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            message=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    metadata = {
+        "render_profile": result.get("render_profile"),
+        "degradations": result["degradations"],
+    }
+    if include_usage:
+        metadata["usage"] = usage.to_dict()
+    response = HttpResponse.ok(result["video_url"], metadata=metadata)
+    if include_usage or param.deadline_seconds is not None:
+        return response.with_metadata()
+    return response
+
+
+@router.post(
+    "/batch",
+    description="批量生成筹款视频，请求体为筹款请求参数数组；"
+    "以 NDJSON 按完成顺序逐行返回每条结果，单条失败不影响其余条目",
+    name="generate_batch",
+)
+async def batch(items: List[dict]):
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return HttpResponse.err(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Batch has {len(items)} items, limit is {settings.BATCH_MAX_ITEMS}",
+        )
+
+    async def lines():
+        async for result in generate_batch(items):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/jobs",
+    response_model=HttpResponse,
+    description="提交筹款视频生成任务，立即返回任务 ID",
+    name="submit_job",
+)
+async def submit_job(
+    param: FundraisingRequest, priority: JobPriority = JobPriority.NORMAL
+):
+    try:
+        job = await JobManager().submit(param, priority)
+    except JobQueueFull as e:
+        return HttpResponse.err(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            message=str(e),
+            headers={"Retry-After": str(settings.JOB_RETRY_AFTER)},
+        )
+    return HttpResponse.ok(job.summary())
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=HttpResponse,
+    description="查询任务状态",
+    name="job_status",
+)
+async def job_status(job_id: str):
+    job = JobManager().get(job_id)
+    if job is None:
+        return HttpResponse.err(
+            status.HTTP_404_NOT_FOUND,
+            status.HTTP_404_NOT_FOUND,
+            f"Job {job_id} not found",
+        )
+    return HttpResponse.ok(job.summary())
+
+
+@router.get(
+    "/jobs/{job_id}/result",
+    response_model=HttpResponse,
+    description="获取任务结果，每次重新签发视频链接",
+    name="job_result",
+)
+async def job_result(job_id: str):
+    job = JobManager().get(job_id)
+    if job is None:
+        return HttpResponse.err(
+            status.HTTP_404_NOT_FOUND,
+            status.HTTP_404_NOT_FOUND,
+            f"Job {job_id} not found",
+        )
+    if job.status == JobStatus.FAILED:
+        return HttpResponse.err(
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            job.error,
+            detail=job.summary(),
+        )
+    if not job.finished:
+        return HttpResponse.err(
+            status.HTTP_202_ACCEPTED,
+            status.HTTP_202_ACCEPTED,
+            f"Job {job_id} is {job.status.value}",
+            detail=job.summary(),
+            headers={"Retry-After": str(settings.JOB_RETRY_AFTER)},
+        )
+    video_url = await AliyunOssClient().generate_signed_url(
+        object_key=job.result["object_key"]
+    )
+    return HttpResponse.ok({**job.summary(), "video_url": video_url, **job.result})
@@ -0,0 +1,79 @@
+"""
+批量生成筹款视频的命令行入口，不经过 HTTP 服务直接运行管道。
+
+输入为 JSON Lines（每行一个筹款请求参数）或 JSON 数组，结果以 JSON Lines
+按完成顺序写出，每行包含条目序号 index 与 status。存在失败条目时退出码为 1。
+
+用法：python -m kvidgen.batch campaigns.jsonl -o results.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import List
+
+from kvidgen.core.config import settings
+from kvidgen.service.batch import generate_batch
+from kvidgen.utils.http_client import HttpClientManager
+from kvidgen.utils.oss_client import AliyunOssClient
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+def load_items(path: str) -> List[dict]:
+    """读取 JSON Lines 或 JSON 数组，path 为 - 时读取标准输入。"""
+    if path == "-":
+        content = sys.stdin.read()
+    else:
+        with open(path, encoding="utf-8") as file:
+            content = file.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+async def run(items: List[dict], output) -> int:
+    """:return: 失败条目数。"""
+    await HttpClientManager().startup()
+    await ProcessPoolManager().startup()
+    failed = 0
+    try:
+        async for result in generate_batch(items):
+            failed += result["status"] == "failed"
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        await ProcessPoolManager().shutdown()
+        await AliyunOssClient().shutdown()
+        await HttpClientManager().shutdown()
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("input", help="筹款请求参数文件，- 表示标准输入")
+    parser.add_argument("-o", "--output", help="结果文件，默认写到标准输出")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.CPU_POOL_WORKERS or os.cpu_count() or 1,
+        help="渲染进程数，默认使用全部 CPU 核心",
+    )
+    args = parser.parse_args()
+
+    # 命令行独占本机，不与 uvicorn worker 均分 CPU
+    ProcessPoolManager().max_workers = args.workers
+    items = load_items(args.input)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            failed = asyncio.run(run(items, output))
+    else:
+        failed = asyncio.run(run(items, sys.stdout))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
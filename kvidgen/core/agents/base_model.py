@@ -1,7 +1,9 @@
 from langchain_openai import ChatOpenAI
 
+from kvidgen.core.agents.governor import LLMGovernor
 from kvidgen.core.config import settings
-from kvidgen.utils.tts_client import singleton
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import add_llm_tokens
 
 
 @singleton
@@ -11,6 +13,30 @@ class GPT4o(ChatOpenAI):
             model=settings.OPENAI_GPT_MODEL_NAME,
             api_key=settings.OPENAI_GPT_API_KEY,
             base_url=settings.OPENAI_GPT_BASE_URL,
+            # 重试由 LLMGovernor 统一负责，避免与 SDK 内置重试叠加
+            max_retries=0,
+            stream_usage=settings.OPENAI_GPT_STREAM_USAGE,
             *args,
             **kwargs
         )
+
+    async def _agenerate(self, *args, **kwargs):
+        agenerate = super()._agenerate
+        result = await LLMGovernor().call(lambda: agenerate(*args, **kwargs))
+        # 各候选共享同一份整体用量，只记一次
+        if result.generations:
+            _record_usage(result.generations[0].message)
+        return result
+
+    async def _astream(self, *args, **kwargs):
+        astream = super()._astream
+        async for chunk in LLMGovernor().stream(lambda: astream(*args, **kwargs)):
+            _record_usage(chunk.message)
+            yield chunk
+
+
+def _record_usage(message) -> None:
+    """累计响应中的 token 用量，流式输出时只有最后一个分块带用量。"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        add_llm_tokens(usage["input_tokens"], usage["output_tokens"])
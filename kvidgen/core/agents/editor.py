@@ -1,7 +1,9 @@
 import asyncio
 from abc import abstractmethod
-from json import JSONDecodeError
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set
 
+from langchain_core.exceptions import OutputParserException
 from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.outputs import Generation
@@ -10,11 +12,18 @@ from langchain_core.runnables.utils import Input
 from loguru import logger
 
 from kvidgen.core.agents.base_model import GPT4o
+from kvidgen.core.agents.effects_cache import EffectDecisionCache, dhash
 from kvidgen.core.agents.prompts import (
     EDIT_SYSTEM_PROMPT,
     EDIT_USER_PROMPT,
+    IMAGE_EFFECTS_BATCH_USER_PROMPT,
     IMAGE_EFFECTS_SYSTEM_PROMPT,
 )
+from kvidgen.core.config import settings
+from kvidgen.core.video.ingest import encode_thumbnail
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import ResourceUsage, current_usage, track_usage
+from kvidgen.utils.process_pool import ProcessPoolManager
 
 
 class AgentABC:
@@ -26,58 +35,122 @@ class AgentABC:
         pass
 
 
+# 提示模板不依赖请求参数，模块加载时构建一次
+EDIT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=EDIT_SYSTEM_PROMPT),
+        HumanMessagePromptTemplate.from_template(EDIT_USER_PROMPT),
+    ]
+)
+
+
 class Editor(AgentABC):
     def __init__(self):
         super().__init__()
-        self.system_prompt = EDIT_SYSTEM_PROMPT
-        self.user_prompt = EDIT_USER_PROMPT
+        self.prompt = EDIT_PROMPT
         self.output_parser = StrOutputParser()
+        self.chain = self.prompt | self.llm | self.output_parser
 
     async def run(self, ipt):
-        return await (
-            ChatPromptTemplate.from_messages(
-                [
-                    SystemMessage(content=self.system_prompt),
-                    HumanMessagePromptTemplate.from_template(self.user_prompt),
-                ]
-            )
-            | self.llm
-            | self.output_parser
-        ).ainvoke(ipt)
+        return await self.chain.ainvoke(ipt)
+
+    def astream(self, ipt) -> AsyncIterator[str]:
+        """流式生成文案，逐个返回模型输出的文本片段。"""
+        return self.chain.astream(ipt)
+
+
+# 模型输出无法解析时使用的特效；解析器以 None 标记这种情况，该结果不写入决策缓存
+FALLBACK_EFFECTS = ["zoom"]
+_PARSE_ERRORS = (
+    OutputParserException,
+    AttributeError,
+    KeyError,
+    TypeError,
+    ValueError,
+)
 
 
 class ImageEffectsOutputParser(JsonOutputParser):
-    def parse_result(self, result: list[Generation], *, partial: bool = False) -> list:
+    def parse_result(
+        self, result: list[Generation], *, partial: bool = False
+    ) -> Optional[list]:
+        """解析单图特效结果，解析失败时返回 None。"""
+        try:
+            rst = super().parse_result(result)
+            return rst.get("effects") or None
+
+        except _PARSE_ERRORS as e:
+            logger.error(f"Image effects parse error: {e}")
+            return None
+
 
+class BatchImageEffectsOutputParser(JsonOutputParser):
+    def parse_result(self, result: list[Generation], *, partial: bool = False) -> dict:
+        """
+        解析批量特效结果，返回 {图片编号: 特效列表}，解析失败时返回空字典，
+        缺少特效的图片为 None。
+        """
         try:
             rst = super().parse_result(result)
-            effects = rst.get("effects", ["zoom"])
-            return effects
+            return {
+                int(item["index"]): item.get("effects") or None
+                for item in rst.get("images", [])
+            }
+        except _PARSE_ERRORS as e:
+            logger.error(f"Batch image effects parse error: {e}")
+            return {}
 
-        except JSONDecodeError as e:
-            logger.error(f"JSONDecodeError: {e}")
-            return ["zoom"]
+
+@dataclass(frozen=True)
+class ThumbnailPolicy:
+    """
+    视觉模型输入图片的缩略图策略。
+    :param max_side: 缩略图长边上限（像素）。
+    :param jpeg_quality: JPEG 质量。
+    :param detail: 视觉模型的 detail 参数，low 时按固定少量 token 计费。
+    """
+
+    max_side: int = settings.IMAGE_THUMBNAIL_MAX_SIDE
+    jpeg_quality: int = settings.IMAGE_THUMBNAIL_QUALITY
+    detail: str = settings.IMAGE_THUMBNAIL_DETAIL
 
 
 class ImageEffectsArtist(AgentABC):
-    def __init__(self):
+    def __init__(self, thumbnail_policy: Optional[ThumbnailPolicy] = None):
         super().__init__()
         self.system_prompt = IMAGE_EFFECTS_SYSTEM_PROMPT
         self.output_parser = ImageEffectsOutputParser()
+        self.thumbnail_policy = thumbnail_policy or ThumbnailPolicy()
+        self.chain = self.llm | self.output_parser
+        self.batch_chain = self.llm | BatchImageEffectsOutputParser()
+
+    async def image_content(self, image_path: str) -> dict:
+        """在 CPU 进程池中生成缩略图并构造多模态消息中的图片内容。"""
+        policy = self.thumbnail_policy
+        payload = await ProcessPoolManager().run(
+            encode_thumbnail, image_path, policy.max_side, policy.jpeg_quality
+        )
+        logger.debug(f"Image effects payload for {image_path}: {len(payload)} bytes")
+        return {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{payload}",
+                "detail": policy.detail,
+            },
+        }
 
     async def run(self, ipt: Input):
+        """
+        :param ipt: 图片路径。
+        :return: 单元素元组，元素为特效列表，模型输出无法解析时为 None。
+        """
         result = (
-            await (self.llm | self.output_parser).ainvoke(
+            await self.chain.ainvoke(
                 [
                     SystemMessage(content=self.system_prompt),
                     {
                         "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpg;base64, {ipt}"},
-                            },
-                        ],
+                        "content": [await self.image_content(ipt)],
                     },
                 ]
             ),
@@ -85,11 +158,221 @@ class ImageEffectsArtist(AgentABC):
         logger.debug(f"Generated image effects: {result}")
         return result
 
+    async def run_batch(self, image_paths: List[str]) -> List[List[str]]:
+        """
+        在一次多模态请求中为全部图片选择特效。
+        图片数超过 IMAGE_EFFECTS_BATCH_MAX 或批量调用失败时退化为逐张调用，
+        批量结果中缺失的图片单独补调。
+        :param image_paths: 图片路径列表。
+        :return: 与 image_paths 顺序一致的特效列表，无法解析的图片为 None。
+        """
+        if len(image_paths) <= 1 or len(image_paths) > settings.IMAGE_EFFECTS_BATCH_MAX:
+            return await self._run_each(image_paths)
+
+        content = [
+            {
+                "type": "text",
+                "text": IMAGE_EFFECTS_BATCH_USER_PROMPT.format(count=len(image_paths)),
+            }
+        ]
+        for index, image_content in enumerate(
+            await asyncio.gather(*(self.image_content(p) for p in image_paths))
+        ):
+            content.append({"type": "text", "text": f"图片 {index}"})
+            content.append(image_content)
+
+        try:
+            mapping = await self.batch_chain.ainvoke(
+                [
+                    SystemMessage(content=self.system_prompt),
+                    {"role": "user", "content": content},
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Batch image effects failed, fallback to per-image: {e}")
+            mapping = {}
+
+        missing = [i for i in range(len(image_paths)) if i not in mapping]
+        if missing:
+            logger.warning(f"Batch image effects missing {missing}, fallback")
+            for index, effects in zip(
+                missing, await self._run_each([image_paths[i] for i in missing])
+            ):
+                mapping[index] = effects
+        logger.debug(f"Generated batch image effects: {mapping}")
+        return [mapping[i] for i in range(len(image_paths))]
+
+    async def classify(self, image_paths: List[str]) -> List[List[str]]:
+        """
+        为图片选择特效，优先使用感知哈希缓存，仅未命中的图片调用视觉模型。
+        模型输出无法解析的图片使用 FALLBACK_EFFECTS 且不写入缓存，下次重新识别。
+        :param image_paths: 图片路径列表。
+        :return: 与 image_paths 顺序一致的特效列表。
+        """
+        if not settings.IMAGE_EFFECTS_CACHE_ENABLED:
+            return [
+                effect or list(FALLBACK_EFFECTS)
+                for effect in await self._classify(image_paths)
+            ]
+
+        cache = EffectDecisionCache()
+        hashes = await asyncio.gather(
+            *(ProcessPoolManager().run(dhash, p) for p in image_paths)
+        )
+        effects = [await asyncio.to_thread(cache.get, h) for h in hashes]
+        missing = [i for i, effect in enumerate(effects) if effect is None]
+        logger.debug(f"Image effects cache hits: {len(image_paths) - len(missing)}")
+        if missing:
+            generated = await self._classify(
+                [image_paths[i] for i in missing], [hashes[i] for i in missing]
+            )
+            for index, effect in zip(missing, generated):
+                if effect is None:
+                    effects[index] = list(FALLBACK_EFFECTS)
+                    continue
+                effects[index] = effect
+                await asyncio.to_thread(cache.put, hashes[index], effect)
+        return effects
+
+    async def _classify(
+        self, image_paths: List[str], keys: Optional[List[str]] = None
+    ) -> List[List[str]]:
+        if settings.IMAGE_EFFECTS_BATCH:
+            return await ImageEffectsBatcher().classify(image_paths, keys)
+        return await self._run_each(image_paths)
+
+    async def _run_each(self, image_paths: List[str]) -> List[List[str]]:
+        results = await asyncio.gather(*(self.run(p) for p in image_paths))
+        return [result[0] for result in results]
+
+
+@singleton
+class ImageEffectsBatcher:
+    """
+    合并并发管道的特效识别请求：IMAGE_EFFECTS_BATCH_WINDOW 秒内到达的图片按键去重后
+    合并成批量请求，每批不超过 IMAGE_EFFECTS_BATCH_MAX 张。
+    批量生成时多个筹款活动的图片共用视觉模型调用，重复图片只识别一次。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 尚未出结果的图片，键为感知哈希或图片路径
+        self._futures: Dict[str, asyncio.Future] = {}
+        # 等待下一次合并发送的图片
+        self._queued: Dict[str, str] = {}
+        # 各图片的调用方请求的资源用量，合并请求消耗的 token 按图片分摊
+        self._waiters: Dict[str, List[ResourceUsage]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.images = 0
+        self.deduplicated = 0
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._futures, self._queued, self._waiters = {}, {}, {}
+            self._flush_handle = None
+        return loop
+
+    async def classify(
+        self, image_paths: List[str], keys: Optional[List[str]] = None
+    ) -> List[List[str]]:
+        """
+        :param image_paths: 图片路径列表。
+        :param keys: 图片去重键（如感知哈希），默认为图片路径。
+        :return: 与 image_paths 顺序一致的特效列表。
+        """
+        loop = self._bind()
+        keys = keys or image_paths
+        futures = []
+        usage = current_usage.get()
+        for key, path in zip(keys, image_paths):
+            if usage is not None:
+                self._waiters.setdefault(key, []).append(usage)
+            if key in self._futures:
+                self.deduplicated += 1
+            else:
+                self._futures[key] = loop.create_future()
+                self._queued[key] = path
+            futures.append(self._futures[key])
+
+        if len(self._queued) >= settings.IMAGE_EFFECTS_BATCH_MAX:
+            self._flush(full_only=True)
+        if self._queued and self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                settings.IMAGE_EFFECTS_BATCH_WINDOW, self._flush
+            )
+        # 单个调用方取消时不影响同批次的其他调用方
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    def _flush(self, full_only: bool = False) -> None:
+        """
+        发送排队的图片。
+        :param full_only: 只发送凑满 IMAGE_EFFECTS_BATCH_MAX 张的批次，余下的继续等待。
+        """
+        size = max(1, settings.IMAGE_EFFECTS_BATCH_MAX)
+        queued = list(self._queued.items())
+        count = len(queued) - len(queued) % size if full_only else len(queued)
+        self._queued = dict(queued[count:])
+        if not self._queued and self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for start in range(0, count, size):
+            task = asyncio.ensure_future(self._run(dict(queued[start : start + size])))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, str]) -> None:
+        self.requests += 1
+        self.images += len(batch)
+        futures = [self._futures[key] for key in batch]
+        # 定时发送的批次继承首个调用方的上下文，用量单独核算后再分摊
+        usage = ResourceUsage()
+        try:
+            with track_usage(usage):
+                results = await ImageEffectsArtist().run_batch(list(batch.values()))
+            for future, effects in zip(futures, results):
+                if not future.done():
+                    future.set_result(effects)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # 识别完成前到达的相同图片复用本批次的结果，完成后交由决策缓存命中
+            for key, future in zip(batch, futures):
+                future.cancel()
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+            self._share_usage(usage, list(batch))
+
+    def _share_usage(self, usage: ResourceUsage, keys: List[str]) -> None:
+        """按图片数把批次的 token 与 CPU 用量分摊给各调用方，重复图片再由其调用方均分。"""
+        for key in keys:
+            waiters = self._waiters.pop(key, [])
+            for waiter in waiters:
+                share = 1 / len(keys) / len(waiters)
+                waiter.add_llm(
+                    usage.llm_input_tokens * share,
+                    usage.llm_output_tokens * share,
+                    usage.llm_calls * share,
+                )
+                for step, seconds in usage.cpu_seconds.items():
+                    waiter.add_cpu(step, seconds * share)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "images": self.images,
+            "deduplicated": self.deduplicated,
+            "queued": len(self._queued),
+        }
+
 
 async def main():
-    result = await ImageEffectsArtist().run(
-        "https://thumb.qsmutual.com/data/zyc/2025/01/07/a0ef20f6-4046-42fa-a296-ae1c76b45c56.jpg@!love.png"
-    )
+    result = await ImageEffectsArtist().run("docs/example.jpg")
     print(result)
 
 
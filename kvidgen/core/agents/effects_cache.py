@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import cv2
+
+from kvidgen.core.agents.prompts import IMAGE_EFFECTS_SYSTEM_PROMPT
+from kvidgen.core.config import settings
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import count_cache
+
+# 提示词变更后旧的特效决策自动失效
+PROMPT_VERSION = hashlib.sha256(
+    IMAGE_EFFECTS_SYSTEM_PROMPT.encode("utf-8")
+).hexdigest()[:16]
+
+
+def dhash(image_path: str, hash_size: int = 8) -> int:
+    """
+    计算图片的差值感知哈希（dHash），尺寸、压缩率不同的相似图片哈希值接近。
+    :param image_path: 图片路径。
+    :param hash_size: 哈希边长，结果为 hash_size * hash_size 位整数。
+    :return: 感知哈希。
+    """
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"无法读取图片 {image_path}")
+    small = cv2.resize(img, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    value = 0
+    for bit in diff.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+@singleton
+class EffectDecisionCache:
+    """
+    图片特效决策缓存，以感知哈希 + 提示词版本为键持久化在本地 SQLite 中。
+    汉明距离不超过 IMAGE_EFFECTS_CACHE_MAX_DISTANCE 的近似图片视为命中，
+    条目超过 TTL 失效，总数超过上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(settings.CACHE_DIR, "image_effects.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_effects (
+                phash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                effects TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (phash, prompt_version)
+            )
+            """
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phash: int) -> Optional[List[str]]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT phash, effects FROM image_effects "
+                "WHERE prompt_version = ? AND created_at > ?",
+                (PROMPT_VERSION, now - settings.IMAGE_EFFECTS_CACHE_TTL),
+            ).fetchall()
+            best = None
+            for key, effects in rows:
+                distance = (int(key, 16) ^ phash).bit_count()
+                if distance <= settings.IMAGE_EFFECTS_CACHE_MAX_DISTANCE and (
+                    best is None or distance < best[0]
+                ):
+                    best = (distance, key, effects)
+            if best is None:
+                self.misses += 1
+                count_cache("image_effects", False)
+                return None
+            self.hits += 1
+            count_cache("image_effects", True)
+            self._conn.execute(
+                "UPDATE image_effects SET last_used = ? "
+                "WHERE phash = ? AND prompt_version = ?",
+                (now, best[1], PROMPT_VERSION),
+            )
+            self._conn.commit()
+            return json.loads(best[2])
+
+    def put(self, phash: int, effects: List[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_effects VALUES (?, ?, ?, ?, ?)",
+                (f"{phash:016x}", PROMPT_VERSION, json.dumps(effects), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM image_effects WHERE created_at <= ? OR prompt_version != ?",
+                (now - settings.IMAGE_EFFECTS_CACHE_TTL, PROMPT_VERSION),
+            )
+            self._conn.execute(
+                "DELETE FROM image_effects WHERE rowid NOT IN ("
+                "SELECT rowid FROM image_effects ORDER BY last_used DESC LIMIT ?)",
+                (settings.IMAGE_EFFECTS_CACHE_MAX_ENTRIES,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM image_effects"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": entries,
+            "prompt_version": PROMPT_VERSION,
+        }
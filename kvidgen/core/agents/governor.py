@@ -0,0 +1,251 @@
+import asyncio
+import contextlib
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import openai
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.utils.common import retry_async, singleton
+from kvidgen.utils.metrics import observe_call
+
+T = TypeVar("T")
+
+
+def _is_retryable(e: Exception) -> bool:
+    """限流（429）、服务端错误（5xx）及连接/超时错误可重试。"""
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, openai.APIConnectionError)
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    if not isinstance(e, openai.APIStatusError):
+        return None
+    try:
+        return float(e.response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    令牌桶限速：每秒补充 rate 个令牌，最多积攒 capacity 个，每次调用消耗一个。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def available(self) -> bool:
+        """:return: 当前是否有令牌可用，不消耗令牌。"""
+        elapsed = time.monotonic() - self._updated
+        return self._tokens + elapsed * self.rate >= 1
+
+
+@singleton
+class LLMGovernor:
+    """
+    进程级大模型调用治理：令牌桶限速、在途调用数上限、429/5xx 退避重试，
+    以及可选的对冲请求——取得名额后耗时超过近期 p95 时再发一份相同请求，取先返回者；
+    没有空闲名额时不对冲，避免过载时加倍排队的负载。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bucket: Optional[TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._latencies = deque(maxlen=settings.LLM_LATENCY_WINDOW)
+        self.in_flight = 0
+        self.metrics = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "hedges_skipped": 0,
+        }
+
+    def _bind(self) -> None:
+        # 限速与并发原语绑定事件循环，循环变化时（如脚本多次 asyncio.run）重建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_IN_FLIGHT)
+            self._bucket = (
+                TokenBucket(settings.LLM_RATE_LIMIT, settings.LLM_RATE_BURST)
+                if settings.LLM_RATE_LIMIT > 0
+                else None
+            )
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """占用一个调用名额：先取令牌，再等待在途调用数低于上限。"""
+        self._bind()
+        if self._bucket:
+            await self._bucket.acquire()
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    def _slot_free(self) -> bool:
+        """:return: 是否无需排队即可取得调用名额。"""
+        self._bind()
+        return not self._semaphore.locked() and (
+            self._bucket is None or self._bucket.available()
+        )
+
+    def p95(self) -> Optional[float]:
+        if len(self._latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[math.ceil(len(ordered) * 0.95) - 1]
+
+    async def _attempt(
+        self,
+        func: Callable[[], Awaitable[T]],
+        acquired: Optional[asyncio.Event] = None,
+    ) -> T:
+        async with self.slot():
+            if acquired is not None:
+                acquired.set()
+            start = time.monotonic()
+            with observe_call("llm", "generate"):
+                result = await func()
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    async def _hedged(self, func: Callable[[], Awaitable[T]]) -> T:
+        p95 = self.p95() if settings.LLM_HEDGE_ENABLED else None
+        acquired = asyncio.Event()
+        primary = asyncio.ensure_future(self._attempt(func, acquired))
+        if p95 is None:
+            return await primary
+
+        # 调用方在任一等待点被取消时，已发出的请求都要取消，以释放名额
+        waiter = asyncio.ensure_future(acquired.wait())
+        tasks = {primary, waiter}
+        error: Optional[BaseException] = None
+        try:
+            # p95 从取得名额后开始统计，对冲计时也从主请求取得名额后开始
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            if not primary.done():
+                await asyncio.wait(
+                    {primary}, timeout=max(p95, settings.LLM_HEDGE_MIN_DELAY)
+                )
+            if primary.done():
+                return primary.result()
+            if not self._slot_free():
+                # 名额已满时对冲请求只会排队，徒增过载时的负载
+                self.metrics["hedges_skipped"] += 1
+                return await primary
+
+            self.metrics["hedges"] += 1
+            hedge = asyncio.ensure_future(self._attempt(func))
+            tasks.add(hedge)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        在治理下执行一次大模型调用。
+        :param func: 无参协程工厂，重试或对冲时会被再次调用。
+        :return: 调用结果。
+        """
+        self.metrics["calls"] += 1
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+            return self._hedged(func)
+
+        try:
+            return await retry_async(
+                attempt,
+                retries=settings.LLM_MAX_RETRIES,
+                backoff=settings.LLM_RETRY_BACKOFF,
+                should_retry=_is_retryable,
+                retry_after=_retry_after,
+            )
+        except Exception:
+            self.metrics["failures"] += 1
+            raise
+        finally:
+            self.metrics["retries"] += attempts - 1
+
+    async def stream(self, func: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        在治理下执行一次流式调用，仅在尚未产出任何片段前失败时重试，不做对冲。
+        :param func: 返回异步迭代器的无参工厂。
+        """
+        self.metrics["calls"] += 1
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot():
+                    with observe_call("llm", "stream"):
+                        async for chunk in func():
+                            started = True
+                            yield chunk
+                return
+            except Exception as e:
+                if (
+                    started
+                    or attempt >= settings.LLM_MAX_RETRIES
+                    or not _is_retryable(e)
+                ):
+                    self.metrics["failures"] += 1
+                    raise
+                delay = random.uniform(0.5, 1.0) * settings.LLM_RETRY_BACKOFF
+                delay = max(delay * 2**attempt, _retry_after(e) or 0)
+                attempt += 1
+                self.metrics["retries"] += 1
+                logger.warning(f"Retry LLM stream {attempt} in {delay:.2f}s: {e!r}")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "latency_samples": len(self._latencies),
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
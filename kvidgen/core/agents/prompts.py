@@ -133,3 +133,17 @@ IMAGE_EFFECTS_SYSTEM_PROMPT = """
 }
 ```
 """
+
+
+IMAGE_EFFECTS_BATCH_USER_PROMPT = """
+下面依次给出同一筹款视频中的 {count} 张图片，每张图片前标注了编号（从 0 开始）。
+请按上述原则分别为每张图片选择特效，并按以下格式输出，images 中需包含全部编号：
+
+```json
+{{
+  "images": [
+    {{"index": 0, "effects": ["effect_name1", "effect_name2"], "reason": "简要说明"}}
+  ]
+}}
+```
+"""
@@ -3,6 +3,8 @@ import os
 import tempfile
 from typing import List
 
+from kvidgen.utils.common import run_command
+
 
 class AudioConcatenator:
     def __init__(self, ffmpeg_path: str = "ffmpeg"):
@@ -52,9 +54,11 @@ class AudioConcatenator:
                     "copy",
                     output_path,
                 ]
-                subprocess.run(command, check=True)
+                run_command(command, "concat")
 
             except subprocess.CalledProcessError as e:
-                raise RuntimeError(f"Error during audio concatenation: {e}")
+                raise RuntimeError(
+                    f"Error during audio concatenation: {e} {e.stderr.decode()}"
+                )
 
         return output_path
@@ -1,7 +1,7 @@
 import subprocess
 from loguru import logger
 
-from kvidgen.utils.tts_client import singleton
+from kvidgen.utils.common import run_command, singleton
 
 
 @singleton
@@ -32,6 +32,8 @@ class FfmpegAudioMixer:
         :param output: 输出音频文件路径。
         :param audio_volume1: 解说音量比例，范围 0.0 - 1.0。
         :param audio_volume2: 背景音乐音量比例，范围 0.0 - 1.0。
+        :return: 输出音频文件路径。
+        :raises RuntimeError: ffmpeg 混合失败。
         """
         if not (0.0 <= audio_volume1 <= 1.0) or not (0.0 <= audio_volume2 <= 1.0):
             raise ValueError("音量比例必须在 0.0 到 1.0 之间。")
@@ -53,17 +55,14 @@ class FfmpegAudioMixer:
         ]
 
         try:
-            subprocess.run(
-                command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            logger.info(f"音频混合成功，已保存到: {output}")
-            return output
+            run_command(command, "mix")
         except FileNotFoundError:
             logger.error("ffmpeg 未安装或路径无效，请确保 ffmpeg 已正确配置。")
+            raise
         except subprocess.CalledProcessError as e:
-            logger.error(f"混合失败，ffmpeg 错误: {e.stderr.decode()}")
-        except Exception as e:
-            logger.error(f"混合过程中发生未知错误: {e}")
+            raise RuntimeError(f"Error during audio mixing: {e} {e.stderr.decode()}")
+        logger.info(f"音频混合成功，已保存到: {output}")
+        return output
 
     def is_ffmpeg_installed(self) -> bool:
         """
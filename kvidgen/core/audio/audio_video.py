@@ -2,6 +2,8 @@ import subprocess
 
 from loguru import logger
 
+from kvidgen.utils.common import run_command
+
 
 class FfmpegAudioVideoMerger:
     """
@@ -24,30 +26,33 @@ class FfmpegAudioVideoMerger:
         :param audio_path: 输入音频文件路径。
         :param output_path: 输出视频文件路径。
         :param volume: 背景音乐音量比例，范围 0.0 - 1.0。
+        :return: 输出视频文件路径。
+        :raises RuntimeError: ffmpeg 合成失败。
         """
+        command = [
+            self.ffmpeg_path,
+            "-i",
+            video_path,
+            "-i",
+            audio_path,
+            "-filter:a",
+            f"volume={volume}",
+            "-c:v",
+            "copy",
+            "-shortest",
+            output_path,
+        ]
         try:
-            command = [
-                self.ffmpeg_path,
-                "-i",
-                video_path,
-                "-i",
-                audio_path,
-                "-filter:a",
-                f"volume={volume}",
-                "-c:v",
-                "copy",
-                "-shortest",
-                output_path,
-            ]
-            subprocess.run(command, check=True)
-            logger.info(f"视频合成成功，已保存到: {output_path}")
-            return output_path
-        except subprocess.CalledProcessError as e:
-            logger.error(f"合成失败: {e}")
-            return None
+            run_command(command, "merge")
         except FileNotFoundError:
             logger.error("ffmpeg 未安装或路径无效，请确保 ffmpeg 已正确配置。")
-            return None
+            raise
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(
+                f"Error during audio/video merge: {e} {e.stderr.decode()}"
+            )
+        logger.info(f"视频合成成功，已保存到: {output_path}")
+        return output_path
 
 
 if __name__ == "__main__":
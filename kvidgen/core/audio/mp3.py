@@ -0,0 +1,85 @@
+from typing import Optional
+
+# Layer III 比特率表（kbps），索引为帧头中的 bitrate index
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# 帧头 version 字段：3=MPEG1，2=MPEG2，0=MPEG2.5
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+def _frame_info(header: bytes) -> Optional[tuple]:
+    """解析 MP3 Layer III 帧头，返回 (帧字节数, 帧时长秒)，非法帧头返回 None。"""
+    if header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples = 1152 if version == 3 else 576
+    frame_size = samples // 8 * bitrate // sample_rate + padding
+    return frame_size, samples / sample_rate
+
+
+class Mp3DurationCounter:
+    """
+    增量统计 MP3 音频时长，可在流式接收音频时逐块喂入数据。
+    """
+
+    def __init__(self):
+        self.duration = 0.0
+        self._buffer = bytearray()
+        self._header_checked = False
+        self._skip = 0
+
+    def feed(self, data: bytes) -> float:
+        """
+        追加一段音频数据。
+        :param data: 新收到的音频字节。
+        :return: 截至目前完整帧的累计时长（秒）。
+        """
+        buffer = self._buffer
+        buffer.extend(data)
+        if not self._header_checked:
+            if len(buffer) < 10:
+                return self.duration
+            self._header_checked = True
+            if buffer[:3] == b"ID3":
+                # ID3v2 标签长度为 syncsafe 整数，标签可能跨多个数据块
+                self._skip = 10 + (
+                    (buffer[6] << 21) | (buffer[7] << 14) | (buffer[8] << 7) | buffer[9]
+                )
+        if self._skip:
+            skipped = min(self._skip, len(buffer))
+            del buffer[:skipped]
+            self._skip -= skipped
+
+        pos = 0
+        while len(buffer) - pos >= 4:
+            info = _frame_info(buffer[pos : pos + 4])
+            if info is None:
+                pos += 1
+                continue
+            frame_size, frame_duration = info
+            if len(buffer) - pos < frame_size:
+                break
+            self.duration += frame_duration
+            pos += frame_size
+        del buffer[:pos]
+        return self.duration
+
+
+def mp3_duration(data: bytes) -> float:
+    """计算完整 MP3 数据的时长（秒）。"""
+    return Mp3DurationCounter().feed(data)
@@ -15,22 +15,139 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api"
     VERSION = "1.0.0"
     TIME_ZONE: str = "Asia/Shanghai"
+    CACHE_DIR: str = ".cache"
+    # 渲染档位，见 kvidgen.core.video.profile.RENDER_PROFILES
+    RENDER_PROFILE: str = "1080p"
+    # 管道执行器：dag 按步骤依赖并发执行，linear 按列表顺序执行
+    PIPELINE_EXECUTOR: str = "dag"
+    # 请求级结果缓存：相同请求复用已上传的视频，TTL 需短于 OSS 上 tmp/ 前缀的生命周期；
+    # 写入新结果时清理过期条目，超过条目数上限时淘汰最早写入的
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL: int = 24 * 60 * 60
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+
+    # CPU 密集任务（渲染、图片解码与编码）进程池：WORKERS 为 0 时按 CPU 核数与
+    # uvicorn worker 数均分；子进程执行 MAX_TASKS_PER_CHILD 个任务后回收，0 表示不回收
+    CPU_POOL_ENABLED: bool = True
+    CPU_POOL_WORKERS: int = 0
+    CPU_POOL_MAX_TASKS_PER_CHILD: int = 50
+
+    # 异步任务：后台 worker 数、排队上限（超出时提交返回 503）、存储（memory/sqlite）
+    # 及已结束任务的保留时长；多 worker 部署需使用 sqlite 才能在任意 worker 上查询
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_SIZE: int = 100
+    JOB_STORE: str = "memory"
+    JOB_TTL: int = 24 * 60 * 60
+    JOB_RETRY_AFTER: int = 30
+
+    # 批量生成：单批条目数上限与同时运行的管道数（0 为准入控制的并发上限）
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_CONCURRENCY: int = 0
+
+    # 准入控制：同时运行的管道数上限（0 为 CPU 进程池 worker 数的两倍），
+    # 按渲染成本估算的积压秒数超过 MAX_BACKLOG 时返回 503
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 0
+    ADMISSION_MAX_BACKLOG: float = 600.0
+    # 截止时间降级：请求带 deadline_seconds 时，渲染之后合并音视频与上传预留的秒数
+    DEADLINE_RESERVE: float = 10.0
+
+    # 任务工作目录：中间产物按请求指纹持久化，失败重试时从第一个未完成的步骤继续，
+    # 成功后删除；超过 TTL 或总大小超过 MAX_BYTES 时按最后更新时间清理
+    WORKSPACE_ENABLED: bool = True
+    WORKSPACE_TTL: int = 6 * 60 * 60
+    WORKSPACE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    # 追踪：安装 opentelemetry 后为管道、步骤与外部调用创建 span，
+    # 指标始终记录，由 /management/metrics 以 Prometheus 文本格式导出
+    TRACING_ENABLED: bool = False
+
+    # 共享 HTTP 连接池
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 16
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_TIMEOUT_TOTAL: float = 300.0
+    HTTP_TIMEOUT_CONNECT: float = 10.0
+    HTTP_TIMEOUT_READ: float = 60.0
+
+    # 素材下载
+    DOWNLOAD_CONCURRENCY: int = 8
+    DOWNLOAD_MAX_RETRIES: int = 3
+    DOWNLOAD_RETRY_BACKOFF: float = 0.5
+    DOWNLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    DOWNLOAD_SKIP_FAILED_IMAGES: bool = True
+    # 跨请求共享的下载缓存，过期后携带 ETag/Last-Modified 重新校验
+    DOWNLOAD_CACHE_ENABLED: bool = True
+    DOWNLOAD_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    DOWNLOAD_CACHE_TTL: int = 24 * 60 * 60
 
     # tts
     TTS_APPID: str
     TTS_ACCESS_TOKEN: str
     TTS_CLUSTER: str
+    TTS_API_URL: str = "https://openspeech.bytedance.com/api/v1/tts"
+    # 流式合成：通过 WebSocket 边接收边写盘
+    TTS_STREAMING: bool = False
+    TTS_WS_URL: str = "wss://openspeech.bytedance.com/api/v1/tts/ws_binary"
+    # 分段长度上限、并发合成上限及失败重试
+    TTS_MAX_CHUNK_CHARS: int = 280
+    TTS_CONCURRENCY: int = 4
+    TTS_MAX_RETRIES: int = 3
+    TTS_RETRY_BACKOFF: float = 0.5
+    # 流式文案：边生成边按句提交语音合成，分段累计达到最少字符数即提交；
+    # 切分位置与非流式一致但合并方式不同，两种模式的 TTS 缓存不能互相命中
+    TTS_STREAM_TEXT: bool = False
+    TTS_STREAM_MIN_CHUNK_CHARS: int = 40
+    # 合成结果缓存，按文本与音色参数寻址
+    TTS_CACHE_ENABLED: bool = True
+    TTS_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    TTS_CACHE_MEMORY_BYTES: int = 0
 
     # oss
     BUCKET_NAME: str
     ACCESS_KEY_ID: str
     ACCESS_KEY_SECRET: str
     ENDPOINT: str
+    # 超过阈值的文件分片并发上传，失败的请求按退避重试；分片大小不小于 100KB
+    # 未完成的分片上传需在 bucket 上配置生命周期规则清理
+    OSS_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    OSS_PART_SIZE: int = 8 * 1024 * 1024
+    OSS_UPLOAD_CONCURRENCY: int = 4
+    OSS_MAX_RETRIES: int = 3
+    OSS_RETRY_BACKOFF: float = 0.5
 
     # gpt model
     OPENAI_GPT_MODEL_NAME: str
     OPENAI_GPT_BASE_URL: str
     OPENAI_GPT_API_KEY: str
+    # 流式输出时请求返回 token 用量（stream_options），不支持该参数的兼容服务需关闭
+    OPENAI_GPT_STREAM_USAGE: bool = True
+    # 大模型调用治理：每秒请求数（0 为不限速）、突发容量、在途调用上限及失败重试
+    LLM_RATE_LIMIT: float = 10.0
+    LLM_RATE_BURST: int = 20
+    LLM_MAX_IN_FLIGHT: int = 16
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BACKOFF: float = 1.0
+    # 对冲请求：取得名额后耗时超过近期 p95（不低于最小延迟）且仍有空闲名额时再发一份相同请求
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_DELAY: float = 2.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_LATENCY_WINDOW: int = 200
+
+    # 特效识别时发送给视觉模型的缩略图
+    IMAGE_THUMBNAIL_MAX_SIDE: int = 512
+    IMAGE_THUMBNAIL_QUALITY: int = 70
+    IMAGE_THUMBNAIL_DETAIL: str = "low"
+    # 一次请求识别多张图片的特效，并发管道在 WINDOW 秒内提交的图片合并发送，
+    # 每批不超过 MAX 张
+    IMAGE_EFFECTS_BATCH: bool = True
+    IMAGE_EFFECTS_BATCH_MAX: int = 8
+    IMAGE_EFFECTS_BATCH_WINDOW: float = 0.05
+    # 特效决策缓存，按感知哈希近似匹配
+    IMAGE_EFFECTS_CACHE_ENABLED: bool = True
+    IMAGE_EFFECTS_CACHE_TTL: int = 30 * 24 * 60 * 60
+    IMAGE_EFFECTS_CACHE_MAX_ENTRIES: int = 10000
+    IMAGE_EFFECTS_CACHE_MAX_DISTANCE: int = 4
 
 
 settings = Settings(_env_file=".env")
@@ -1,6 +1,8 @@
 import asyncio
 import math
-from typing import Any
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Set, Tuple
 import os
 from abc import ABC, abstractmethod
 
@@ -10,24 +12,71 @@ from kvidgen.core.agents.editor import Editor, ImageEffectsArtist
 from kvidgen.core.audio.audio_concat import AudioConcatenator
 from kvidgen.core.audio.audio_mixer import FfmpegAudioMixer
 from kvidgen.core.audio.audio_video import FfmpegAudioVideoMerger
-from kvidgen.core.video.video_generator import SlideshowVideoGenerator
-from kvidgen.utils.common import split_text, get_audio_duration, file_to_base64
+from kvidgen.core.config import settings
+from kvidgen.core.video.cost import plan_degradation
+from kvidgen.core.video.ingest import ImageMeta, ingest_images
+from kvidgen.core.video.profile import get_render_profile
+from kvidgen.core.video.video_generator import render_slideshow
+from kvidgen.core.workspace import Workspace
+from kvidgen.utils.common import SentenceSegmenter, split_text, get_audio_duration
 from kvidgen.utils.download import download_file, download_image_file
+from kvidgen.utils.metrics import observe_render, observe_step
 from kvidgen.utils.oss_client import AliyunOssClient
+from kvidgen.utils.process_pool import ProcessPoolManager
 from kvidgen.utils.tts_client import TTSClient
 
 
 class PipelineStep(ABC):
     """
     抽象管道步骤
+
+    requires/provides 声明步骤读取和写入的数据键，DagVideoGenerationPipeline
+    据此构建依赖图，从工作目录恢复时据此判断检查点是否仍然有效。
+    checkpoint 为 True 的步骤完成后将 provides 中的数据写入工作目录的检查点，
+    其值需可 JSON 序列化；artifacts 列出其中指向产物文件的键，恢复前校验文件内容。
     """
 
+    requires: Tuple[str, ...] = ()
+    provides: Tuple[str, ...] = ()
+    checkpoint: bool = True
+    artifacts: Tuple[str, ...] = ()
+
     @abstractmethod
     async def process(self, data: Any) -> Any:
         pass
 
 
+class PrefetchStep(PipelineStep):
+    """
+    后台并发下载图片和背景音乐，与文案生成、语音合成并行，使用方 await 对应任务。
+    """
+
+    requires = ("tmp_dir", "image_urls", "background_music_url")
+    provides = ("image_download", "background_music_download")
+    # 输出为后台任务，无法持久化；使用方均已恢复时跳过
+    checkpoint = False
+
+    async def process(self, data: Any) -> Any:
+        logger.info("Prefetching images and background music")
+        data["image_download"] = asyncio.ensure_future(self.prepare_images(data))
+        data["background_music_download"] = asyncio.ensure_future(
+            download_file(
+                data["background_music_url"], data["tmp_dir"], "background_music.mp3"
+            )
+        )
+        return data
+
+    @staticmethod
+    async def prepare_images(data: Any) -> List[ImageMeta]:
+        """下载图片后立即按渲染档位入库。"""
+        images = await download_image_file(data["tmp_dir"], data["image_urls"])
+        return await ingest_images(images, get_render_profile())
+
+
 class TextGenerationStep(PipelineStep):
+    requires = ("fundraiser_info", "patient_info", "story", "patient_name")
+    provides = ("generated_text",)
+
     async def process(self, data: Any) -> Any:
         logger.info(f"Generating fundraising text for {data['patient_name']}")
         text = await Editor().run(
@@ -43,58 +92,223 @@ class TextGenerationStep(PipelineStep):
 
 
 class TTSSynthesisStep(PipelineStep):
+    requires = ("generated_text", "tmp_dir")
+    provides = ("tts_chunks", "narration_duration")
+    artifacts = ("tts_chunks",)
+
     async def process(self, data: Any) -> Any:
         logger.info("Synthesizing audio from text")
-        tts = TTSClient()
-        tts_chunks = [
-            await tts.synthesize(chunk, os.path.join(data["tmp_dir"], f"tts{i}.mp3"))
-            for i, chunk in enumerate(split_text(data["generated_text"]))
-        ]
+        durations = {}
+
+        def on_progress(index: int, duration: float):
+            # 流式合成时逐帧更新解说总时长，供视频渲染提前确定时长
+            durations[index] = duration
+            data["narration_duration"] = sum(durations.values())
+
+        tts_chunks = await TTSClient().synthesize_chunks(
+            split_text(data["generated_text"], settings.TTS_MAX_CHUNK_CHARS),
+            data["tmp_dir"],
+            on_progress=on_progress,
+        )
         data["tts_chunks"] = tts_chunks
+        data["narration_duration"] = sum(durations.values())
+        return data
+
+
+class StreamingNarrationStep(PipelineStep):
+    """
+    流式生成文案，每凑出完整句子即提交语音合成，使文案生成与语音合成重叠。
+    替代 TextGenerationStep + TTSSynthesisStep，产出相同的 generated_text 与 tts_chunks。
+    """
+
+    requires = ("fundraiser_info", "patient_info", "story", "patient_name", "tmp_dir")
+    provides = ("generated_text", "tts_chunks", "narration_duration")
+    artifacts = ("tts_chunks",)
+
+    async def process(self, data: Any) -> Any:
+        logger.info(f"Streaming fundraising text for {data['patient_name']} into TTS")
+        tts = TTSClient()
+        segmenter = SentenceSegmenter(
+            settings.TTS_MAX_CHUNK_CHARS, settings.TTS_STREAM_MIN_CHUNK_CHARS
+        )
+        semaphore = asyncio.Semaphore(settings.TTS_CONCURRENCY)
+        started = time.monotonic()
+        durations = {}
+        parts: List[str] = []
+        tasks: List[asyncio.Future] = []
+
+        def on_progress(index: int, duration: float):
+            durations[index] = duration
+            data["narration_duration"] = sum(durations.values())
+
+        async def synthesize(index: int, chunk: str) -> str:
+            async with semaphore:
+                return await tts.synthesize_chunk(
+                    index, chunk, data["tmp_dir"], on_progress=on_progress
+                )
+
+        def submit(segments: List[str]):
+            for segment in segments:
+                if not tasks:
+                    logger.debug(
+                        f"First TTS segment submitted after "
+                        f"{time.monotonic() - started:.2f}s"
+                    )
+                tasks.append(asyncio.ensure_future(synthesize(len(tasks), segment)))
+
+        try:
+            async for token in Editor().astream(
+                {
+                    "fundraiser_info": data["fundraiser_info"],
+                    "patient_info": data["patient_info"],
+                    "story": data["story"],
+                }
+            ):
+                parts.append(token)
+                submit(segmenter.feed(token))
+            submit(segmenter.flush())
+            data["generated_text"] = "".join(parts)
+            logger.info(f"Generated text: {data['generated_text']}")
+            data["tts_chunks"] = list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        data["narration_duration"] = sum(durations.values())
         return data
 
 
 class AudioProcessingStep(PipelineStep):
+    requires = ("tts_chunks", "background_music_download", "tmp_dir")
+    provides = ("mixed_audio",)
+    artifacts = ("mixed_audio",)
+
     async def process(self, data: Any) -> Any:
         logger.info("Concatenating and mixing audio")
-        tts_concat = AudioConcatenator().concatenate_audio(
-            data["tts_chunks"], os.path.join(data["tmp_dir"], "tts_concat.mp3")
+        tts_concat = await asyncio.to_thread(
+            AudioConcatenator().concatenate_audio,
+            data["tts_chunks"],
+            os.path.join(data["tmp_dir"], "tts_concat.mp3"),
         )
-        mix_filepath = FfmpegAudioMixer().mix_audio(
+        mix_filepath = await asyncio.to_thread(
+            FfmpegAudioMixer().mix_audio,
             tts_concat,
-            await download_file(
-                data["background_music_url"], data["tmp_dir"], "background_music.mp3"
-            ),
+            await data["background_music_download"],
             os.path.join(data["tmp_dir"], "mix.m4a"),
         )
         data["mixed_audio"] = mix_filepath
         return data
 
 
+class ImageEffectsStep(PipelineStep):
+    """
+    等待图片入库后为每张图片选择特效，不依赖文案与音频，可与之并行。
+    """
+
+    requires = ("image_download",)
+    provides = ("image_meta", "effect_config")
+    artifacts = ("image_meta",)
+
+    async def process(self, data: Any) -> Any:
+        image_meta = await data["image_download"]
+        logger.info(f"Classifying effects for {len(image_meta)} images")
+        data["image_meta"] = [asdict(meta) for meta in image_meta]
+        images = [meta.path for meta in image_meta]
+        effects = await ImageEffectsArtist().classify(images)
+        data["effect_config"] = dict(zip(images, effects))
+        logger.debug(f"images Effect end, effect_config: {data['effect_config']}")
+        return data
+
+
 class VideoGenerationStep(PipelineStep):
+    """
+    渲染幻灯片视频。时长取自解说音频，因此只依赖语音合成，可与混音并行。
+    请求带截止时间且预计来不及时，按成本表替换昂贵特效或降低渲染档位。
+    """
+
+    requires = (
+        "image_meta",
+        "effect_config",
+        "tts_chunks",
+        "narration_duration",
+        "deadline",
+        "render_calibration",
+    )
+    provides = (
+        "slideshow_video",
+        "render_seconds",
+        "render_cpu_seconds",
+        "render_profile",
+        "render_effects",
+        "degradations",
+    )
+    artifacts = ("slideshow_video",)
+
     async def process(self, data: Any) -> Any:
         logger.info("Generating slideshow video")
-        images = await download_image_file(data["tmp_dir"], data["image_urls"])
-        tasks = [ImageEffectsArtist().run(file_to_base64(image)) for image in images]
-        results = await asyncio.gather(*tasks)
-        effect_config = {
-            images[index]: result[0] for index, result in enumerate(results)
-        }
-        logger.debug(f"images Effect end, effect_config: {effect_config}")
-        slideshow_video = SlideshowVideoGenerator(
-            images=images,
+        profile = get_render_profile()
+        image_meta = data["image_meta"]
+        narration_duration = data.get("narration_duration") or sum(
+            [
+                await asyncio.to_thread(get_audio_duration, chunk)
+                for chunk in data["tts_chunks"]
+            ]
+        )
+        total_duration = math.floor(narration_duration) + 1
+        effect_config, degradations = data["effect_config"], []
+        if data.get("deadline"):
+            budget = data["deadline"] - time.time() - settings.DEADLINE_RESERVE
+            effect_config, profile, degradations = plan_degradation(
+                effect_config,
+                total_duration,
+                profile,
+                budget,
+                data.get("render_calibration", 1.0),
+            )
+            if degradations:
+                logger.warning(
+                    f"Degrading render to meet deadline in {budget:.1f}s: "
+                    f"{degradations}"
+                )
+        data["render_profile"] = profile.name
+        # 降级后实际渲染的特效，供成本模型校准
+        data["render_effects"] = [
+            effect_config.get(meta["path"], []) for meta in image_meta
+        ]
+        data["degradations"] = degradations
+        started = time.monotonic()
+        # 墙钟耗时含进程池排队时间，成本模型改用子进程内测得的 CPU 秒数校准
+        (
+            data["slideshow_video"],
+            data["render_cpu_seconds"],
+        ) = await ProcessPoolManager().run_measured(
+            render_slideshow,
+            images=[meta["path"] for meta in image_meta],
             output_path=os.path.join(data["tmp_dir"], "slideshow.mp4"),
-            total_duration=math.floor(get_audio_duration(data["mixed_audio"])) + 1,
+            total_duration=total_duration,
             effect_config=effect_config,
-        ).create_video()
-        data["slideshow_video"] = slideshow_video
+            fps=profile.fps,
+            base_height=profile.height,
+            image_sizes={
+                meta["path"]: (meta["width"], meta["height"]) for meta in image_meta
+            },
+        )
+        data["render_seconds"] = time.monotonic() - started
+        observe_render(
+            profile.name, profile.fps * total_duration, data["render_seconds"]
+        )
         return data
 
 
 class VideoAudioMergeStep(PipelineStep):
+    requires = ("slideshow_video", "mixed_audio", "tmp_dir")
+    provides = ("result_video",)
+    artifacts = ("result_video",)
+
     async def process(self, data: Any) -> Any:
         logger.info("Merging audio and video")
-        result_path = FfmpegAudioVideoMerger().merge(
+        result_path = await asyncio.to_thread(
+            FfmpegAudioVideoMerger().merge,
             data["slideshow_video"],
             data["mixed_audio"],
             os.path.join(data["tmp_dir"], "result.mp4"),
@@ -104,21 +318,190 @@ class VideoAudioMergeStep(PipelineStep):
 
 
 class UploadStep(PipelineStep):
+    requires = ("result_video", "patient_name", "render_profile")
+    provides = ("object_key", "renditions")
+
     async def process(self, data: Any) -> Any:
         logger.info("Uploading video to OSS")
         oss_client = AliyunOssClient()
-        object_key = f"tmp/video/{data['patient_name']}.mp4"
+        profile = get_render_profile(data.get("render_profile"))
+        # 对象键带上请求指纹，不同请求的同名患者不会互相覆盖已缓存的结果
+        suffix = f"-{data['fingerprint'][:16]}" if data.get("fingerprint") else ""
+        object_key = f"tmp/video/{data['patient_name']}{suffix}.mp4"
         await oss_client.upload_file(data["result_video"], object_key)
-        data["video_url"] = await oss_client.generate_signed_url(object_key=object_key)
+        data["object_key"] = object_key
+        data["renditions"] = [
+            {
+                "profile": profile.name,
+                "height": profile.height,
+                "object_key": object_key,
+            }
+        ]
         return data
 
 
 class VideoGenerationPipeline:
-    def __init__(self, steps):
+    """
+    按列表顺序依次执行步骤。
+    指定工作目录时先恢复已完成步骤的检查点，只执行其余步骤，每个步骤完成后写入检查点。
+    """
+
+    def __init__(self, steps, workspace: Optional[Workspace] = None):
         self.steps = steps
+        self.workspace = workspace
 
     async def run(self, initial_data: Any) -> Any:
         data = initial_data
-        for step in self.steps:
+        skipped = await self.resume(data)
+        try:
+            for step in self.steps:
+                if step not in skipped:
+                    data = await self.run_step(step, data)
+        except BaseException:
+            self.cancel_background(data)
+            raise
+        return data
+
+    async def run_step(self, step: PipelineStep, data: Any) -> Any:
+        with observe_step(type(step).__name__):
             data = await step.process(data)
+        if self.workspace is not None and step.checkpoint:
+            await asyncio.to_thread(
+                self.workspace.record,
+                type(step).__name__,
+                {key: data.get(key) for key in step.provides},
+                step.artifacts,
+            )
+        return data
+
+    async def resume(self, data: Any) -> Set[PipelineStep]:
+        """
+        从工作目录恢复检查点写入 data。上游检查点步骤未恢复的步骤需要重新执行，
+        输出只被已恢复步骤使用的非检查点步骤（如预取）也无需执行。
+        :param data: 管道数据。
+        :return: 无需执行的步骤。
+        """
+        if self.workspace is None:
+            return set()
+        producers = {key: step for step in self.steps for key in step.provides}
+        upstream = {
+            step: {
+                producers[key]
+                for key in step.requires
+                if key in producers and producers[key] is not step
+            }
+            for step in self.steps
+        }
+        restored: Set[PipelineStep] = set()
+        tried: Set[PipelineStep] = set()
+        progress = True
+        while progress:
+            progress = False
+            for step in self.steps:
+                if not step.checkpoint or step in tried:
+                    continue
+                if any(s.checkpoint and s not in restored for s in upstream[step]):
+                    continue
+                tried.add(step)
+                outputs = await asyncio.to_thread(
+                    self.workspace.restore, type(step).__name__
+                )
+                if outputs is not None:
+                    data.update(outputs)
+                    restored.add(step)
+                    progress = True
+
+        skipped = set(restored)
+        for step in self.steps:
+            consumers = [s for s in self.steps if step in upstream[s]]
+            if not step.checkpoint and consumers and set(consumers) <= restored:
+                skipped.add(step)
+        if restored:
+            data["resumed_steps"] = [
+                type(s).__name__ for s in self.steps if s in restored
+            ]
+            logger.info(f"Resumed from checkpoints: {data['resumed_steps']}")
+        return skipped
+
+    @staticmethod
+    def cancel_background(data: Any) -> None:
+        # 取消仍在后台运行的预取任务，避免失败后继续占用连接和磁盘
+        for value in data.values():
+            if isinstance(value, asyncio.Future):
+                value.cancel()
+
+
+class DagVideoGenerationPipeline(VideoGenerationPipeline):
+    """
+    按步骤声明的 requires/provides 构建依赖图，输入就绪的步骤立即启动，
+    互不依赖的步骤并发执行。任一步骤失败时取消其余正在运行的步骤并抛出该异常。
+    初始数据中已有的键视为就绪；同一个键只能由一个步骤提供。
+    """
+
+    def __init__(self, steps, workspace: Optional[Workspace] = None):
+        super().__init__(steps, workspace)
+        self.producers: Dict[str, PipelineStep] = {}
+        for step in steps:
+            for key in step.provides:
+                if key in self.producers:
+                    raise ValueError(
+                        f"{key!r} is provided by both "
+                        f"{type(self.producers[key]).__name__} and {type(step).__name__}"
+                    )
+                self.producers[key] = step
+
+    def dependencies(self, initial_keys) -> Dict[PipelineStep, Set[PipelineStep]]:
+        """
+        :param initial_keys: 初始数据中的键。
+        :return: 每个步骤依赖的上游步骤集合。
+        """
+        graph = {}
+        for step in self.steps:
+            upstream = set()
+            for key in step.requires:
+                producer = self.producers.get(key)
+                if producer is None and key not in initial_keys:
+                    raise ValueError(
+                        f"{type(step).__name__} requires {key!r}, "
+                        f"which no step provides"
+                    )
+                if producer is not None and producer is not step:
+                    upstream.add(producer)
+            graph[step] = upstream
+        return graph
+
+    async def run(self, initial_data: Any) -> Any:
+        data = initial_data
+        done: Set[PipelineStep] = await self.resume(data)
+        graph = self.dependencies(data.keys())
+        running: Dict[asyncio.Future, PipelineStep] = {}
+        started: Dict[PipelineStep, float] = {}
+        try:
+            while len(done) < len(self.steps):
+                for step in self.steps:
+                    if step in done or step in started or not graph[step] <= done:
+                        continue
+                    started[step] = time.monotonic()
+                    running[asyncio.ensure_future(self.run_step(step, data))] = step
+                if not running:
+                    pending = [type(s).__name__ for s in self.steps if s not in done]
+                    raise ValueError(f"Pipeline has a dependency cycle: {pending}")
+
+                finished, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    step = running.pop(task)
+                    task.result()
+                    done.add(step)
+                    logger.debug(
+                        f"{type(step).__name__} finished in "
+                        f"{time.monotonic() - started[step]:.2f}s"
+                    )
+        except BaseException:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            self.cancel_background(data)
+            raise
         return data
@@ -0,0 +1,137 @@
+from typing import Dict, List, Optional, Tuple
+
+from kvidgen.core.video.profile import RENDER_PROFILES, RenderProfile
+
+# 各特效处理一帧每百万像素的耗时（秒），由 python -m benchmark.effect_costs 测得
+EFFECT_FRAME_COST = {
+    "zoom": 0.0095,
+    "fade_in": 0.0098,
+    "grayscale": 0.0017,
+    "heartbeat": 0.0092,
+    "spotlight": 0.0950,
+    "tear_drop": 0.0045,
+    "heart_pulse": 0.0740,
+    "blur_transition": 0.0042,
+    "color_shift": 0.0153,
+    "vignette": 0.1407,
+    "light_flicker": 0.0029,
+}
+# mp4v 编码一帧每百万像素的耗时（秒）
+ENCODE_FRAME_COST = 0.0083
+# 单张图片解码与缩放的耗时（秒）
+IMAGE_DECODE_COST = 0.05
+# 特效未知时按每张图片两个平均成本的特效估算
+DEFAULT_EFFECTS_PER_IMAGE = 2
+MEAN_EFFECT_COST = sum(EFFECT_FRAME_COST.values()) / len(EFFECT_FRAME_COST)
+# 截止时间紧张时昂贵特效的廉价替代，None 表示去掉该特效。
+# 模糊类特效（blur_transition、tear_drop）实测已足够便宜，不做替换
+CHEAP_EQUIVALENTS = {
+    "heart_pulse": "heartbeat",
+    "spotlight": "fade_in",
+    "vignette": None,
+}
+
+
+def frame_megapixels(profile: RenderProfile) -> float:
+    """按 16:9 横屏估算档位的单帧像素数（百万）。"""
+    return profile.height * profile.height * 16 / 9 / 1e6
+
+
+def effects_frame_cost(effects: List[str]) -> float:
+    """:return: 一组特效处理一帧每百万像素的耗时之和（秒）。"""
+    return sum(EFFECT_FRAME_COST.get(name, MEAN_EFFECT_COST) for name in effects)
+
+
+def estimate_render_seconds(
+    image_count: int,
+    duration: float,
+    profile: RenderProfile,
+    effects: Optional[List[List[str]]] = None,
+) -> float:
+    """
+    估算渲染幻灯片视频所需的 CPU 时间。
+    :param image_count: 图片数量。
+    :param duration: 视频时长（秒）。
+    :param profile: 渲染档位。
+    :param effects: 每张图片的特效列表，未知时按平均特效估算。
+    :return: 预计 CPU 秒数。
+    """
+    if effects:
+        effect_cost = sum(effects_frame_cost(e) for e in effects) / len(effects)
+    else:
+        effect_cost = DEFAULT_EFFECTS_PER_IMAGE * MEAN_EFFECT_COST
+    frames = profile.fps * duration
+    return image_count * IMAGE_DECODE_COST + frames * frame_megapixels(profile) * (
+        ENCODE_FRAME_COST + effect_cost
+    )
+
+
+def plan_degradation(
+    effect_config: Dict[str, List[str]],
+    duration: float,
+    profile: RenderProfile,
+    budget: float,
+    calibration: float = 1.0,
+) -> Tuple[Dict[str, List[str]], RenderProfile, List[dict]]:
+    """
+    预计渲染耗时超出预算时逐级降级：先按节省耗时从大到小将昂贵特效换成廉价替代，
+    仍超出时逐档降低渲染档位；降到最低档仍超出时按最低档渲染。
+    :param effect_config: 每张图片的特效列表映射。
+    :param duration: 视频时长（秒）。
+    :param profile: 原定渲染档位。
+    :param budget: 留给渲染的秒数。
+    :param calibration: 成本模型的校准系数。
+    :return: 降级后的特效映射、渲染档位与已应用的降级记录。
+    """
+    config = {path: list(effects) for path, effects in effect_config.items()}
+
+    def fits() -> bool:
+        estimate = estimate_render_seconds(
+            len(config), duration, profile, list(config.values())
+        )
+        return estimate * calibration <= budget
+
+    degradations = []
+    if fits():
+        return config, profile, degradations
+
+    savings = {}
+    for effects in config.values():
+        for name in effects:
+            if name not in CHEAP_EQUIVALENTS:
+                continue
+            substitute = CHEAP_EQUIVALENTS[name]
+            saving = EFFECT_FRAME_COST.get(name, MEAN_EFFECT_COST) - (
+                EFFECT_FRAME_COST.get(substitute, MEAN_EFFECT_COST) if substitute else 0
+            )
+            if saving > 0:
+                savings[name] = savings.get(name, 0) + saving
+    for name in sorted(savings, key=savings.get, reverse=True):
+        substitute = CHEAP_EQUIVALENTS[name]
+        images = 0
+        for path, effects in config.items():
+            if name not in effects:
+                continue
+            images += 1
+            replaced = []
+            for effect in effects:
+                effect = substitute if effect == name else effect
+                if effect and effect not in replaced:
+                    replaced.append(effect)
+            config[path] = replaced
+        degradations.append(
+            {"type": "effect", "from": name, "to": substitute, "images": images}
+        )
+        if fits():
+            return config, profile, degradations
+
+    for lower in sorted(
+        (p for p in RENDER_PROFILES.values() if p.height < profile.height),
+        key=lambda p: p.height,
+        reverse=True,
+    ):
+        degradations.append({"type": "profile", "from": profile.name, "to": lower.name})
+        profile = lower
+        if fits():
+            break
+    return config, profile, degradations
@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import List
+
+import cv2
+import numpy as np
+
+from kvidgen.core.video.profile import RenderProfile
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+@dataclass
+class ImageMeta:
+    """入库后的图片元数据，供后续步骤复用，避免重复解码。"""
+
+    path: str
+    source_path: str
+    width: int
+    height: int
+    sha256: str
+
+
+def _load_oriented(path: str, max_side: int) -> np.ndarray:
+    """读取图片，按 EXIF 方向摆正并下采样到长边不超过 max_side。"""
+    # IMREAD_COLOR 会按 EXIF Orientation 旋转图片
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"无法读取图片 {path}")
+
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        img = cv2.resize(
+            img,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    return img
+
+
+def _encode_jpeg(img: np.ndarray, quality: int, path: str) -> bytes:
+    ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"无法编码图片 {path}")
+    return buffer.tobytes()
+
+
+def normalize_image(
+    src_path: str, dst_path: str, max_side: int, quality: int
+) -> ImageMeta:
+    """
+    图片入库：按 EXIF 方向摆正、下采样到长边不超过 max_side 并重新编码为 JPEG。
+    结果写入新文件，不修改 src_path（其可能是下载缓存的硬链接）。
+    :param src_path: 原始图片路径。
+    :param dst_path: 输出路径。
+    :param max_side: 长边上限（像素）。
+    :param quality: JPEG 质量。
+    :return: 图片元数据。
+    """
+    img = _load_oriented(src_path, max_side)
+    h, w = img.shape[:2]
+    content = _encode_jpeg(img, quality, src_path)
+    tmp_path = f"{dst_path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(content)
+    os.replace(tmp_path, dst_path)
+
+    return ImageMeta(
+        path=dst_path,
+        source_path=src_path,
+        width=w,
+        height=h,
+        sha256=hashlib.sha256(content).hexdigest(),
+    )
+
+
+async def ingest_images(images: List[str], profile: RenderProfile) -> List[ImageMeta]:
+    """
+    在 CPU 进程池中并发入库图片。
+    :param images: 下载后的图片路径列表。
+    :param profile: 渲染档位，决定下采样尺寸与编码质量。
+    :return: 与 images 顺序一致的元数据列表。
+    """
+    pool = ProcessPoolManager()
+    return list(
+        await asyncio.gather(
+            *(
+                pool.run(
+                    normalize_image,
+                    image,
+                    f"{os.path.splitext(image)[0]}.ingest.jpg",
+                    profile.max_image_side,
+                    profile.jpeg_quality,
+                )
+                for image in images
+            )
+        )
+    )
+
+
+def encode_thumbnail(src_path: str, max_side: int, quality: int) -> str:
+    """
+    在内存中生成缩略图并编码为 Base64 JPEG，不落盘。
+    :param src_path: 图片路径。
+    :param max_side: 缩略图长边上限（像素）。
+    :param quality: JPEG 质量。
+    :return: Base64 编码的字符串。
+    """
+    img = _load_oriented(src_path, max_side)
+    return base64.b64encode(_encode_jpeg(img, quality, src_path)).decode("utf-8")
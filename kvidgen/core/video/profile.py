@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from kvidgen.core.config import settings
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """
+    渲染档位。
+    :param name: 档位名称。
+    :param height: 视频帧高度，宽度按图片平均宽高比计算。
+    :param fps: 视频帧率。
+    :param max_image_side: 素材入库时图片长边上限，超过则下采样。
+    :param jpeg_quality: 素材入库时重新编码的 JPEG 质量。
+    """
+
+    name: str
+    height: int
+    fps: int = 30
+    max_image_side: int = 1920
+    jpeg_quality: int = 90
+
+
+RENDER_PROFILES = {
+    "1080p": RenderProfile("1080p", 1080, 30, 1920, 90),
+    "720p": RenderProfile("720p", 720, 30, 1280, 88),
+    "480p": RenderProfile("480p", 480, 25, 854, 85),
+}
+
+
+def get_render_profile(name: Optional[str] = None) -> RenderProfile:
+    """按名称获取渲染档位，默认取 RENDER_PROFILE。"""
+    name = name or settings.RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"渲染档位 '{name}' 不存在。")
+    return RENDER_PROFILES[name]
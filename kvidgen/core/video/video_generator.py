@@ -16,6 +16,8 @@ class SlideshowVideoGenerator:
         total_duration: int = 10,
         duration_config: Dict[str, int] = None,
         effect_config: Dict[str, List[str]] = None,
+        base_height: int = 1080,
+        image_sizes: Dict[str, Tuple[int, int]] = None,
     ):
         """
         初始化图片轮播视频生成器。
@@ -26,6 +28,8 @@ class SlideshowVideoGenerator:
         :param total_duration: 视频总时长（秒）。
         :param duration_config: 每张图片的显示时长（秒）。
         :param effect_config: 每张图片的特效列表映射。
+        :param base_height: 动态计算帧大小时的基准高度。
+        :param image_sizes: 已知的图片尺寸 (宽度, 高度)，避免为计算帧大小重复解码图片。
         """
         self.images = images
         self.output_path = output_path
@@ -34,6 +38,8 @@ class SlideshowVideoGenerator:
         self.total_duration = total_duration
         self.duration_config = duration_config or {}
         self.effect_config = effect_config or {}
+        self.base_height = base_height
+        self.image_sizes = image_sizes or {}
         self.validate_inputs()
         if self.frame_size is None:
             self.frame_size = self.calculate_dynamic_frame_size()
@@ -54,6 +60,10 @@ class SlideshowVideoGenerator:
         """
         aspect_ratios = []
         for image_path in self.images:
+            if image_path in self.image_sizes:
+                w, h = self.image_sizes[image_path]
+                aspect_ratios.append(w / h)
+                continue
             img = cv2.imread(image_path)
             if img is not None:
                 h, w = img.shape[:2]
@@ -63,7 +73,7 @@ class SlideshowVideoGenerator:
             raise ValueError("无法读取任何图片，无法计算动态帧大小。")
 
         avg_aspect_ratio = sum(aspect_ratios) / len(aspect_ratios)
-        base_height = 1080  # 设定基准高度
+        base_height = self.base_height  # 设定基准高度
         frame_width = int(base_height * avg_aspect_ratio)
         return frame_width, base_height
 
@@ -138,3 +148,12 @@ class SlideshowVideoGenerator:
         return cv2.copyMakeBorder(
             resized_img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(0, 0, 0)
         )
+
+
+def render_slideshow(**kwargs) -> str:
+    """
+    生成图片轮播视频，供 CPU 进程池调用（需为模块级函数以便 pickle）。
+    :param kwargs: SlideshowVideoGenerator 的构造参数。
+    :return: 输出视频路径。
+    """
+    return SlideshowVideoGenerator(**kwargs).create_video()
@@ -0,0 +1,213 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.utils.common import singleton
+from kvidgen.utils.download_cache import sha256_file
+
+
+def artifact_paths(value: Any) -> List[str]:
+    """
+    提取步骤输出中的产物文件路径。
+    :param value: 文件路径、路径列表或带 path 字段的字典列表（如 image_meta）。
+    :return: 文件路径列表。
+    """
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [path for item in value for path in artifact_paths(item)]
+    if isinstance(value, dict) and "path" in value:
+        return artifact_paths(value["path"])
+    return []
+
+
+class Workspace:
+    """
+    单个视频任务的持久化工作目录。
+
+    manifest.json 记录已完成步骤的输出及其产物文件的 sha256，
+    管道失败后目录保留，重试时恢复校验通过的步骤输出，从第一个未完成的步骤继续。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.steps: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(os.path.join(self.path, self.MANIFEST)) as file:
+                return json.load(file)["steps"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def _save(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump({"updated_at": time.time(), "steps": self.steps}, file)
+        os.replace(tmp_path, os.path.join(self.path, self.MANIFEST))
+
+    def restore(self, name: str) -> Optional[dict]:
+        """
+        读取步骤的检查点，产物文件缺失或内容被改动时作废该检查点。
+        :param name: 步骤名称。
+        :return: 步骤输出，无有效检查点时为 None。
+        """
+        entry = self.steps.get(name)
+        if entry is None:
+            return None
+        for path, sha256 in entry["files"].items():
+            try:
+                valid = sha256_file(path) == sha256
+            except FileNotFoundError:
+                valid = False
+            if not valid:
+                logger.warning(f"Checkpoint of {name} is stale: {path} changed")
+                with self._lock:
+                    self.steps.pop(name, None)
+                    self._save()
+                return None
+        return entry["outputs"]
+
+    def record(self, name: str, outputs: dict, artifacts: Sequence[str]) -> None:
+        """
+        保存步骤的检查点。
+        :param name: 步骤名称。
+        :param outputs: 步骤写入的数据，需可 JSON 序列化。
+        :param artifacts: outputs 中指向产物文件的键，保存文件内容的 sha256 供恢复时校验。
+        :raises ValueError: 产物为空或文件不存在，此时不写入检查点。
+        """
+        paths = []
+        for key in artifacts:
+            value = outputs.get(key)
+            found = artifact_paths(value)
+            if not found or not all(os.path.isfile(path) for path in found):
+                raise ValueError(f"Step {name} has no artifact for {key}: {value!r}")
+            paths.extend(found)
+        files = {path: sha256_file(path) for path in paths}
+        with self._lock:
+            self.steps[name] = {
+                "outputs": outputs,
+                "files": files,
+                "completed_at": time.time(),
+            }
+            self._save()
+
+
+@singleton
+class WorkspaceManager:
+    """
+    管理 CACHE_DIR/workspaces 下的任务工作目录，按请求指纹命名。
+    每个工作目录一把 fcntl 文件锁，同一请求在多个 worker 上不会同时写入；
+    打开新工作目录前清理超过 WORKSPACE_TTL 的目录，总大小超过
+    WORKSPACE_MAX_BYTES 时按最后更新时间淘汰，正在使用的目录不会被清理。
+    """
+
+    def __init__(self):
+        root = os.path.abspath(os.path.join(settings.CACHE_DIR, "workspaces"))
+        self.jobs_dir = os.path.join(root, "jobs")
+        self.locks_dir = os.path.join(root, "locks")
+        for directory in (self.jobs_dir, self.locks_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.resumed = 0
+        self.steps_restored = 0
+        self.evicted = 0
+
+    @asynccontextmanager
+    async def open(self, key: str):
+        """
+        打开并锁定工作目录，退出上下文时释放锁，目录保留供重试使用。
+        :param key: 请求指纹。
+        """
+        await asyncio.to_thread(self.collect_garbage)
+        fd = os.open(os.path.join(self.locks_dir, key), os.O_CREAT | os.O_RDWR)
+        try:
+            # 管道耗时可达数分钟，轮询非阻塞锁，避免长期占用线程池
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.5)
+            yield Workspace(os.path.join(self.jobs_dir, key))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @staticmethod
+    def remove(workspace: Workspace) -> None:
+        """任务成功后删除工作目录，结果由结果缓存复用。"""
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+    def record_resume(self, steps: int) -> None:
+        self.resumed += 1
+        self.steps_restored += steps
+
+    def _scan(self) -> List[tuple]:
+        """:return: 各工作目录的 (最后更新时间, 大小, 键)。"""
+        entries = []
+        for key in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, key)
+            try:
+                size, updated = 0, os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            for root, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    size += stat.st_size
+                    updated = max(updated, stat.st_mtime)
+            entries.append((updated, size, key))
+        return entries
+
+    def _try_remove(self, key: str) -> bool:
+        fd = os.open(os.path.join(self.locks_dir, key), os.O_CREAT | os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            shutil.rmtree(os.path.join(self.jobs_dir, key), ignore_errors=True)
+            return True
+        finally:
+            os.close(fd)
+
+    def collect_garbage(self) -> None:
+        """清理过期工作目录，并按最后更新时间淘汰直到总大小不超过上限。"""
+        expire = time.time() - settings.WORKSPACE_TTL
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        for updated, size, key in entries:
+            if updated >= expire and total <= settings.WORKSPACE_MAX_BYTES:
+                break
+            if self._try_remove(key):
+                total -= size
+                self.evicted += 1
+                logger.info(f"Evicted workspace {key[:16]}")
+
+    def stats(self) -> dict:
+        entries = self._scan()
+        return {
+            "workspaces": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": settings.WORKSPACE_MAX_BYTES,
+            "resumed": self.resumed,
+            "steps_restored": self.steps_restored,
+            "evicted": self.evicted,
+        }
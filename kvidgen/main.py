@@ -1,13 +1,34 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
 from kvidgen.api.api_routers import api_router
 from kvidgen.core.config import settings
+from kvidgen.service.jobs import JobManager
+from kvidgen.utils.http_client import HttpClientManager
+from kvidgen.utils.oss_client import AliyunOssClient
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """应用生命周期：启动时创建共享资源，退出时释放。"""
+    await HttpClientManager().startup()
+    await ProcessPoolManager().startup()
+    await JobManager().startup()
+    yield
+    await JobManager().shutdown()
+    await ProcessPoolManager().shutdown()
+    await AliyunOssClient().shutdown()
+    await HttpClientManager().shutdown()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     dependencies=[],
     version=f"{settings.VERSION}",
+    lifespan=lifespan,
 )
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
@@ -14,8 +14,14 @@ class HttpResponse(BaseModel, Generic[T]):
     metadata: Optional[dict] = Field(default=None, exclude=True)
 
     @staticmethod
-    def ok(data: T):
-        return HttpResponse(code=status.HTTP_200_OK, message="ok", data=data)
+    def ok(data: T, metadata: Optional[dict] = None):
+        return HttpResponse(
+            code=status.HTTP_200_OK, message="ok", data=data, metadata=metadata
+        )
+
+    def with_metadata(self) -> JSONResponse:
+        """metadata 默认不写入响应体，调用方需要时以此返回完整响应。"""
+        return JSONResponse(content=self.__dict__)
 
     @staticmethod
     def err(
@@ -24,10 +30,12 @@ class HttpResponse(BaseModel, Generic[T]):
         message: Optional[str] = None,
         detail: Optional[dict] = None,
         metadata: Optional[dict] = None,
+        headers: Optional[dict] = None,
     ):
         return JSONResponse(
             status_code=http_status_code,
             content=HttpResponse(
-                code=business_code, message=message, detail=detail, metadata=metadata
+                code=business_code, message=message, data=detail, metadata=metadata
             ).__dict__,
+            headers=headers,
         )
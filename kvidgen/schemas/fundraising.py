@@ -1,10 +1,8 @@
 from urllib.parse import urlparse
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PositiveFloat, field_validator
 from typing import List, Optional
 
-from pydantic.v1 import Field, validator
-
 
 class PatientInfo(BaseModel):
     """患者基础信息"""
@@ -44,17 +42,20 @@ class FundraisingRequest(BaseModel):
     fundraising_text: str = Field(..., description="筹款文案")
     image_urls: List[str] = Field(..., description="图片链接列表")
     background_music_url: str = Field(
-        ..., description="背景音乐链接", regex=r"^https?://[^\s]+$"
+        ..., description="背景音乐链接", pattern=r"^https?://[^\s]+$"
     )
-
-    @validator("image_urls", each_item=True)
-    def validate_image_urls(cls, value):  # noqa
-        try:
-            result = urlparse(value)
-            if not all([result.scheme, result.netloc]):
-                raise ValueError("Invalid URL")
-            if result.scheme not in ["http", "https"]:
-                raise ValueError("URL scheme must be http or https")
-        except ValueError as e:
-            raise ValueError(f"Invalid URL: {value}") from e
-        return value
+    # 期望在提交后多少秒内拿到视频，预计超时则自动降低特效与分辨率
+    deadline_seconds: Optional[PositiveFloat] = None
+
+    @field_validator("image_urls")
+    def validate_image_urls(cls, values):  # noqa
+        for value in values:
+            try:
+                result = urlparse(value)
+                if not all([result.scheme, result.netloc]):
+                    raise ValueError("Invalid URL")
+                if result.scheme not in ["http", "https"]:
+                    raise ValueError("URL scheme must be http or https")
+            except ValueError as e:
+                raise ValueError(f"Invalid URL: {value}") from e
+        return values
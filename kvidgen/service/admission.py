@@ -0,0 +1,213 @@
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.core.video.cost import estimate_render_seconds
+from kvidgen.core.video.profile import RenderProfile
+from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import observe_queue
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+class Overloaded(RuntimeError):
+    """预计积压超出上限，调用方应在 retry_after 秒后重试。"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderCostModel:
+    """
+    渲染成本模型：以特效成本表估算渲染 CPU 秒数，再用历史任务的实测耗时校准。
+    准入时特效尚未识别，按平均特效估算；校准时使用实际渲染的特效，
+    使校准系数不随请求的特效组合波动。
+    校准系数与每字解说时长按指数滑动平均更新，持久化到 CACHE_DIR/cost_model.json。
+    """
+
+    # 指数滑动平均中新样本的权重
+    ALPHA = 0.2
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(settings.CACHE_DIR, "cost_model.json")
+        self.calibration = 1.0
+        # 语音合成约每秒 4.5 个汉字
+        self.seconds_per_char = 1 / 4.5
+        self.samples = 0
+        try:
+            with open(self.path) as file:
+                state = json.load(file)
+            self.calibration = state["calibration"]
+            self.seconds_per_char = state["seconds_per_char"]
+            self.samples = state["samples"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def narration_seconds(self, text: str) -> float:
+        """按文案长度估算解说时长，限制在 10 秒到 5 分钟之间。"""
+        return min(300.0, max(10.0, len(text) * self.seconds_per_char))
+
+    def raw_estimate(
+        self,
+        param: FundraisingRequest,
+        profile: RenderProfile,
+        effects: Optional[List[List[str]]] = None,
+    ) -> float:
+        """
+        :param effects: 每张图片的特效列表，未知时按平均特效估算。
+        :return: 未经校准的渲染 CPU 秒数。
+        """
+        return estimate_render_seconds(
+            len(param.image_urls),
+            self.narration_seconds(param.fundraising_text),
+            profile,
+            effects,
+        )
+
+    def estimate(self, param: FundraisingRequest, profile: RenderProfile) -> float:
+        """:return: 校准后的渲染 CPU 秒数。"""
+        return self.raw_estimate(param, profile) * self.calibration
+
+    def record(
+        self,
+        param: FundraisingRequest,
+        profile: RenderProfile,
+        render_seconds: float,
+        narration_seconds: Optional[float] = None,
+        effects: Optional[List[List[str]]] = None,
+    ) -> None:
+        """
+        以一次任务的实测耗时校准模型。
+        :param render_seconds: 渲染实际消耗的 CPU 秒数，不含在进程池中排队的时间。
+        :param narration_seconds: 实际解说时长（秒）。
+        :param effects: 实际渲染的每张图片的特效列表。
+        """
+        if narration_seconds and param.fundraising_text:
+            self.seconds_per_char += self.ALPHA * (
+                narration_seconds / len(param.fundraising_text) - self.seconds_per_char
+            )
+        raw = self.raw_estimate(param, profile, effects)
+        if raw > 0 and render_seconds > 0:
+            self.calibration += self.ALPHA * (render_seconds / raw - self.calibration)
+        self.samples += 1
+        self._save()
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(
+                {
+                    "calibration": self.calibration,
+                    "seconds_per_char": self.seconds_per_char,
+                    "samples": self.samples,
+                },
+                file,
+            )
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        return {
+            "calibration": round(self.calibration, 3),
+            "seconds_per_char": round(self.seconds_per_char, 4),
+            "samples": self.samples,
+        }
+
+
+@singleton
+class AdmissionController:
+    """
+    准入控制：同时运行的管道数不超过 ADMISSION_MAX_CONCURRENT，其余按到达顺序排队。
+    排队与运行中任务的剩余渲染成本除以 CPU 进程池 worker 数即为预计积压（秒），
+    超过 ADMISSION_MAX_BACKLOG 时拒绝新请求。
+    """
+
+    def __init__(self):
+        self.cost_model = RenderCostModel()
+        self.workers = ProcessPoolManager().max_workers
+        self.max_concurrent = settings.ADMISSION_MAX_CONCURRENT or self.workers * 2
+        self._running: Dict[object, tuple] = {}
+        self._queued: Dict[object, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def backlog_seconds(self) -> float:
+        """:return: 排队与运行中任务的剩余渲染成本摊到每个 CPU worker 上的秒数。"""
+        now = time.monotonic()
+        remaining = sum(
+            max(0.0, cost - (now - started)) for cost, started in self._running.values()
+        )
+        return (remaining + sum(self._queued.values())) / self.workers
+
+    @asynccontextmanager
+    async def admit(self, cost: float, reject: bool = True):
+        """
+        申请运行一个管道，退出上下文时释放名额。
+        :param cost: 预计渲染 CPU 秒数。
+        :param reject: 积压超限时是否拒绝；已经排过队的异步任务传 False 仅等待。
+        :raises Overloaded: 预计积压超过 ADMISSION_MAX_BACKLOG。
+        """
+        backlog = self.backlog_seconds() + cost / self.workers
+        if reject and self._running and backlog > settings.ADMISSION_MAX_BACKLOG:
+            self.rejected += 1
+            retry_after = max(1, math.ceil(backlog - settings.ADMISSION_MAX_BACKLOG))
+            raise Overloaded(
+                f"Estimated backlog {backlog:.0f}s exceeds "
+                f"{settings.ADMISSION_MAX_BACKLOG:.0f}s",
+                retry_after,
+            )
+
+        ticket = object()
+        changed = self._condition()
+        self._queued[ticket] = cost
+        queued_at = time.monotonic()
+        try:
+            async with changed:
+                await changed.wait_for(
+                    lambda: len(self._running) < self.max_concurrent
+                    and next(iter(self._queued)) is ticket
+                )
+                del self._queued[ticket]
+                self._running[ticket] = (cost, time.monotonic())
+                observe_queue("admission", time.monotonic() - queued_at)
+                # 队首变化，唤醒下一个排队者检查是否还有空闲名额
+                changed.notify_all()
+            self.admitted += 1
+            yield
+        finally:
+            self._queued.pop(ticket, None)
+            self._running.pop(ticket, None)
+            async with changed:
+                changed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "running": len(self._running),
+            "queued": len(self._queued),
+            "backlog_seconds": round(self.backlog_seconds(), 1),
+            "max_backlog_seconds": settings.ADMISSION_MAX_BACKLOG,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "cost_model": self.cost_model.stats(),
+        }
@@ -0,0 +1,55 @@
+import asyncio
+from typing import AsyncIterator, List
+
+from loguru import logger
+from pydantic import ValidationError
+
+from kvidgen.core.config import settings
+from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.service.admission import AdmissionController
+from kvidgen.service.video import produce_video
+from kvidgen.utils.oss_client import AliyunOssClient
+
+
+async def generate_batch(items: List[dict]) -> AsyncIterator[dict]:
+    """
+    批量生成筹款视频，按完成顺序逐条返回结果，单条失败不影响其余条目。
+
+    各条目并发运行，同时运行的管道数不超过 BATCH_CONCURRENCY（0 时取准入控制的并发上限），
+    渲染由 CPU 进程池调度到各个核心。条目之间共享的背景音乐与图片经下载缓存只下载一次，
+    各条目的图片特效识别合并成批量请求，完全相同的请求合并为一次生成。
+
+    :param items: 筹款请求参数（未校验的字典），逐条校验
+    :return: 异步迭代的结果，包含 index、status，成功时带 video_url 等字段，失败时带 error
+    """
+    limit = settings.BATCH_CONCURRENCY or AdmissionController().max_concurrent
+    semaphore = asyncio.Semaphore(limit)
+    logger.info(f"Start batch of {len(items)} videos with concurrency {limit}")
+
+    async def run(index: int, item: dict) -> dict:
+        try:
+            param = FundraisingRequest.model_validate(item)
+        except ValidationError as e:
+            return {"index": index, "status": "failed", "error": str(e)}
+        async with semaphore:
+            try:
+                # 批量任务本身即为排队等待，负载过高时不拒绝
+                result = await produce_video(param, reject=False)
+                video_url = await AliyunOssClient().generate_signed_url(
+                    object_key=result["object_key"]
+                )
+            except Exception as e:
+                logger.exception(f"Batch item {index} failed")
+                return {"index": index, "status": "failed", "error": str(e) or repr(e)}
+        return {"index": index, "status": "succeeded", "video_url": video_url, **result}
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # 调用方提前停止迭代（如客户端断开）时取消尚未完成的条目
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    logger.info(f"Finished batch of {len(items)} videos")
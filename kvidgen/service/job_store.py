@@ -0,0 +1,278 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field, fields
+from enum import Enum
+from typing import Dict, List, Optional
+
+from kvidgen.core.config import settings
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobPriority(str, Enum):
+    """优先级类别，数值越小越先执行。"""
+
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+    @property
+    def rank(self) -> int:
+        return {"high": 0, "normal": 1, "low": 2}[self.value]
+
+
+def current_owner() -> str:
+    """当前进程标识（主机名:pid），用于重启后识别遗留任务。"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """判断任务所属进程是否存活，仅能判断本机进程，其他主机的进程视为存活。"""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+@dataclass
+class Job:
+    """视频生成任务。"""
+
+    request: dict
+    priority: JobPriority = JobPriority.NORMAL
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    owner: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def summary(self) -> dict:
+        """对外展示的任务状态，不含请求参数。"""
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "priority": self.priority.value,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobStore(ABC):
+    """
+    任务存储接口。已结束的任务保留 JOB_TTL 秒供查询结果。
+    persistent 表示任务在进程退出后仍保留，可由重启后的进程接管。
+    """
+
+    persistent = False
+
+    @abstractmethod
+    def create(self, job: Job) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def update(self, job_id: str, **changes) -> None:
+        pass
+
+    @abstractmethod
+    def unfinished(self) -> List[Job]:
+        """:return: 排队中或运行中的任务，按创建时间排序。"""
+
+    def recover(self) -> List[Job]:
+        """
+        接管所属进程已退出的未完成任务，将其重新置为排队状态并归属当前进程。
+        :return: 需要重新入队的任务。
+        """
+        owner = current_owner()
+        recovered = []
+        for job in self.unfinished():
+            if job.owner == owner or owner_alive(job.owner):
+                continue
+            if self.claim(job.id, job.owner, owner):
+                job.status, job.owner, job.started_at = JobStatus.QUEUED, owner, None
+                recovered.append(job)
+        return recovered
+
+    def claim(self, job_id: str, previous_owner: Optional[str], owner: str) -> bool:
+        """
+        将任务转移给 owner 并置为排队状态。
+        :return: 任务仍归属 previous_owner 且转移成功时为 True。
+        """
+        self.update(job_id, status=JobStatus.QUEUED, owner=owner, started_at=None)
+        return True
+
+
+class MemoryJobStore(JobStore):
+    """进程内任务存储，进程退出后任务丢失。"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Job) -> None:
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def update(self, job_id: str, **changes) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            for key, value in changes.items():
+                setattr(job, key, value)
+
+    def unfinished(self) -> List[Job]:
+        return sorted(
+            (job for job in self._jobs.values() if not job.finished),
+            key=lambda job: job.created_at,
+        )
+
+    def _prune(self) -> None:
+        expire = time.time() - settings.JOB_TTL
+        for job_id in [
+            job.id
+            for job in self._jobs.values()
+            if job.finished and job.finished_at < expire
+        ]:
+            del self._jobs[job_id]
+
+
+class SqliteJobStore(JobStore):
+    """
+    SQLite 任务存储，任务状态在进程重启后仍可查询；多个 worker 共享同一文件时
+    可在任意 worker 上查询任务。
+    """
+
+    persistent = True
+    _COLUMNS = [f.name for f in fields(Job)]
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(settings.CACHE_DIR, "jobs.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.commit()
+
+    @staticmethod
+    def _encode(key: str, value):
+        if key in ("request", "result"):
+            return json.dumps(value) if value is not None else None
+        if isinstance(value, Enum):
+            return value.value
+        return value
+
+    def _decode(self, row) -> Job:
+        values = dict(zip(self._COLUMNS, row))
+        values["request"] = json.loads(values["request"])
+        values["result"] = json.loads(values["result"]) if values["result"] else None
+        values["priority"] = JobPriority(values["priority"])
+        values["status"] = JobStatus(values["status"])
+        return Job(**values)
+
+    def create(self, job: Job) -> None:
+        values = asdict(job)
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - settings.JOB_TTL,),
+            )
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                [self._encode(key, values[key]) for key in self._COLUMNS],
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def update(self, job_id: str, **changes) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in changes)} "
+                f"WHERE id = ?",
+                [self._encode(key, value) for key, value in changes.items()] + [job_id],
+            )
+            self._conn.commit()
+
+    def claim(self, job_id: str, previous_owner: Optional[str], owner: str) -> bool:
+        # 条件更新，多个进程同时启动时只有一个能接管同一任务
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started_at = NULL "
+                "WHERE id = ? AND owner IS ?",
+                (JobStatus.QUEUED.value, owner, job_id, previous_owner),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def unfinished(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs "
+                f"WHERE status IN (?, ?) ORDER BY created_at",
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value),
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+
+def create_job_store() -> JobStore:
+    """按 JOB_STORE 配置创建任务存储。"""
+    if settings.JOB_STORE == "sqlite":
+        return SqliteJobStore()
+    return MemoryJobStore()
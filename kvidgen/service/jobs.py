@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import time
+from typing import List, Optional
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.service.job_store import (
+    Job,
+    JobPriority,
+    JobStatus,
+    JobStore,
+    create_job_store,
+    current_owner,
+)
+from kvidgen.service.video import produce_video
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import observe_queue
+
+
+class JobQueueFull(RuntimeError):
+    """任务队列已满，调用方应稍后重试。"""
+
+
+@singleton
+class JobManager:
+    """
+    异步视频生成任务：提交后立即返回任务 ID，由固定数量的后台 worker
+    按优先级从有界队列中取出执行，结果写入任务存储。
+    在 FastAPI lifespan 中启动和停止；启动时接管上次进程退出时遗留的未完成任务。
+    """
+
+    def __init__(self, store: Optional[JobStore] = None):
+        self.store = store or create_job_store()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        # 同一优先级内按提交顺序执行
+        self._sequence = itertools.count()
+        self.running = 0
+
+    async def startup(self) -> None:
+        self._queue = asyncio.PriorityQueue()
+        for job in self.store.recover():
+            logger.info(f"Recovered unfinished job {job.id}")
+            self._enqueue(job)
+        self._workers = [
+            asyncio.ensure_future(self._worker()) for _ in range(settings.JOB_WORKERS)
+        ]
+        logger.info(f"Started {settings.JOB_WORKERS} job workers")
+
+    async def shutdown(self) -> None:
+        # 持久化存储中的未完成任务保持原状态，由重启后的进程接管；
+        # 进程内存储的任务随进程丢失，标记为失败，避免查询时永远处于未完成状态
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if not self.store.persistent:
+            for job in self.store.unfinished():
+                self.store.update(
+                    job.id,
+                    status=JobStatus.FAILED,
+                    error="Service shut down before the job finished",
+                    finished_at=time.time(),
+                )
+                logger.warning(f"Job {job.id} interrupted by shutdown")
+        logger.info("Stopped job workers")
+
+    def _enqueue(self, job: Job) -> None:
+        self._queue.put_nowait((job.priority.rank, next(self._sequence), job.id))
+
+    async def submit(
+        self, request: FundraisingRequest, priority: JobPriority = JobPriority.NORMAL
+    ) -> Job:
+        """
+        提交任务。
+        :param request: 筹款请求参数。
+        :param priority: 优先级类别。
+        :return: 新建的任务。
+        :raises JobQueueFull: 排队任务数达到 JOB_QUEUE_SIZE。
+        """
+        if self._queue is None:
+            await self.startup()
+        if self._queue.qsize() >= settings.JOB_QUEUE_SIZE:
+            raise JobQueueFull(f"Job queue is full ({settings.JOB_QUEUE_SIZE})")
+        job = Job(
+            request=request.model_dump(mode="json"),
+            priority=priority,
+            owner=current_owner(),
+        )
+        # 存储写入为同步调用，入库与入队之间不会切换协程
+        self.store.create(job)
+        self._enqueue(job)
+        logger.info(f"Submitted job {job.id} with priority {priority.value}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._execute(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job.finished:
+            return
+        started_at = time.time()
+        self.store.update(job_id, status=JobStatus.RUNNING, started_at=started_at)
+        observe_queue("jobs", started_at - job.created_at)
+        self.running += 1
+        try:
+            # 任务已在队列中等待过，负载过高时继续排队而不是失败
+            result = await produce_video(
+                FundraisingRequest.model_validate(job.request),
+                reject=False,
+                submitted_at=job.created_at,
+            )
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self.store.update(
+                job_id,
+                status=JobStatus.FAILED,
+                error=str(e) or repr(e),
+                finished_at=time.time(),
+            )
+        else:
+            self.store.update(
+                job_id,
+                status=JobStatus.SUCCEEDED,
+                result=result,
+                finished_at=time.time(),
+            )
+        finally:
+            self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": settings.JOB_QUEUE_SIZE,
+            "running": self.running,
+        }
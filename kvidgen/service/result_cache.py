@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.core.video.profile import RenderProfile
+from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import count_cache
+
+# 管道输出格式或内容生成方式变化时递增，使旧结果失效
+RESULT_CACHE_VERSION = 1
+
+
+def request_fingerprint(param: FundraisingRequest, profile: RenderProfile) -> str:
+    """
+    计算请求指纹：相同请求参数与渲染档位得到相同指纹。
+    :param param: 筹款请求参数。
+    :param profile: 渲染档位。
+    :return: 十六进制 sha256。
+    """
+    payload = {
+        "version": RESULT_CACHE_VERSION,
+        "request": param.model_dump(mode="json"),
+        "profile": asdict(profile),
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@singleton
+class VideoResultCache:
+    """
+    请求级结果缓存：按请求指纹保存已上传视频的 OSS 对象键与各档位产物，
+    客户端超时重试时直接复用，不再重跑整条管道。
+
+    同一指纹的并发请求在进程内合并到同一个任务，跨 worker 通过文件锁互斥，
+    后到的 worker 等待锁释放后读取缓存结果。每次写入新结果后清理超过
+    RESULT_CACHE_TTL 的条目，条目数超过 RESULT_CACHE_MAX_ENTRIES 时淘汰最早写入的。
+    """
+
+    def __init__(self):
+        root = os.path.join(settings.CACHE_DIR, "results")
+        self.entries_dir = os.path.join(root, "entries")
+        self.locks_dir = os.path.join(root, "locks")
+        for directory in (self.entries_dir, self.locks_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    @asynccontextmanager
+    async def _file_lock(self, fingerprint: str):
+        path = os.path.join(self.locks_dir, fingerprint)
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+            try:
+                # 管道耗时可达数分钟，轮询非阻塞锁，避免长期占用线程池
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(0.5)
+            except BaseException:
+                os.close(fd)
+                raise
+            if self._is_current(fd, path):
+                break
+            # 等待期间锁文件被清理删除，在新建的锁文件上重新加锁
+            os.close(fd)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @staticmethod
+    def _is_current(fd: int, path: str) -> bool:
+        try:
+            return os.stat(path).st_ino == os.fstat(fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _entry_path(self, fingerprint: str) -> str:
+        return os.path.join(self.entries_dir, f"{fingerprint}.json")
+
+    def get(self, fingerprint: str) -> Optional[dict]:
+        """:return: 未过期的缓存结果，不存在时为 None。"""
+        try:
+            with open(self._entry_path(fingerprint)) as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - entry["created_at"] >= settings.RESULT_CACHE_TTL:
+            return None
+        return entry["result"]
+
+    def put(self, fingerprint: str, result: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.entries_dir, prefix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump({"created_at": time.time(), "result": result}, file)
+        os.replace(tmp_path, self._entry_path(fingerprint))
+
+    def _remove(self, fingerprint: str) -> bool:
+        """删除条目及其锁文件，正在生成该指纹结果的条目跳过。"""
+        path = os.path.join(self.locks_dir, fingerprint)
+        fd = os.open(path, os.O_CREAT | os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._entry_path(fingerprint))
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            return True
+        finally:
+            os.close(fd)
+
+    def collect_garbage(self) -> None:
+        """清理过期条目，并按写入时间淘汰最早的条目直到不超过数量上限。"""
+        expire = time.time() - settings.RESULT_CACHE_TTL
+        entries = []
+        for name in os.listdir(self.entries_dir):
+            path = os.path.join(self.entries_dir, name)
+            try:
+                created = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(".tmp"):
+                # 写入中途退出遗留的临时文件
+                if created < expire:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                continue
+            entries.append((created, name[: -len(".json")]))
+
+        entries.sort()
+        excess = len(entries) - settings.RESULT_CACHE_MAX_ENTRIES
+        for index, (created, fingerprint) in enumerate(entries):
+            if created >= expire and index >= excess:
+                break
+            if self._remove(fingerprint):
+                self.evicted += 1
+        logger.debug(f"Result cache entries: {len(entries)}, evicted: {self.evicted}")
+
+    async def run(
+        self, fingerprint: str, producer: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        """
+        返回指纹对应的结果：命中缓存直接返回，已有相同请求在运行则等待其结果，
+        否则调用 producer 生成并写入缓存。生成失败不缓存。
+        :param fingerprint: 请求指纹。
+        :param producer: 生成结果的无参协程工厂。
+        :return: 结果字典。
+        """
+        future = self._inflight.get(fingerprint)
+        if future is not None:
+            self.coalesced += 1
+            count_cache("results", True)
+            logger.info(f"Coalescing duplicate request {fingerprint[:16]}")
+        else:
+            future = asyncio.ensure_future(self._produce(fingerprint, producer))
+            self._inflight[fingerprint] = future
+            future.add_done_callback(lambda _: self._inflight.pop(fingerprint, None))
+        # 单个调用方取消（如客户端断开）时不中断管道，结果仍会写入缓存供重试复用
+        return await asyncio.shield(future)
+
+    async def _produce(
+        self, fingerprint: str, producer: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        async with self._file_lock(fingerprint):
+            result = self.get(fingerprint)
+            if result is not None:
+                self.hits += 1
+                count_cache("results", True)
+                logger.info(f"Result cache hit {fingerprint[:16]}")
+                return result
+            self.misses += 1
+            count_cache("results", False)
+            result = await producer()
+            self.put(fingerprint, result)
+        await asyncio.to_thread(self.collect_garbage)
+        return result
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / total if total else 0.0,
+            "in_flight": len(self._inflight),
+            "evicted": self.evicted,
+        }
@@ -1,53 +1,194 @@
+import json
 import tempfile
+import time
 
 from loguru import logger
 
+from kvidgen.core.config import settings
 from kvidgen.core.pipline import (
     VideoGenerationPipeline,
+    DagVideoGenerationPipeline,
+    PrefetchStep,
+    StreamingNarrationStep,
     TextGenerationStep,
     TTSSynthesisStep,
     AudioProcessingStep,
+    ImageEffectsStep,
     VideoGenerationStep,
     VideoAudioMergeStep,
     UploadStep,
 )
+from kvidgen.core.video.profile import get_render_profile
+from kvidgen.core.workspace import Workspace, WorkspaceManager
 from kvidgen.schemas.fundraising import FundraisingRequest
+from kvidgen.service.admission import AdmissionController
+from kvidgen.service.result_cache import VideoResultCache, request_fingerprint
+from kvidgen.utils.metrics import observe_pipeline, track_usage
+from kvidgen.utils.oss_client import AliyunOssClient
 
 
-async def generate_video(param: FundraisingRequest) -> str:
+async def generate_video(param: FundraisingRequest) -> dict:
     """
-    生成筹款视频
+    生成筹款视频。相同请求命中结果缓存或合并到正在运行的任务，
+    每次都重新签发下载链接。
 
     :param param: 筹款请求参数
-    :return: 视频路径
+    :return: 包含 video_url、renditions、render_profile 与 degradations 的结果
     """
-    logger.info(f"Start generating video for {param.patient_info.patient_name}")
+    result = await produce_video(param)
+    video_url = await AliyunOssClient().generate_signed_url(
+        object_key=result["object_key"]
+    )
+    return {"video_url": video_url, **result}
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        logger.info(f"Created temporary directory: {tmp_dir}")
-
-        pipeline = VideoGenerationPipeline(
-            [
-                TextGenerationStep(),
-                TTSSynthesisStep(),
-                AudioProcessingStep(),
-                VideoGenerationStep(),
-                VideoAudioMergeStep(),
-                UploadStep(),
-            ]
-        )
 
-        result = await pipeline.run(
-            {
-                "tmp_dir": tmp_dir,
-                "fundraiser_info": param.patient_info.get_fundraiser_info(),
-                "patient_info": param.patient_info.get_patient_info(),
-                "story": param.fundraising_text,
-                "background_music_url": param.background_music_url,
-                "image_urls": param.image_urls,
-                "patient_name": param.patient_info.patient_name,
-            }
+async def produce_video(
+    param: FundraisingRequest, reject: bool = True, submitted_at: float = None
+) -> dict:
+    """
+    生成并上传筹款视频，优先复用结果缓存，结束后记录本次请求的资源用量。
+
+    :param param: 筹款请求参数
+    :param reject: 负载过高时是否拒绝，为 False 时排队等待
+    :param submitted_at: 请求提交时间戳，截止时间从此刻起算，默认为当前时间
+    :return: 包含 object_key、renditions、render_profile 与 degradations 的结果
+    :raises Overloaded: 预计积压超出上限
+    """
+    deadline = None
+    if param.deadline_seconds:
+        deadline = (submitted_at or time.time()) + param.deadline_seconds
+    with track_usage() as usage:
+        if settings.RESULT_CACHE_ENABLED:
+            fingerprint = request_fingerprint(param, get_render_profile())
+            result = await VideoResultCache().run(
+                fingerprint,
+                lambda: run_pipeline(param, fingerprint, reject, deadline),
+            )
+        else:
+            result = await run_pipeline(param, reject=reject, deadline=deadline)
+    logger.info(
+        f"Resource usage for {param.patient_info.patient_name}: "
+        f"{json.dumps(usage.to_dict(), ensure_ascii=False)}"
+    )
+    return result
+
+
+async def run_pipeline(
+    param: FundraisingRequest,
+    fingerprint: str = None,
+    reject: bool = True,
+    deadline: float = None,
+) -> dict:
+    """
+    经准入控制后运行视频生成管道，并以实测渲染耗时校准成本模型。
+
+    :param param: 筹款请求参数
+    :param fingerprint: 请求指纹，用于生成 OSS 对象键
+    :param reject: 负载过高时是否拒绝
+    :param deadline: 截止时间戳，预计来不及时降低渲染质量
+    :return: 包含 object_key、renditions、render_profile 与 degradations 的结果
+    """
+    admission = AdmissionController()
+    cost_model = admission.cost_model
+    if not settings.ADMISSION_ENABLED:
+        data = await execute_pipeline(
+            param, fingerprint, deadline, cost_model.calibration
         )
+    else:
+        profile = get_render_profile()
+        cost = cost_model.estimate(param, profile)
+        async with admission.admit(cost, reject):
+            data = await execute_pipeline(
+                param, fingerprint, deadline, cost_model.calibration
+            )
+        # 渲染从检查点恢复时耗时不是本次实测，不参与校准
+        resumed = "VideoGenerationStep" in data.get("resumed_steps", [])
+        cost_model.record(
+            param,
+            get_render_profile(data["render_profile"]),
+            0.0 if resumed else data["render_cpu_seconds"],
+            data.get("narration_duration"),
+            data.get("render_effects"),
+        )
+    return {
+        "object_key": data["object_key"],
+        "renditions": data["renditions"],
+        "render_profile": data["render_profile"],
+        "degradations": data["degradations"],
+    }
+
+
+async def execute_pipeline(
+    param: FundraisingRequest,
+    fingerprint: str = None,
+    deadline: float = None,
+    render_calibration: float = 1.0,
+) -> dict:
+    """
+    运行视频生成管道并上传结果。启用任务工作目录时中间产物按请求指纹持久化，
+    失败后重试从第一个未完成的步骤继续，成功后删除工作目录；否则使用临时目录。
+
+    :param param: 筹款请求参数
+    :param fingerprint: 请求指纹，用于生成 OSS 对象键与工作目录
+    :param deadline: 截止时间戳
+    :param render_calibration: 渲染成本模型的校准系数
+    :return: 管道数据，其中的本地文件路径在返回后已失效
+    """
+    logger.info(f"Start generating video for {param.patient_info.patient_name}")
+    initial_data = {
+        "fingerprint": fingerprint,
+        "deadline": deadline,
+        "render_calibration": render_calibration,
+        "fundraiser_info": param.patient_info.get_fundraiser_info(),
+        "patient_info": param.patient_info.get_patient_info(),
+        "story": param.fundraising_text,
+        "background_music_url": param.background_music_url,
+        "image_urls": param.image_urls,
+        "patient_name": param.patient_info.patient_name,
+    }
+
+    with observe_pipeline():
+        if settings.WORKSPACE_ENABLED:
+            workspaces = WorkspaceManager()
+            key = fingerprint or request_fingerprint(param, get_render_profile())
+            async with workspaces.open(key) as workspace:
+                logger.info(f"Using workspace: {workspace.path}")
+                result = await build_pipeline(workspace).run(
+                    {**initial_data, "tmp_dir": workspace.path}
+                )
+                if result.get("resumed_steps"):
+                    workspaces.record_resume(len(result["resumed_steps"]))
+                workspaces.remove(workspace)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                logger.info(f"Created temporary directory: {tmp_dir}")
+                result = await build_pipeline().run(
+                    {**initial_data, "tmp_dir": tmp_dir}
+                )
+
+    logger.info(f"Finished generating video for {param.patient_info.patient_name}")
+    return result
+
 
-        logger.info(f"Finished generating video for {param.patient_info.patient_name}")
-        return result["video_url"]
+def build_pipeline(workspace: Workspace = None) -> VideoGenerationPipeline:
+    """按配置组装视频生成管道。"""
+    if settings.TTS_STREAM_TEXT:
+        narration_steps = [StreamingNarrationStep()]
+    else:
+        narration_steps = [TextGenerationStep(), TTSSynthesisStep()]
+    if settings.PIPELINE_EXECUTOR == "dag":
+        pipeline_cls = DagVideoGenerationPipeline
+    else:
+        pipeline_cls = VideoGenerationPipeline
+    return pipeline_cls(
+        [
+            PrefetchStep(),
+            *narration_steps,
+            AudioProcessingStep(),
+            ImageEffectsStep(),
+            VideoGenerationStep(),
+            VideoAudioMergeStep(),
+            UploadStep(),
+        ],
+        workspace,
+    )
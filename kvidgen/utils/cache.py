@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+
+class DiskLRUCache:
+    """
+    基于磁盘的内容寻址 LRU 缓存。
+    写入先落临时文件再 os.replace，保证并发读取时不会看到半写入的数据；
+    打开时扫描目录按文件 mtime 建立内存索引，此后按索引记录访问顺序与大小，
+    总大小超过上限时淘汰最久未访问的条目直到低于 LOW_WATER，可选内存层缓存热点数据。
+    方法会读写磁盘，异步调用方应通过 asyncio.to_thread 调用。
+    """
+
+    # 淘汰到容量上限的该比例，避免缓存写满后每次写入都触发淘汰
+    LOW_WATER = 0.9
+
+    def __init__(self, directory: str, max_bytes: int, memory_bytes: int = 0):
+        """
+        :param directory: 缓存目录。
+        :param max_bytes: 磁盘缓存容量上限（字节）。
+        :param memory_bytes: 内存层容量上限（字节），0 表示不启用内存层。
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        # 键 -> 文件大小，按最近访问时间从旧到新排列
+        self._entries: "OrderedDict[str, int]" = OrderedDict(
+            (os.path.basename(path), size)
+            for path, _, size in sorted(self._scan(), key=lambda entry: entry[1])
+        )
+        self._size = sum(self._entries.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _record_hit(self, key: str, size: int) -> None:
+        self.hits += 1
+        self.bytes_saved += size
+        if key in self._entries:
+            self._entries.move_to_end(key)
+
+    def _index(self, key: str, size: int) -> None:
+        """把其他进程写入的文件加入索引。"""
+        if key not in self._entries:
+            self._entries[key] = size
+            self._size += size
+
+    def _record_miss(self, key: str) -> None:
+        self.misses += 1
+        # 文件可能已被其他进程淘汰
+        self._size -= self._entries.pop(key, 0)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._record_hit(key, len(data))
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            # 以 mtime 记录最近访问时间，重新打开时据此恢复访问顺序
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._record_miss(key)
+            return None
+
+        with self._lock:
+            self._record_hit(key, len(data))
+            self._index(key, len(data))
+            if self.memory_bytes:
+                self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            with self._lock:
+                self._replace(key, tmp_path, len(data))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self.memory_bytes:
+                self._remember(key, data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_path(self, key: str) -> Optional[str]:
+        """
+        返回缓存文件路径并刷新其访问时间，不存在时返回 None。
+        调用方应以只读方式使用该文件（如硬链接或复制）。
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._record_miss(key)
+            return None
+        with self._lock:
+            self._record_hit(key, size)
+            self._index(key, size)
+        return path
+
+    def put_file(self, key: str, src_path: str) -> str:
+        """
+        将文件移动到缓存中，src_path 需与缓存目录位于同一文件系统。
+        :return: 缓存文件路径。
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(src_path)
+        with self._lock:
+            self._replace(key, src_path, size)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _replace(self, key: str, src_path: str, size: int) -> None:
+        """覆盖写入同一键时扣除旧文件大小，避免重复计入容量。需持有 _lock。"""
+        os.replace(src_path, self._path(key))
+        self._size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+
+    def _evict(self) -> None:
+        """按索引淘汰最久未访问的条目直到低于 LOW_WATER，不扫描目录。需持有 _lock。"""
+        target = self.max_bytes * self.LOW_WATER
+        evicted = 0
+        while self._size > target and self._entries:
+            key, size = self._entries.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self._memory_size -= len(self._memory.pop(key, b""))
+            evicted += 1
+        logger.debug(
+            f"Evicted {evicted} entries from {self.directory}, size: {self._size}"
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "memory_bytes": self._memory_size,
+            }
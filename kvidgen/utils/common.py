@@ -1,62 +1,227 @@
+import asyncio
 import json
+import math
+import os
+import random
+import re
 import subprocess
 import base64
+import tempfile
+from typing import Awaitable, Callable, Iterable, List, Optional, TypeVar
 
 from loguru import logger
 
+T = TypeVar("T")
 
-def split_text(text):
-    # 如果文本长度小于280个汉字，直接返回
-    if len(text) <= 280:
+
+def singleton(cls):
+    instances = {}
+
+    def wrapper(*args, **kwargs):
+        if cls not in instances:
+            instances[cls] = cls(*args, **kwargs)
+        return instances[cls]
+
+    return wrapper
+
+
+# 句末标点（含中英文、省略号与换行），允许紧跟右引号/括号及空白
+_SENTENCE_END = re.compile(r"(?:[。！？!?…]+|\.(?=\s|$)|[\r\n]+)[”’\"'）)」』]*\s*")
+# 分句标点，仅在单句超长时使用
+_CLAUSE_END = re.compile(r"[，,；;：:、]+[”’\"'）)」』]*\s*")
+
+
+def _split_by(pattern: re.Pattern, text: str) -> List[str]:
+    units = []
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() > start:
+            units.append(text[start : match.end()])
+            start = match.end()
+    if start < len(text):
+        units.append(text[start:])
+    return units
+
+
+def _clause_units(sentence: str, max_len: int) -> List[str]:
+    """超长句按分句标点切分，仍超长的分句等长硬切。"""
+    units = []
+    for clause in _split_by(_CLAUSE_END, sentence):
+        size = math.ceil(len(clause) / math.ceil(len(clause) / max_len))
+        units.extend(clause[i : i + size] for i in range(0, len(clause), size))
+    return units
+
+
+def _segment_units(text: str, max_len: int) -> List[str]:
+    """按句切分，超长句再按分句标点切分，仍超长则等长硬切。"""
+    units = []
+    for sentence in _split_by(_SENTENCE_END, text):
+        if len(sentence) <= max_len:
+            units.append(sentence)
+        else:
+            units.extend(_clause_units(sentence, max_len))
+    return units
+
+
+def split_text(text: str, max_len: int = 280) -> List[str]:
+    """
+    将长文本切分为不超过 max_len 个字符的分段，供 TTS 分段合成。
+    优先在句末标点处切分，其次分句标点，并尽量让各分段长度均衡，
+    使并发合成的请求耗时接近。时间复杂度 O(n)，且 "".join(结果) == text。
+    :param text: 待切分文本。
+    :param max_len: 单个分段的最大字符数。
+    :return: 按原文顺序排列的分段列表。
+    """
+    if len(text) <= max_len:
         return [text]
 
-    # 定义切分符号的优先级，优先使用换行符，其次句号，再其次逗号等
-    split_chars = ["\n\r", "\n", "。"]
-
-    # 初始化结果列表
-    result = []
-    # 初始化当前段落
-    current_paragraph = ""
-
-    # 遍历文本中的每个字符
-    for char in text:
-        # 将字符添加到当前段落
-        current_paragraph += char
-
-        # 如果当前段落长度超过280个汉字
-        if len(current_paragraph) > 280:
-            # 从切分符号中找到当前段落中最后一个出现的符号
-            last_split_char = None
-            last_split_char_index = -1
-            for split_char in split_chars:
-                index = current_paragraph.rfind(split_char)
-                if index != -1 and index > last_split_char_index:
-                    last_split_char = split_char
-                    last_split_char_index = index
-
-            # 如果找到了切分符号
-            if last_split_char is not None:
-                # 将当前段落从切分符号处切分为两部分
-                paragraph_part1 = current_paragraph[: last_split_char_index + 1]
-                paragraph_part2 = current_paragraph[last_split_char_index + 1 :]
-
-                # 将第一部分添加到结果列表
-                result.append(paragraph_part1)
-
-                # 将第二部分作为新的当前段落继续处理
-                current_paragraph = paragraph_part2
-            else:
-                # 如果没有找到合适的切分符号，说明当前段落中没有合适的切分点
-                # 可以考虑将当前段落截断，或者根据实际情况进行其他处理
-                # 这里简单地将当前段落截断为前280个字符，剩余部分继续处理
-                result.append(current_paragraph[:280])
-                current_paragraph = current_paragraph[280:]
-
-    # 将最后一段添加到结果列表
-    if current_paragraph:
-        result.append(current_paragraph)
-
-    return result
+    chunks = []
+    current: List[str] = []
+    current_len = 0
+    # 尚未输出的字符数（包含 current 中的内容）
+    remaining = len(text)
+
+    for unit in _segment_units(text, max_len):
+        unit_len = len(unit)
+        if current:
+            # 以剩余文本平均分配到最少分段数的长度为目标，在更接近目标的位置收尾
+            target = remaining / math.ceil(remaining / max_len)
+            next_len = current_len + unit_len
+            if next_len > max_len or (
+                next_len > target and target - current_len < next_len - target
+            ):
+                chunks.append("".join(current))
+                remaining -= current_len
+                current, current_len = [], 0
+        current.append(unit)
+        current_len += unit_len
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+class SentenceSegmenter:
+    """
+    增量切句器：逐段喂入流式生成的文本，在句末标点处切出完整分段，
+    以便文案边生成边提交语音合成。各分段不超过 max_len 个字符，
+    且全部分段按顺序拼接等于输入全文。
+
+    切分单元与 split_text 相同（句、超长句的分句及等长硬切），分段边界只落在
+    split_text 也可能切分的位置，且与文本到达的节奏无关。两者的合并方式不同：
+    split_text 已知全文，按剩余长度均衡各分段；流式时累计达到 min_len 即输出，
+    以尽早开始合成。因此开启 TTS_STREAM_TEXT 前后同一文案的分段不同，
+    TTS 缓存条目不能在两种模式之间复用。
+    """
+
+    def __init__(self, max_len: int = 280, min_len: int = 0):
+        """
+        :param max_len: 单个分段的最大字符数。
+        :param min_len: 累计达到该长度才输出分段，避免过短分段产生过多 TTS 请求。
+        """
+        self.max_len = max_len
+        self.min_len = min_len
+        # 当前句子尚未输出的部分
+        self._pending = ""
+        # 当前句子已确定超长，按分句输出
+        self._overlong = False
+        self._group: List[str] = []
+        self._group_len = 0
+
+    def feed(self, text: str) -> List[str]:
+        """
+        :param text: 新生成的文本片段。
+        :return: 本次可以输出的完整分段，可能为空。
+        """
+        self._pending += text
+        segments: List[str] = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._pending):
+            # 匹配到末尾时，后续片段可能还会补上右引号或空白，留待下次确认
+            if match.end() >= len(self._pending):
+                break
+            if match.end() > start:
+                self._end_sentence(self._pending[start : match.end()], segments)
+                start = match.end()
+        self._pending = self._pending[start:]
+
+        # 单句超长时不再等待句末，先输出已完整的分句
+        if self._overlong or len(self._pending) > self.max_len:
+            self._overlong = True
+            start = 0
+            for match in _CLAUSE_END.finditer(self._pending):
+                if match.end() >= len(self._pending):
+                    break
+                self._add(
+                    _clause_units(self._pending[start : match.end()], self.max_len),
+                    segments,
+                )
+                start = match.end()
+            self._pending = self._pending[start:]
+        return segments
+
+    def flush(self) -> List[str]:
+        """输入结束后调用，输出剩余的全部文本。"""
+        segments: List[str] = []
+        if self._pending:
+            self._end_sentence(self._pending, segments)
+            self._pending = ""
+        if self._group:
+            segments.append(self._take())
+        return segments
+
+    def _end_sentence(self, sentence: str, segments: List[str]) -> None:
+        if self._overlong or len(sentence) > self.max_len:
+            self._add(_clause_units(sentence, self.max_len), segments)
+        else:
+            self._add([sentence], segments)
+        self._overlong = False
+
+    def _add(self, units: List[str], segments: List[str]) -> None:
+        for unit in units:
+            if self._group and self._group_len + len(unit) > self.max_len:
+                segments.append(self._take())
+            self._group.append(unit)
+            self._group_len += len(unit)
+            if self._group_len >= self.min_len:
+                segments.append(self._take())
+
+    def _take(self) -> str:
+        segment = "".join(self._group)
+        self._group, self._group_len = [], 0
+        return segment
+
+
+def run_command(
+    command: List[str], operation: str, check: bool = True, text: bool = False
+) -> subprocess.CompletedProcess:
+    """
+    执行外部命令（ffmpeg/ffprobe），记录墙钟时间与该子进程自身消耗的 CPU 时间。
+    输出写入临时文件，避免管道写满阻塞；通过 os.wait4 取得子进程的资源用量。
+    :param command: 命令及参数。
+    :param operation: 指标中的操作名称，如 mix、merge。
+    :param check: 退出码非 0 时是否抛出 CalledProcessError。
+    :param text: 是否将输出解码为字符串。
+    :return: 执行结果。
+    """
+    # 延迟导入：metrics 依赖配置，split_text 等纯函数需在未配置环境时可用
+    from kvidgen.utils.metrics import observe_call, observe_cpu
+
+    service = os.path.basename(command[0])
+    with observe_call(service, operation), tempfile.TemporaryFile() as stdout:
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(command, stdout=stdout, stderr=stderr)
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            observe_cpu(service, operation, usage.ru_utime + usage.ru_stime)
+            stdout.seek(0)
+            stderr.seek(0)
+            out, err = stdout.read(), stderr.read()
+        if text:
+            out, err = out.decode(errors="replace"), err.decode(errors="replace")
+        if check and process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, out, err)
+    return subprocess.CompletedProcess(command, process.returncode, out, err)
 
 
 def get_audio_duration(file_path):
@@ -71,9 +236,7 @@ def get_audio_duration(file_path):
         "-of",
         "json",
     ]
-    result = subprocess.run(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
+    result = run_command(command, "probe", check=False, text=True)
     info = json.loads(result.stdout)
     return float(info["format"]["duration"])
 
@@ -97,3 +260,63 @@ def file_to_base64(file_path):
     except Exception as e:
         logger.error(f"file_to_base64 Error: {e}")
         return None
+
+
+async def gather_with_concurrency(limit: int, aws: Iterable[Awaitable[T]]) -> List[T]:
+    """
+    以有限并发执行多个协程，结果按传入顺序返回。
+    任一协程失败时取消其余未完成的任务并抛出该异常。
+    :param limit: 最大并发数。
+    :param aws: 协程列表。
+    :return: 与输入顺序一致的结果列表。
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def bounded(aw: Awaitable[T]) -> T:
+        try:
+            async with semaphore:
+                return await aw
+        finally:
+            # 排队时被取消的协程从未开始运行，关闭以免告警 never awaited
+            if asyncio.iscoroutine(aw):
+                aw.close()
+
+    tasks = [asyncio.ensure_future(bounded(aw)) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def retry_async(
+    func: Callable[[], Awaitable[T]],
+    retries: int = 3,
+    backoff: float = 0.5,
+    should_retry: Optional[Callable[[Exception], bool]] = None,
+    retry_after: Optional[Callable[[Exception], Optional[float]]] = None,
+) -> T:
+    """
+    失败后按指数退避（带随机抖动）重试异步调用。
+    :param func: 无参协程工厂，每次重试重新调用。
+    :param retries: 最大重试次数（不含首次调用）。
+    :param backoff: 退避基准秒数，第 n 次重试最多等待 backoff * 2^n 秒。
+    :param should_retry: 判断异常是否可重试，默认全部重试。
+    :param retry_after: 从异常中取服务端要求的最短等待秒数（如 Retry-After）。
+    :return: 调用结果。
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= retries or (should_retry and not should_retry(e)):
+                raise
+            delay = random.uniform(0.5, 1.0) * backoff * (2**attempt)
+            if retry_after:
+                delay = max(delay, retry_after(e) or 0)
+            attempt += 1
+            logger.warning(f"Retry {attempt}/{retries} in {delay:.2f}s: {e!r}")
+            await asyncio.sleep(delay)
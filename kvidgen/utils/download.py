@@ -1,43 +1,166 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 
-import aiohttp
 import aiofiles
+import aiohttp
 import os
 import logging
 
+from kvidgen.core.config import settings
+from kvidgen.utils.common import gather_with_concurrency, retry_async
+from kvidgen.utils.download_cache import DownloadCache
+from kvidgen.utils.http_client import HttpClientManager
+from kvidgen.utils.metrics import add_bytes, observe_call
+
+
+class DownloadError(RuntimeError):
+    """文件下载失败，retryable 标记该错误是否值得重试。"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, DownloadError):
+        return e.retryable
+    return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+async def _fetch(
+    url: str, file_path: str, max_bytes: int, headers: Optional[dict] = None
+) -> Optional[dict]:
+    """
+    下载到 .part 临时文件，完成后重命名。
+    临时文件已存在时通过 Range 请求续传，服务端不支持续传则从头下载。
+    :param headers: 额外请求头（如条件请求的 If-None-Match）。
+    :return: 响应的 ETag/Last-Modified；条件请求命中 304 时返回 None。
+    """
+    part_path = f"{file_path}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = dict(headers or {})
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    async with HttpClientManager().session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return None
+        if response.status == 206 and offset:
+            mode = "ab"
+        elif response.status == 200:
+            mode, offset = "wb", 0
+        elif response.status == 416:
+            os.remove(part_path)
+            raise DownloadError(f"Invalid resume range: {url}", retryable=True)
+        else:
+            raise DownloadError(
+                f"Failed to download file: {url} (status code: {response.status})",
+                retryable=response.status == 429 or response.status >= 500,
+            )
+
+        if response.content_length and offset + response.content_length > max_bytes:
+            raise DownloadError(f"File too large: {url}")
 
-async def download_file(url: str, file_dir: str, file_name: str):
+        size = offset
+        async with aiofiles.open(part_path, mode) as file:
+            # 1MB chunk size
+            async for chunk in response.content.iter_chunked(1024 * 1024):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadError(f"File too large: {url}")
+                await file.write(chunk)
+        add_bytes("download", "in", size - offset)
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    os.replace(part_path, file_path)
+    return validators
+
+
+async def _download(
+    url: str, file_path: str, max_bytes: int, headers: Optional[dict] = None
+) -> Optional[dict]:
+    try:
+        with observe_call("download", "get"):
+            return await retry_async(
+                lambda: _fetch(url, file_path, max_bytes, headers),
+                retries=settings.DOWNLOAD_MAX_RETRIES,
+                backoff=settings.DOWNLOAD_RETRY_BACKOFF,
+                should_retry=_is_retryable,
+            )
+    except DownloadError:
+        raise
+    except Exception as e:
+        raise DownloadError(f"Failed to download file: {url} ({e!r})") from e
+    finally:
+        if not os.path.exists(file_path) and os.path.exists(f"{file_path}.part"):
+            os.remove(f"{file_path}.part")
+
+
+async def download_file(
+    url: str, file_dir: str, file_name: str, max_bytes: Optional[int] = None
+) -> str:
     """
-    异步下载文件
+    异步下载文件，网络错误与 429/5xx 按退避策略重试并断点续传。
+    启用 DOWNLOAD_CACHE_ENABLED 时优先从共享下载缓存链接文件。
 
     :param url: 文件 URL
     :param file_dir: 文件目录
     :param file_name: 文件名
+    :param max_bytes: 文件大小上限，默认取 DOWNLOAD_MAX_BYTES
     :return: 文件路径
+    :raises DownloadError: 重试耗尽、状态码不可重试或文件超出大小上限
     """
     os.makedirs(file_dir, exist_ok=True)
 
     file_path = os.path.join(file_dir, file_name)
+    max_bytes = max_bytes or settings.DOWNLOAD_MAX_BYTES
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                logging.error(
-                    f"Failed to download file: {url} (status code: {response.status})"
-                )
-                return None
-
-            async with aiofiles.open(file_path, "wb") as file:
-                # 1MB chunk size
-                async for chunk in response.content.iter_chunked(1024 * 1024):
-                    await file.write(chunk)
+    if settings.DOWNLOAD_CACHE_ENABLED:
+        await DownloadCache().fetch(
+            url,
+            file_path,
+            lambda tmp_path, headers: _download(url, tmp_path, max_bytes, headers),
+        )
+    else:
+        await _download(url, file_path, max_bytes)
 
     logging.info(f"Downloaded file: {file_path}")
     return file_path
 
 
-async def download_image_file(file_dir: str, image_urls: List[str]) -> List[str]:
-    return [
-        await download_file(image_url, file_dir, f"{index}.jpg")
-        for index, image_url in enumerate(image_urls)
-    ]
+async def download_image_file(
+    file_dir: str, image_urls: List[str], skip_failed: Optional[bool] = None
+) -> List[str]:
+    """
+    以有限并发下载图片，返回顺序与 image_urls 一致。
+
+    :param file_dir: 文件目录
+    :param image_urls: 图片链接列表
+    :param skip_failed: 是否跳过下载失败的图片，默认取 DOWNLOAD_SKIP_FAILED_IMAGES；
+        为 False 时任一图片失败即抛出 DownloadError
+    :return: 下载成功的图片路径列表
+    """
+    if skip_failed is None:
+        skip_failed = settings.DOWNLOAD_SKIP_FAILED_IMAGES
+
+    async def download_one(index: int, image_url: str) -> Optional[str]:
+        try:
+            return await download_file(image_url, file_dir, f"{index}.jpg")
+        except DownloadError as e:
+            if not skip_failed:
+                raise
+            logging.warning(f"Skip image {image_url}: {e}")
+            return None
+
+    paths = await gather_with_concurrency(
+        settings.DOWNLOAD_CONCURRENCY,
+        [download_one(index, image_url) for index, image_url in enumerate(image_urls)],
+    )
+    images = [path for path in paths if path is not None]
+    if not images:
+        raise DownloadError("No image could be downloaded")
+    return images
@@ -0,0 +1,196 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.utils.cache import DiskLRUCache
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import count_cache
+
+# fetcher(临时文件路径, 条件请求头) -> 响应校验信息；服务端返回 304 时为 None
+Fetcher = Callable[[str, Optional[dict]], Awaitable[Optional[dict]]]
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """优先硬链接，跨文件系统时退化为复制。"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+@singleton
+class DownloadCache:
+    """
+    跨请求、跨 worker 共享的下载缓存。
+
+    目录结构（位于 CACHE_DIR/downloads）：
+      objects/  按内容 sha256 存储文件，不同 URL 的相同内容只保存一份，按大小 LRU 淘汰
+      urls/     URL 索引，记录内容哈希与 ETag/Last-Modified 校验信息
+      locks/    每个 URL 一把 fcntl 文件锁，多个 worker 不会重复下载同一 URL
+    缓存文件只读共享，调用方拿到的是硬链接，修改前需另存为新文件。
+    """
+
+    def __init__(self):
+        root = os.path.join(settings.CACHE_DIR, "downloads")
+        self.objects = DiskLRUCache(
+            os.path.join(root, "objects"), settings.DOWNLOAD_CACHE_MAX_BYTES
+        )
+        self.urls_dir = os.path.join(root, "urls")
+        self.locks_dir = os.path.join(root, "locks")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for directory in (self.urls_dir, self.locks_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._inflight: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @asynccontextmanager
+    async def _lock(self, key: str):
+        # 进程内先用 asyncio.Lock 合并同一 URL 的并发请求，再用文件锁跨进程互斥
+        lock = self._inflight.setdefault(key, asyncio.Lock())
+        async with lock:
+            fd = os.open(os.path.join(self.locks_dir, key), os.O_CREAT | os.O_RDWR)
+            try:
+                await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+        if not lock.locked() and self._inflight.get(key) is lock:
+            del self._inflight[key]
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.urls_dir, f"{key}.json")
+
+    def _load_entry(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._entry_path(key)) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_entry(self, key: str, entry: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.urls_dir, prefix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, self._entry_path(key))
+
+    def _link_cached(self, entry: dict, dest_path: str) -> bool:
+        object_path = self.objects.get_path(entry["sha256"])
+        if object_path is None:
+            return False
+        try:
+            link_or_copy(object_path, dest_path)
+        except FileNotFoundError:
+            # 其他 worker 恰好淘汰了该文件
+            return False
+        self.bytes_saved += entry["size"]
+        return True
+
+    def _store(self, sha256: str, tmp_path: str, dest_path: str) -> None:
+        """将下载的文件放入缓存并链接到 dest_path，内容已缓存时复用同一份文件。"""
+        object_path = self.objects.get_path(sha256)
+        if object_path is None:
+            link_or_copy(tmp_path, dest_path)
+            self.objects.put_file(sha256, tmp_path)
+        else:
+            # 内容已由其他 URL 缓存，复用同一份文件
+            link_or_copy(object_path, dest_path)
+            os.remove(tmp_path)
+
+    async def fetch(self, url: str, dest_path: str, fetcher: Fetcher) -> str:
+        """
+        获取 URL 对应的文件并链接到 dest_path。
+        缓存新鲜时直接复用；过期时携带校验信息发起条件请求，304 则继续复用。
+        :param url: 文件 URL。
+        :param dest_path: 目标路径。
+        :param fetcher: 实际下载函数。
+        :return: dest_path。
+        """
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        async with self._lock(key):
+            entry = self._load_entry(key)
+            if entry is not None:
+                fresh = time.time() - entry["fetched_at"] < settings.DOWNLOAD_CACHE_TTL
+                if fresh and await asyncio.to_thread(
+                    self._link_cached, entry, dest_path
+                ):
+                    self.hits += 1
+                    count_cache("downloads", True)
+                    return dest_path
+
+            headers = None
+            if entry is not None and await asyncio.to_thread(
+                self.objects.get_path, entry["sha256"]
+            ):
+                headers = {}
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            tmp_path = os.path.join(self.tmp_dir, f"{key}.download")
+            validators = await fetcher(tmp_path, headers or None)
+            if validators is None and await asyncio.to_thread(
+                self._link_cached, entry, dest_path
+            ):
+                entry["fetched_at"] = time.time()
+                self._save_entry(key, entry)
+                self.revalidated += 1
+                count_cache("downloads", True)
+                return dest_path
+            if validators is None:
+                # 校验通过但缓存文件已被淘汰，无条件重新下载
+                validators = await fetcher(tmp_path, None)
+
+            self.misses += 1
+            count_cache("downloads", False)
+            sha256 = await asyncio.to_thread(sha256_file, tmp_path)
+            size = os.path.getsize(tmp_path)
+            await asyncio.to_thread(self._store, sha256, tmp_path, dest_path)
+            self._save_entry(
+                key,
+                {
+                    "url": url,
+                    "sha256": sha256,
+                    "size": size,
+                    "fetched_at": time.time(),
+                    **validators,
+                },
+            )
+            logger.debug(f"Cached download {url} as {sha256}")
+            return dest_path
+
+    def stats(self) -> dict:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.revalidated) / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "size_bytes": self.objects.stats()["size_bytes"],
+            "max_bytes": self.objects.max_bytes,
+        }
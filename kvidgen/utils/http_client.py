@@ -0,0 +1,87 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.utils.common import singleton
+
+
+@singleton
+class HttpClientManager:
+    """
+    进程级共享的 aiohttp 会话，复用 TCP/TLS 连接与 DNS 缓存。
+    在 FastAPI lifespan 中创建和关闭；脚本等未经过 lifespan 的场景首次使用时自动创建。
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.metrics = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        def counter(name: str):
+            async def on_event(session, context, params):
+                self.metrics[name] += 1
+
+            return on_event
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace_config
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TIMEOUT_TOTAL,
+            connect=settings.HTTP_TIMEOUT_CONNECT,
+            sock_read=settings.HTTP_TIMEOUT_READ,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = self._create_session()
+            self._loop = loop
+        return self._session
+
+    async def startup(self) -> None:
+        logger.info("Starting shared HTTP client session")
+        _ = self.session
+
+    async def shutdown(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+        logger.info("Closed shared HTTP client session")
+
+    def stats(self) -> dict:
+        created = self.metrics["connections_created"]
+        reused = self.metrics["connections_reused"]
+        return {
+            **self.metrics,
+            "reuse_ratio": reused / (created + reused) if created + reused else 0.0,
+        }
@@ -0,0 +1,563 @@
+"""
+进程内指标与追踪：管道步骤、外部调用（大模型、语音合成、OSS、ffmpeg、下载）的
+墙钟时间、CPU 时间与字节数，以 Prometheus 文本格式从 /management/metrics 导出。
+同一组钩子同时累加到当前请求的 ResourceUsage，用于单个请求的资源核算。
+
+多个 uvicorn worker 各自维护指标，抓取时需分别访问或按 worker 汇总。
+"""
+
+import abc
+import bisect
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover - 可选依赖
+    trace = None
+    if settings.TRACING_ENABLED:
+        logger.warning("TRACING_ENABLED is set but opentelemetry is not installed")
+
+# 耗时直方图的桶边界（秒）
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 600)
+
+# 当前正在执行的管道步骤，用于把子进程与线程中消耗的 CPU 时间记到对应步骤
+current_step: ContextVar[str] = ContextVar("current_step", default="other")
+
+
+class ResourceUsage:
+    """
+    单个请求的资源用量。由 track_usage 设置到 current_usage，
+    请求内创建的协程与线程继承同一个对象，各指标钩子同时累加到这里。
+
+    CPU 时间只统计渲染进程与 ffmpeg 子进程，事件循环所在进程由并发请求共享，无法拆分；
+    峰值内存取本请求各个渲染任务所在子进程的最大值。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.cpu_seconds: Dict[str, float] = {}
+        # 墙钟耗时：step（管道步骤）、call（外部调用）、queue（排队）-> 名称 -> 秒数
+        self.wall_seconds: Dict[str, Dict[str, float]] = {
+            "step": {},
+            "call": {},
+            "queue": {},
+        }
+        self.peak_rss_bytes = 0
+        self.frames_rendered = 0
+        self.render_seconds = 0.0
+        # (服务, 方向) -> 字节数
+        self.transfer_bytes: Dict[Tuple[str, str], int] = {}
+        self.llm_calls = 0.0
+        self.llm_input_tokens = 0.0
+        self.llm_output_tokens = 0.0
+        self.tts_characters = 0
+        # 缓存名称 -> [命中数, 未命中数]
+        self.cache: Dict[str, List[int]] = {}
+
+    def add_cpu(self, step: str, seconds: float) -> None:
+        with self._lock:
+            self.cpu_seconds[step] = self.cpu_seconds.get(step, 0.0) + seconds
+
+    def add_wall(self, kind: str, name: str, seconds: float) -> None:
+        with self._lock:
+            totals = self.wall_seconds[kind]
+            totals[name] = totals.get(name, 0.0) + seconds
+
+    def add_rss(self, rss_bytes: int) -> None:
+        with self._lock:
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+
+    def add_bytes(self, service: str, direction: str, amount: int) -> None:
+        with self._lock:
+            key = (service, direction)
+            self.transfer_bytes[key] = self.transfer_bytes.get(key, 0) + amount
+
+    def add_render(self, frames: int, seconds: float) -> None:
+        with self._lock:
+            self.frames_rendered += frames
+            self.render_seconds += seconds
+
+    def add_llm(self, input_tokens: float, output_tokens: float, calls: float = 1):
+        with self._lock:
+            self.llm_calls += calls
+            self.llm_input_tokens += input_tokens
+            self.llm_output_tokens += output_tokens
+
+    def add_tts_characters(self, characters: int) -> None:
+        with self._lock:
+            self.tts_characters += characters
+
+    def count_cache(self, name: str, hit: bool) -> None:
+        with self._lock:
+            self.cache.setdefault(name, [0, 0])[0 if hit else 1] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            bytes_in = sum(v for (_, d), v in self.transfer_bytes.items() if d == "in")
+            bytes_out = sum(
+                v for (_, d), v in self.transfer_bytes.items() if d == "out"
+            )
+            transfer = {}
+            for (service, direction), amount in sorted(self.transfer_bytes.items()):
+                transfer.setdefault(service, {})[direction] = amount
+            return {
+                "wall_seconds": round(time.perf_counter() - self.started, 3),
+                **{
+                    f"{kind}_seconds": {
+                        name: round(seconds, 3) for name, seconds in totals.items()
+                    }
+                    for kind, totals in self.wall_seconds.items()
+                },
+                "cpu_seconds": round(sum(self.cpu_seconds.values()), 3),
+                "cpu_seconds_by_step": {
+                    step: round(seconds, 3)
+                    for step, seconds in self.cpu_seconds.items()
+                },
+                "peak_rss_bytes": self.peak_rss_bytes,
+                "frames_rendered": self.frames_rendered,
+                "render_seconds": round(self.render_seconds, 3),
+                "render_fps": (
+                    round(self.frames_rendered / self.render_seconds, 1)
+                    if self.render_seconds
+                    else None
+                ),
+                "bytes_downloaded": bytes_in,
+                "bytes_uploaded": bytes_out,
+                "transfer_bytes": transfer,
+                "llm_calls": round(self.llm_calls, 2),
+                "llm_input_tokens": round(self.llm_input_tokens),
+                "llm_output_tokens": round(self.llm_output_tokens),
+                "tts_characters": self.tts_characters,
+                "cache": {
+                    name: {"hits": hits, "misses": misses}
+                    for name, (hits, misses) in self.cache.items()
+                },
+            }
+
+
+# 当前请求的资源用量，未处于 track_usage 内时为 None
+current_usage: ContextVar[Optional[ResourceUsage]] = ContextVar(
+    "current_usage", default=None
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """指标基类。"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """:return: (指标名, 标签, 值) 列表。"""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines += [
+            f"{name}{labels} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            (self.name, _format_labels(self.labelnames, key), value)
+            for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    """取值时调用回调函数的瞬时值指标。"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.func = func
+
+    def samples(self):
+        return [(self.name, "", self.func())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = SECONDS_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 标签值 -> [各桶计数（非累计）, 总和, 样本数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, le=_format_value(bound))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STEP_SECONDS = REGISTRY.register(
+    Histogram("kvidgen_step_seconds", "管道步骤墙钟耗时（秒）", ["step", "status"])
+)
+STEP_CPU_SECONDS = REGISTRY.register(
+    Counter(
+        "kvidgen_step_cpu_seconds_total",
+        "管道步骤在子进程与 ffmpeg 中消耗的 CPU 时间（秒）",
+        ["step"],
+    )
+)
+PIPELINE_SECONDS = REGISTRY.register(
+    Histogram("kvidgen_pipeline_seconds", "整条管道的墙钟耗时（秒）", ["status"])
+)
+QUEUE_SECONDS = REGISTRY.register(
+    Histogram("kvidgen_queue_seconds", "开始执行前的排队时间（秒）", ["queue"])
+)
+CALL_SECONDS = REGISTRY.register(
+    Histogram(
+        "kvidgen_external_call_seconds",
+        "外部调用墙钟耗时（秒）",
+        ["service", "operation", "status"],
+    )
+)
+CALL_CPU_SECONDS = REGISTRY.register(
+    Counter(
+        "kvidgen_external_call_cpu_seconds_total",
+        "外部命令（ffmpeg/ffprobe）子进程消耗的 CPU 时间（秒）",
+        ["service", "operation"],
+    )
+)
+TRANSFER_BYTES = REGISTRY.register(
+    Counter(
+        "kvidgen_transfer_bytes_total",
+        "与外部服务传输的字节数，direction 为 in（接收）或 out（发送）",
+        ["service", "direction"],
+    )
+)
+FRAMES_RENDERED = REGISTRY.register(
+    Counter("kvidgen_frames_rendered_total", "渲染的视频帧数", ["profile"])
+)
+LLM_TOKENS = REGISTRY.register(
+    Counter("kvidgen_llm_tokens_total", "大模型消耗的 token 数", ["kind"])
+)
+TTS_CHARACTERS = REGISTRY.register(
+    Counter("kvidgen_tts_characters_total", "提交语音合成的字符数")
+)
+RENDER_FPS = REGISTRY.register(
+    Histogram(
+        "kvidgen_render_fps",
+        "单次渲染的帧率（帧/秒）",
+        ["profile"],
+        buckets=(5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240),
+    )
+)
+
+
+def add_cpu(seconds: float) -> None:
+    """把子进程或线程中消耗的 CPU 时间记到当前步骤。"""
+    step = current_step.get()
+    STEP_CPU_SECONDS.inc(seconds, step=step)
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_cpu(step, seconds)
+
+
+def _add_wall(kind: str, name: str, seconds: float) -> None:
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_wall(kind, name, seconds)
+
+
+def add_rss(rss_bytes: int) -> None:
+    """记录渲染任务所在子进程的峰值常驻内存（字节）。"""
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_rss(rss_bytes)
+
+
+def add_bytes(service: str, direction: str, amount: int) -> None:
+    TRANSFER_BYTES.inc(amount, service=service, direction=direction)
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_bytes(service, direction, amount)
+
+
+def add_llm_tokens(input_tokens: int, output_tokens: int) -> None:
+    LLM_TOKENS.inc(input_tokens, kind="input")
+    LLM_TOKENS.inc(output_tokens, kind="output")
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_llm(input_tokens, output_tokens)
+
+
+def add_tts_characters(characters: int) -> None:
+    TTS_CHARACTERS.inc(characters)
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_tts_characters(characters)
+
+
+def count_cache(name: str, hit: bool) -> None:
+    """记录当前请求的一次缓存查询，全局命中率见 /management/caches。"""
+    usage = current_usage.get()
+    if usage is not None:
+        usage.count_cache(name, hit)
+
+
+@contextmanager
+def track_usage(usage: Optional[ResourceUsage] = None):
+    """
+    在上下文内累加资源用量。已处于 track_usage 内时沿用外层的对象。
+    :param usage: 指定累加到的对象，用于把共享调用（如合并的大模型请求）单独核算。
+    :return: 资源用量。
+    """
+    if usage is None and current_usage.get() is not None:
+        yield current_usage.get()
+        return
+    usage = usage or ResourceUsage()
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
+
+
+_tracer = None
+
+
+def span(name: str, **attributes):
+    """
+    TRACING_ENABLED 且安装了 opentelemetry 时创建追踪 span，否则不做任何事。
+    :param name: span 名称。
+    :param attributes: span 属性。
+    """
+    global _tracer
+    if not settings.TRACING_ENABLED or trace is None:
+        return nullcontext()
+    if _tracer is None:
+        _tracer = trace.get_tracer("kvidgen")
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def observe_step(step: str):
+    """
+    记录管道步骤的墙钟耗时并创建 span，上下文内消耗的子进程 CPU 时间记到该步骤。
+    :param step: 步骤名称。
+    """
+    token = current_step.set(step)
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"step {step}", step=step):
+            yield
+        status = "ok"
+    finally:
+        seconds = time.perf_counter() - start
+        STEP_SECONDS.observe(seconds, step=step, status=status)
+        current_step.reset(token)
+        _add_wall("step", step, seconds)
+
+
+@contextmanager
+def observe_pipeline():
+    """记录整条管道的墙钟耗时并创建 span，管道内各步骤的 span 挂在其下。"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span("pipeline"):
+            yield
+        status = "ok"
+    finally:
+        PIPELINE_SECONDS.observe(time.perf_counter() - start, status=status)
+
+
+@contextmanager
+def observe_call(service: str, operation: str):
+    """
+    记录一次外部调用的墙钟耗时并创建 span，异常照常抛出。
+    :param service: 服务名称，如 llm、tts、oss、ffmpeg、download。
+    :param operation: 操作名称。
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"{service} {operation}", service=service, operation=operation):
+            yield
+        status = "ok"
+    finally:
+        seconds = time.perf_counter() - start
+        CALL_SECONDS.observe(
+            seconds, service=service, operation=operation, status=status
+        )
+        _add_wall("call", f"{service}.{operation}", seconds)
+
+
+def observe_cpu(service: str, operation: str, seconds: float) -> None:
+    """记录外部命令消耗的 CPU 时间，同时计入当前步骤。"""
+    CALL_CPU_SECONDS.inc(seconds, service=service, operation=operation)
+    add_cpu(seconds)
+
+
+def observe_queue(queue: str, seconds: float) -> None:
+    QUEUE_SECONDS.observe(seconds, queue=queue)
+    _add_wall("queue", queue, seconds)
+
+
+def observe_render(profile: str, frames: int, seconds: float) -> None:
+    FRAMES_RENDERED.inc(frames, profile=profile)
+    if seconds > 0:
+        RENDER_FPS.observe(frames / seconds, profile=profile)
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add_render(frames, seconds)
+
+
+def measure_cpu(clock: Callable[[], float], func: Callable, *args, **kwargs):
+    """
+    执行 func 并测量其 CPU 时间，CPU 进程池停用时包装线程中的任务。
+    :param clock: 计时函数，如 time.thread_time。
+    :return: (func 返回值, 消耗的 CPU 秒数)。
+    """
+    start = clock()
+    result = func(*args, **kwargs)
+    return result, clock() - start
+
+
+def measure_process(func: Callable, *args, **kwargs):
+    """
+    在 CPU 进程池的子进程中执行 func，测量其 CPU 时间（含 OpenCV 内部线程）与峰值内存。
+    子进程由 spawn 启动并在多个任务间复用，ru_maxrss 是整个进程生命周期的峰值，
+    会带上之前任务的内存，因此在任务前重置并读取 VmHWM。
+    :return: (func 返回值, 消耗的 CPU 秒数, 峰值常驻内存字节数)。
+    """
+    _reset_peak_rss()
+    result, cpu = measure_cpu(time.process_time, func, *args, **kwargs)
+    return result, cpu, _peak_rss()
+
+
+def _reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int:
+    """:return: 当前进程的峰值常驻内存（字节），无 /proc 时退回 ru_maxrss。"""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def render_metrics(gauges: Optional[Dict[str, Tuple[str, Callable[[], float]]]] = None):
+    """
+    :param gauges: 额外输出的瞬时值 {指标名: (说明, 取值函数)}。
+    :return: Prometheus 文本格式的全部指标。
+    """
+    text = REGISTRY.render()
+    for name, (documentation, func) in (gauges or {}).items():
+        text += Gauge(name, documentation, func).render() + "\n"
+    return text
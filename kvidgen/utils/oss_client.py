@@ -1,13 +1,53 @@
+import asyncio
+import json
+import math
+import os
+import tempfile
 from threading import RLock
-from typing import Optional
+from typing import Dict, Optional
 
 import asyncio_oss
 import oss2
+from asyncio_oss.exceptions import NotFound, OssError
+from loguru import logger
+from oss2.models import PartInfo
+from oss2.utils import Crc64, calc_obj_crc_from_parts, check_crc
 
 from kvidgen.core.config import settings
+from kvidgen.utils.common import gather_with_concurrency, retry_async
+from kvidgen.utils.metrics import add_bytes, observe_call, span
+
+# OSS 单次分片上传最多 10000 个分片
+MAX_PARTS = 10000
+
+
+def _is_retryable(e: Exception) -> bool:
+    # RequestError 的 status 为负数，表示连接或读写失败
+    return isinstance(e, OssError) and (
+        e.status < 0 or e.status == 429 or e.status >= 500
+    )
+
+
+def _read_part(filepath: str, offset: int, size: int) -> tuple:
+    """
+    在工作线程中读取文件片段并计算 CRC64，避免在事件循环中校验大块数据。
+    :return: (数据, CRC64)
+    """
+    with open(filepath, "rb") as file:
+        file.seek(offset)
+        data = file.read(size)
+    crc = Crc64(0)
+    crc.update(data)
+    return data, crc.crc
 
 
 class AliyunOssClient:
+    """
+    阿里云 OSS 客户端。上传复用长期存在的 asyncio_oss.Bucket 及其连接池，签名 URL 在本地计算。
+    超过 OSS_MULTIPART_THRESHOLD 的文件分片并发上传，进度写入文件旁的 .upload 检查点，
+    失败后再次上传同一文件时只补传缺失的分片。
+    """
+
     single_lock = RLock()
 
     def __init__(self) -> None:
@@ -16,6 +56,10 @@ class AliyunOssClient:
         self.oss_auth = oss2.Auth(settings.ACCESS_KEY_ID, settings.ACCESS_KEY_SECRET)
         self.endpoint = settings.ENDPOINT
         self.bucket_name = settings.BUCKET_NAME
+        # 同步 Bucket 只用于本地签名，不发起请求
+        self.signer = oss2.Bucket(self.oss_auth, self.endpoint, self.bucket_name)
+        self._bucket: Optional[asyncio_oss.Bucket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     def __new__(cls, *args, **kwargs):
         with AliyunOssClient.single_lock:
@@ -23,16 +67,196 @@ class AliyunOssClient:
                 AliyunOssClient._instance = object.__new__(cls)
         return AliyunOssClient._instance
 
+    async def _get_bucket(self) -> asyncio_oss.Bucket:
+        """当前事件循环的 Bucket，连接池随 Bucket 创建，事件循环变化时关闭旧的 Bucket。"""
+        loop = asyncio.get_running_loop()
+        if self._bucket is None or self._loop is not loop:
+            previous = self._bucket
+            # CRC 在读取文件时计算，上传后再与服务端返回值比对
+            bucket = asyncio_oss.Bucket(
+                self.oss_auth, self.endpoint, self.bucket_name, enable_crc=False
+            )
+            # 按 async with 协议立即创建连接池，之后统一用 close 关闭
+            await bucket.__aenter__()
+            self._bucket = bucket
+            self._loop = loop
+            await self._close_bucket(previous)
+        return self._bucket
+
+    @staticmethod
+    async def _close_bucket(bucket: Optional[asyncio_oss.Bucket]) -> None:
+        """关闭 Bucket 的连接池。旧事件循环可能已关闭，关闭失败只记录日志。"""
+        if bucket is None:
+            return
+        try:
+            await bucket.close()
+        except Exception as e:
+            logger.warning(f"Failed to close OSS session: {e!r}")
+
+    async def shutdown(self) -> None:
+        bucket = self._bucket
+        self._bucket = None
+        self._loop = None
+        await self._close_bucket(bucket)
+
+    async def _request(self, operation: str, func):
+        """
+        执行一次 OSS 请求，可重试的错误按退避策略重试。
+        :param operation: 指标中的操作名称。
+        :param func: 以 Bucket 为参数的协程函数。
+        """
+
+        async def attempt():
+            bucket = await self._get_bucket()
+            try:
+                with observe_call("oss", operation):
+                    return await func(bucket)
+            except asyncio_oss.exceptions.RequestError:
+                # 连接错误后 asyncio_oss 不再重建会话，关闭并丢弃后下次请求重新创建
+                if self._bucket is bucket:
+                    self._bucket = None
+                    await self._close_bucket(bucket)
+                raise
+
+        return await retry_async(
+            attempt,
+            retries=settings.OSS_MAX_RETRIES,
+            backoff=settings.OSS_RETRY_BACKOFF,
+            should_retry=_is_retryable,
+        )
+
     async def upload_file(self, filepath: str, object_key: str):
-        async with asyncio_oss.Bucket(
-            self.oss_auth, self.endpoint, self.bucket_name
-        ) as bucket:
-            await bucket.put_object_from_file(object_key, filepath)
+        size = os.path.getsize(filepath)
+        # 各次请求已分别计入 observe_call，整体上传只建 span，避免重复计时
+        with span("oss upload", service="oss", operation="upload"):
+            if size <= settings.OSS_MULTIPART_THRESHOLD:
+                data, crc = await asyncio.to_thread(_read_part, filepath, 0, size)
+                result = await self._request(
+                    "put", lambda bucket: bucket.put_object(object_key, data)
+                )
+                check_crc("put object", crc, result.crc, result.request_id)
+                add_bytes("oss", "out", size)
+            else:
+                await self._upload_multipart(filepath, object_key, size)
+
+    async def _upload_multipart(self, filepath: str, object_key: str, size: int):
+        part_size = max(settings.OSS_PART_SIZE, math.ceil(size / MAX_PARTS))
+        checkpoint_path = f"{filepath}.upload"
+        checkpoint = {
+            "object_key": object_key,
+            "size": size,
+            "mtime_ns": os.stat(filepath).st_mtime_ns,
+            "part_size": part_size,
+        }
+        upload_id, parts = await self._resume(checkpoint_path, checkpoint)
+        if upload_id is None:
+            result = await self._request(
+                "init_multipart",
+                lambda bucket: bucket.init_multipart_upload(object_key),
+            )
+            upload_id, parts = result.upload_id, {}
+        checkpoint["upload_id"] = upload_id
+        count = math.ceil(size / part_size)
+        missing = [n for n in range(1, count + 1) if n not in parts]
+        logger.info(
+            f"Uploading {object_key} in {count} parts of {part_size} bytes, "
+            f"{count - len(missing)} already uploaded"
+        )
+
+        async def upload_part(number: int) -> None:
+            offset = (number - 1) * part_size
+            data, crc = await asyncio.to_thread(_read_part, filepath, offset, part_size)
+            result = await self._request(
+                "upload_part",
+                lambda bucket: bucket.upload_part(object_key, upload_id, number, data),
+            )
+            check_crc("upload part", crc, result.crc, result.request_id)
+            add_bytes("oss", "out", len(data))
+            parts[number] = {"etag": result.etag, "size": len(data), "crc": crc}
+            self._save_checkpoint(checkpoint_path, {**checkpoint, "parts": parts})
+
+        await gather_with_concurrency(
+            settings.OSS_UPLOAD_CONCURRENCY, [upload_part(n) for n in missing]
+        )
+        part_infos = [
+            PartInfo(n, part["etag"], size=part["size"], part_crc=part["crc"])
+            for n, part in sorted(parts.items())
+        ]
+        result = await self._request(
+            "complete_multipart",
+            lambda bucket: bucket.complete_multipart_upload(
+                object_key, upload_id, part_infos
+            ),
+        )
+        check_crc(
+            "multipart upload",
+            calc_obj_crc_from_parts(part_infos),
+            result.crc,
+            result.request_id,
+        )
+        os.remove(checkpoint_path)
+
+    async def _resume(self, checkpoint_path: str, checkpoint: dict) -> tuple:
+        """
+        读取上次未完成的分片上传，以服务端已收到的分片为准。
+        :return: (upload_id, {分片号: 分片信息})，无可续传的上传时 upload_id 为 None。
+        """
+        try:
+            with open(checkpoint_path) as file:
+                saved = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, {}
+        if any(saved.get(name) != value for name, value in checkpoint.items()):
+            logger.info(f"Discarding stale upload checkpoint {checkpoint_path}")
+            await self._abort(saved)
+            return None, {}
+
+        upload_id = saved["upload_id"]
+        uploaded: Dict[int, PartInfo] = {}
+        marker = ""
+        try:
+            while True:
+                result = await self._request(
+                    "list_parts",
+                    lambda bucket: bucket.list_parts(
+                        saved["object_key"], upload_id, marker=marker
+                    ),
+                )
+                uploaded.update((part.part_number, part) for part in result.parts)
+                if not result.is_truncated:
+                    break
+                marker = result.next_marker
+        except NotFound:
+            return None, {}
+
+        parts = {}
+        for number, part in saved.get("parts", {}).items():
+            remote = uploaded.get(int(number))
+            if remote is not None and remote.etag == part["etag"].strip('"'):
+                parts[int(number)] = part
+        logger.info(f"Resuming upload {upload_id} with {len(parts)} parts")
+        return upload_id, parts
+
+    async def _abort(self, saved: dict) -> None:
+        try:
+            await self._request(
+                "abort_multipart",
+                lambda bucket: bucket.abort_multipart_upload(
+                    saved["object_key"], saved["upload_id"]
+                ),
+            )
+        except (OssError, KeyError) as e:
+            logger.warning(f"Failed to abort multipart upload: {e!r}")
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: str, checkpoint: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(checkpoint_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, checkpoint_path)
 
     async def generate_signed_url(
         self, object_key: str, timout: int = 1 * 60 * 10, method: Optional[str] = "GET"
     ):
-        async with asyncio_oss.Bucket(
-            self.oss_auth, self.endpoint, self.bucket_name
-        ) as bucket:
-            return await bucket.sign_url(method, object_key, timout)
+        return self.signer.sign_url(method, object_key, timout)
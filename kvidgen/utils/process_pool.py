@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from kvidgen.core.config import settings
+from kvidgen.utils.common import singleton
+from kvidgen.utils.metrics import add_cpu, add_rss, measure_cpu, measure_process
+
+T = TypeVar("T")
+
+
+@singleton
+class ProcessPoolManager:
+    """
+    进程级共享的 CPU 任务池，承载视频渲染、图片解码与编码等 CPU 密集任务，
+    使事件循环在渲染期间仍能响应健康检查等请求。
+    在 FastAPI lifespan 中创建和关闭；脚本等未经过 lifespan 的场景首次使用时自动创建。
+    CPU_POOL_ENABLED 关闭时退化为线程执行。
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.max_workers = settings.CPU_POOL_WORKERS or max(
+            1, (os.cpu_count() or 1) // (settings.WORKERS or 1)
+        )
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting CPU process pool with {self.max_workers} workers")
+            # 使用 spawn 启动子进程，避免 fork 继承事件循环与连接池等状态
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=settings.CPU_POOL_MAX_TASKS_PER_CHILD or None,
+            )
+        return self._executor
+
+    async def startup(self) -> None:
+        if settings.CPU_POOL_ENABLED:
+            _ = self.executor
+
+    async def shutdown(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+            logger.info("Closed CPU process pool")
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在进程池中执行函数，func 及参数需可被 pickle（模块级函数）。
+        消耗的 CPU 时间计入当前管道步骤，子进程的峰值内存计入当前请求。
+        :param func: 要执行的函数。
+        :return: 函数返回值。
+        """
+        result, _ = await self.run_measured(func, *args, **kwargs)
+        return result
+
+    async def run_measured(
+        self, func: Callable[..., T], *args, **kwargs
+    ) -> Tuple[T, float]:
+        """
+        与 run 相同，同时返回函数执行本身消耗的 CPU 秒数。
+        该值在子进程内测量，不含在进程池中排队等待的时间。
+        :param func: 要执行的函数。
+        :return: (函数返回值, CPU 秒数)。
+        """
+        if not settings.CPU_POOL_ENABLED:
+            result, cpu = await asyncio.to_thread(
+                measure_cpu, time.thread_time, func, *args, **kwargs
+            )
+            add_cpu(cpu)
+            return result, cpu
+
+        self.in_flight += 1
+        try:
+            result, cpu, rss = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                functools.partial(measure_process, func, *args, **kwargs),
+            )
+        except BrokenProcessPool:
+            # 子进程异常退出（如 OOM 被杀）后进程池不可再用，丢弃以便下次重建
+            logger.error("CPU process pool is broken, recreating on next use")
+            self._executor = None
+            self.failed += 1
+            raise
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        add_cpu(cpu)
+        add_rss(rss)
+        return result, cpu
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.CPU_POOL_ENABLED,
+            "started": self._executor is not None,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -1,22 +1,77 @@
-from typing import Optional
+import asyncio
+import gzip
+import hashlib
+import os
+from typing import Callable, List, Optional, Tuple
 
 import aiohttp
 import base64
 import json
 import uuid
 
+from kvidgen.core.audio.mp3 import Mp3DurationCounter, mp3_duration
 from kvidgen.core.config import settings
+from kvidgen.utils.cache import DiskLRUCache
+from kvidgen.utils.common import gather_with_concurrency, retry_async, singleton
+from kvidgen.utils.http_client import HttpClientManager
+from kvidgen.utils.metrics import (
+    add_bytes,
+    add_tts_characters,
+    count_cache,
+    observe_call,
+)
 
 
-def singleton(cls):
-    instances = {}
+class TTSError(RuntimeError):
+    """语音合成失败，retryable 标记该错误是否值得重试。"""
 
-    def wrapper(*args, **kwargs):
-        if cls not in instances:
-            instances[cls] = cls(*args, **kwargs)
-        return instances[cls]
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
 
-    return wrapper
+
+# WebSocket 二进制协议头：版本 1、头长 4 字节、完整客户端请求、JSON 序列化、gzip 压缩
+_WS_FULL_CLIENT_REQUEST = bytes([0x11, 0x10, 0x11, 0x00])
+_WS_AUDIO_ONLY_RESPONSE = 0xB
+_WS_ERROR_RESPONSE = 0xF
+# 服务端繁忙、超时、后端链路异常等可重试的错误码
+_RETRYABLE_CODES = {3003, 3005, 3006, 3030, 3031, 3032, 3040}
+
+
+def _parse_ws_response(message: bytes) -> Tuple[bytes, bool]:
+    """
+    解析流式合成的服务端消息。
+    :return: (音频数据, 是否为最后一帧)。
+    """
+    header_size = (message[0] & 0x0F) * 4
+    message_type = message[1] >> 4
+    flags = message[1] & 0x0F
+    compression = message[2] & 0x0F
+    payload = message[header_size:]
+
+    if message_type == _WS_AUDIO_ONLY_RESPONSE:
+        # flags 为 0 时是不带序号的确认消息
+        if flags == 0:
+            return b"", False
+        sequence = int.from_bytes(payload[:4], "big", signed=True)
+        size = int.from_bytes(payload[4:8], "big")
+        return payload[8 : 8 + size], sequence < 0
+    if message_type == _WS_ERROR_RESPONSE:
+        code = int.from_bytes(payload[:4], "big")
+        error = payload[8:]
+        if compression == 1:
+            error = gzip.decompress(error)
+        raise TTSError(
+            f"TTS stream failed: code={code} message={error.decode('utf-8', 'ignore')}",
+            retryable=code in _RETRYABLE_CODES,
+        )
+    return b"", False
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, TTSError):
+        return e.retryable
+    return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError))
 
 
 @singleton
@@ -26,14 +81,36 @@ class TTSClient:
         appid: Optional[str] = None,
         access_token: Optional[str] = None,
         cluster: Optional[str] = None,
-        host="openspeech.bytedance.com",
+        host: Optional[str] = None,
     ):
         self.appid = appid or settings.TTS_APPID
         self.access_token = access_token or settings.TTS_ACCESS_TOKEN
         self.cluster = cluster or settings.TTS_CLUSTER
         self.host = host
-        self.api_url = f"https://{host}/api/v1/tts"
+        self.api_url = f"https://{host}/api/v1/tts" if host else settings.TTS_API_URL
+        self.ws_url = (
+            f"wss://{host}/api/v1/tts/ws_binary" if host else settings.TTS_WS_URL
+        )
         self.header = {"Authorization": f"Bearer;{self.access_token}"}  # noqa
+        self.cache = (
+            DiskLRUCache(
+                os.path.join(settings.CACHE_DIR, "tts"),
+                settings.TTS_CACHE_MAX_BYTES,
+                settings.TTS_CACHE_MEMORY_BYTES,
+            )
+            if settings.TTS_CACHE_ENABLED
+            else None
+        )
+
+    @staticmethod
+    def cache_key(text: str, audio: dict, frontend_type: str) -> str:
+        """根据文本与全部音色参数生成缓存键。"""
+        payload = json.dumps(
+            {"text": text, "audio": audio, "frontend_type": frontend_type},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
     async def synthesize(
         self,
@@ -41,7 +118,39 @@ class TTSClient:
         save_path: str,
         voice_type="BV001_streaming",
         uid: Optional[str] = "388808087185088",
+        speed_ratio: float = 1.1,
+        volume_ratio: float = 1.0,
+        pitch_ratio: float = 1.0,
+        emotion: str = "sad",
+        frontend_type: str = "tear",
+        stream: Optional[bool] = None,
+        on_progress: Optional[Callable[[float], None]] = None,
     ):
+        """
+        合成语音并保存为 mp3。
+        :param stream: 是否通过 WebSocket 流式接收音频，默认取 TTS_STREAMING。
+        :param on_progress: 进度回调，参数为已写入音频的累计时长（秒）。
+        :return: 音频文件路径。
+        """
+        audio = {
+            "voice_type": voice_type,
+            "encoding": "mp3",
+            "speed_ratio": speed_ratio,
+            "volume_ratio": volume_ratio,
+            "pitch_ratio": pitch_ratio,
+            "emotion": emotion,
+        }
+        cache_key = self.cache_key(text, audio, frontend_type)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            count_cache("tts", cached is not None)
+            if cached is not None:
+                with open(save_path, "wb") as file_to_save:
+                    file_to_save.write(cached)
+                if on_progress:
+                    on_progress(mp3_duration(cached))
+                return save_path
+
         request_json = {
             "app": {
                 "appid": self.appid,
@@ -49,32 +158,133 @@ class TTSClient:
                 "cluster": self.cluster,
             },
             "user": {"uid": uid},
-            "audio": {
-                "voice_type": voice_type,
-                "encoding": "mp3",
-                "speed_ratio": 1.1,
-                "volume_ratio": 1.0,
-                "pitch_ratio": 1.0,
-                "emotion": "sad",
-            },
+            "audio": audio,
             "request": {
                 "reqid": str(uuid.uuid4()),
                 "text": text,
                 "text_type": "plain",
                 "operation": "query",
                 "with_frontend": 1,
-                "frontend_type": "tear",
+                "frontend_type": frontend_type,
             },
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.api_url, data=json.dumps(request_json), headers=self.header
-            ) as resp:
-                resp_json = await resp.json()
-                if "data" in resp_json:
-                    data = resp_json["data"]
-                    with open(save_path, "wb") as file_to_save:
-                        file_to_save.write(base64.b64decode(data))
-                    return save_path
-                return None
+        if settings.TTS_STREAMING if stream is None else stream:
+            with observe_call("tts", "stream"):
+                audio_bytes = await self._query_stream(
+                    request_json, save_path, on_progress
+                )
+        else:
+            with observe_call("tts", "query"):
+                audio_bytes = await self._query(request_json)
+            with open(save_path, "wb") as file_to_save:
+                file_to_save.write(audio_bytes)
+            if on_progress:
+                on_progress(mp3_duration(audio_bytes))
+        add_bytes("tts", "in", len(audio_bytes))
+        add_tts_characters(len(text))
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, audio_bytes)
+        return save_path
+
+    async def _query(self, request_json: dict) -> bytes:
+        async with HttpClientManager().session.post(
+            self.api_url, data=json.dumps(request_json), headers=self.header
+        ) as resp:
+            if resp.status == 429 or resp.status >= 500:
+                raise TTSError(f"TTS HTTP {resp.status}", retryable=True)
+            resp_json = await resp.json(content_type=None)
+            if "data" in resp_json:
+                return base64.b64decode(resp_json["data"])
+            raise TTSError(
+                f"TTS failed: code={resp_json.get('code')} "
+                f"message={resp_json.get('message')}",
+                retryable=resp_json.get("code") in _RETRYABLE_CODES,
+            )
+
+    async def _query_stream(
+        self,
+        request_json: dict,
+        save_path: str,
+        on_progress: Optional[Callable[[float], None]],
+    ) -> bytes:
+        """
+        通过 WebSocket 二进制协议流式合成，音频帧到达即写盘并回报累计时长。
+        """
+        request_json["request"]["operation"] = "submit"
+        payload = gzip.compress(json.dumps(request_json).encode("utf-8"))
+        message = _WS_FULL_CLIENT_REQUEST + len(payload).to_bytes(4, "big") + payload
+
+        audio_bytes = bytearray()
+        counter = Mp3DurationCounter()
+        async with HttpClientManager().session.ws_connect(
+            self.ws_url, headers=self.header
+        ) as ws:
+            await ws.send_bytes(message)
+            with open(save_path, "wb") as file_to_save:
+                while True:
+                    msg = await ws.receive()
+                    if msg.type != aiohttp.WSMsgType.BINARY:
+                        raise TTSError(
+                            f"TTS stream closed unexpectedly: {msg.type}",
+                            retryable=True,
+                        )
+                    frame, done = _parse_ws_response(msg.data)
+                    if frame:
+                        file_to_save.write(frame)
+                        audio_bytes.extend(frame)
+                        if on_progress:
+                            on_progress(counter.feed(frame))
+                    if done:
+                        break
+        return bytes(audio_bytes)
+
+    async def synthesize_chunk(
+        self,
+        index: int,
+        chunk: str,
+        save_dir: str,
+        on_progress: Optional[Callable[[int, float], None]] = None,
+        **kwargs,
+    ) -> str:
+        """
+        合成单个文本分段，失败时按退避策略重试。
+        :param index: 分段序号，决定文件名 tts{序号}.mp3。
+        :param chunk: 分段文本。
+        :param save_dir: 音频保存目录。
+        :param on_progress: 进度回调，参数为 (分段序号, 该分段已合成的累计时长)。
+        :return: 音频文件路径。
+        """
+        save_path = os.path.join(save_dir, f"tts{index}.mp3")
+        progress = (lambda d: on_progress(index, d)) if on_progress else None
+        return await retry_async(
+            lambda: self.synthesize(chunk, save_path, on_progress=progress, **kwargs),
+            retries=settings.TTS_MAX_RETRIES,
+            backoff=settings.TTS_RETRY_BACKOFF,
+            should_retry=_is_retryable,
+        )
+
+    async def synthesize_chunks(
+        self,
+        chunks: List[str],
+        save_dir: str,
+        concurrency: Optional[int] = None,
+        on_progress: Optional[Callable[[int, float], None]] = None,
+        **kwargs,
+    ) -> List[str]:
+        """
+        并发合成多个文本分段，单个分段失败时按退避策略重试。
+        :param chunks: 按顺序排列的文本分段。
+        :param save_dir: 音频保存目录，文件名为 tts{序号}.mp3。
+        :param concurrency: 最大并发请求数，默认取 TTS_CONCURRENCY。
+        :param on_progress: 进度回调，参数为 (分段序号, 该分段已合成的累计时长)。
+        :return: 与分段顺序一致的音频文件路径列表。
+        """
+        return await gather_with_concurrency(
+            concurrency or settings.TTS_CONCURRENCY,
+            [
+                self.synthesize_chunk(i, chunk, save_dir, on_progress, **kwargs)
+                for i, chunk in enumerate(chunks)
+            ],
+        )
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from kvidgen.core import pipline
+from kvidgen.core.config import settings
+from kvidgen.core.video.cost import estimate_render_seconds
+from kvidgen.core.video.profile import get_render_profile
+from kvidgen.service.admission import RenderCostModel
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+@pytest.fixture
+def cost_model(tmp_path):
+    return RenderCostModel(str(tmp_path / "cost_model.json"))
+
+
+def fake_render(output_path, **_):
+    # 在子进程中执行，消耗固定的 CPU 时间
+    deadline = time.process_time() + 0.1
+    while time.process_time() < deadline:
+        pass
+    return output_path
+
+
+def test_raw_estimate_uses_effects(param, cost_model):
+    profile = get_render_profile()
+    cheap = [["grayscale"], ["grayscale"]]
+    expensive = [["vignette", "spotlight"], ["vignette", "spotlight"]]
+
+    assert cost_model.raw_estimate(param, profile, cheap) < cost_model.raw_estimate(
+        param, profile
+    )
+    assert cost_model.raw_estimate(param, profile, expensive) == pytest.approx(
+        estimate_render_seconds(
+            2, cost_model.narration_seconds(param.fundraising_text), profile, expensive
+        )
+    )
+
+
+def test_record_calibrates_against_rendered_effects(param, cost_model):
+    profile = get_render_profile()
+    cheap = [["grayscale"], ["grayscale"]]
+    # 实测耗时与按实际特效的估算一致，校准系数不应变化
+    render_seconds = cost_model.raw_estimate(param, profile, cheap)
+    cost_model.record(param, profile, render_seconds, effects=cheap)
+
+    assert cost_model.calibration == pytest.approx(1.0)
+    assert RenderCostModel(cost_model.path).samples == 1
+
+
+async def test_pool_queue_time_does_not_move_calibration(
+    param, cost_model, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "CPU_POOL_ENABLED", True)
+    monkeypatch.setattr(settings, "CPU_POOL_WORKERS", 1)
+    monkeypatch.setattr(settings, "CPU_POOL_MAX_TASKS_PER_CHILD", 0)
+    pool = type(ProcessPoolManager())()
+    monkeypatch.setattr(pipline, "ProcessPoolManager", lambda: pool)
+    monkeypatch.setattr(pipline, "render_slideshow", fake_render)
+    images = [{"path": f"{i}.jpg", "width": 64, "height": 64} for i in range(2)]
+
+    async def render() -> dict:
+        return await pipline.VideoGenerationStep().process(
+            {
+                "image_meta": images,
+                "effect_config": {},
+                "tts_chunks": [],
+                "narration_duration": 5.0,
+                "deadline": None,
+                "tmp_dir": str(tmp_path),
+            }
+        )
+
+    try:
+        # 预热：子进程首次反序列化 fake_render 时需导入本模块
+        await pool.run(fake_render, output_path="warmup.mp4")
+        alone = await render()
+        # 唯一的工作进程被占用，渲染任务需在进程池中排队
+        blocker = asyncio.ensure_future(pool.run(time.sleep, 1.0))
+        await asyncio.sleep(0.2)
+        queued = await render()
+        await blocker
+    finally:
+        await pool.shutdown()
+
+    assert queued["render_seconds"] > alone["render_seconds"] + 0.5
+    assert queued["render_cpu_seconds"] == pytest.approx(
+        alone["render_cpu_seconds"], abs=0.05
+    )
+
+    profile = get_render_profile()
+    calibrations = []
+    for data in (alone, queued):
+        model = RenderCostModel(str(tmp_path / f"{len(calibrations)}.json"))
+        model.record(
+            param,
+            profile,
+            data["render_cpu_seconds"],
+            effects=data["render_effects"],
+        )
+        calibrations.append(model.calibration)
+    assert calibrations[1] == pytest.approx(calibrations[0], abs=1e-3)
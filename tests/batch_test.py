@@ -0,0 +1,154 @@
+import asyncio
+import io
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from kvidgen import batch as batch_cli
+from kvidgen.api.endpoints import video
+from kvidgen.core.config import settings
+from kvidgen.service import batch
+from kvidgen.service.batch import generate_batch
+
+
+class FakeOssClient:
+    async def generate_signed_url(self, object_key: str) -> str:
+        return f"http://oss/{object_key}"
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class FakeProducer:
+    """patient_name 在 fail 中的条目立即失败，其余条目稍后成功。"""
+
+    def __init__(self):
+        self.started = []
+        self.fail = set()
+
+    async def __call__(self, request, reject=True, submitted_at=None):
+        name = request.patient_info.patient_name
+        self.started.append(name)
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        await asyncio.sleep(0.05)
+        return {"object_key": f"{name}.mp4", "renditions": {}, "degradations": []}
+
+
+@pytest.fixture
+def producer(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_CONCURRENCY", 4)
+    monkeypatch.setattr(batch, "AliyunOssClient", FakeOssClient)
+    monkeypatch.setattr(batch_cli, "AliyunOssClient", FakeOssClient)
+    fake = FakeProducer()
+    monkeypatch.setattr(batch, "produce_video", fake)
+    return fake
+
+
+@pytest.fixture
+def items(param):
+    def make(*names):
+        result = []
+        for name in names:
+            item = param.model_dump(mode="json")
+            item["patient_info"]["patient_name"] = name
+            result.append(item)
+        return result
+
+    return make
+
+
+async def collect(items):
+    return [result async for result in generate_batch(items)]
+
+
+async def test_failed_item_does_not_stop_the_rest(producer, items):
+    producer.fail.add("b")
+    results = await collect(items("a", "b", "c"))
+
+    # 失败的条目最先完成，其余条目照常运行到结束
+    assert results[0] == {"index": 1, "status": "failed", "error": "b failed"}
+    succeeded = sorted(results[1:], key=lambda result: result["index"])
+    assert [result["index"] for result in succeeded] == [0, 2]
+    assert all(result["status"] == "succeeded" for result in succeeded)
+    assert succeeded[0]["video_url"] == "http://oss/a.mp4"
+    assert sorted(producer.started) == ["a", "b", "c"]
+
+
+async def test_validation_errors_are_reported_per_item(producer, items):
+    batch_items = items("a", "b")
+    del batch_items[0]["fundraising_text"]
+    batch_items[1]["image_urls"] = ["ftp://example.com/1.jpg"]
+    batch_items += items("c")
+
+    results = {result["index"]: result async for result in generate_batch(batch_items)}
+
+    assert results[0]["status"] == "failed"
+    assert "fundraising_text" in results[0]["error"]
+    assert results[1]["status"] == "failed"
+    assert "ftp://example.com/1.jpg" in results[1]["error"]
+    assert results[2]["status"] == "succeeded"
+    # 校验失败的条目不进入管道
+    assert producer.started == ["c"]
+
+
+async def test_endpoint_streams_ndjson(producer, items):
+    producer.fail.add("b")
+    app = FastAPI()
+    app.include_router(video.router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/batch", json=items("a", "b", "c"))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.endswith("\n")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert {line["index"]: line["status"] for line in lines} == {
+        0: "succeeded",
+        1: "failed",
+        2: "succeeded",
+    }
+
+
+async def test_endpoint_rejects_oversized_batch(producer, items, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_ITEMS", 2)
+    app = FastAPI()
+    app.include_router(video.router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/batch", json=items("a", "b", "c"))
+
+    assert response.status_code == 413
+    assert producer.started == []
+
+
+def test_load_items_accepts_json_lines_and_array(tmp_path, items):
+    batch_items = items("a", "b")
+    lines_path = tmp_path / "items.jsonl"
+    lines_path.write_text(
+        "\n".join(json.dumps(item, ensure_ascii=False) for item in batch_items)
+        + "\n\n",
+        encoding="utf-8",
+    )
+    array_path = tmp_path / "items.json"
+    array_path.write_text(json.dumps(batch_items, ensure_ascii=False), encoding="utf-8")
+
+    assert batch_cli.load_items(str(lines_path)) == batch_items
+    assert batch_cli.load_items(str(array_path)) == batch_items
+
+
+async def test_cli_writes_one_line_per_item(producer, items, monkeypatch):
+    monkeypatch.setattr(settings, "CPU_POOL_ENABLED", False)
+    producer.fail.add("b")
+    output = io.StringIO()
+
+    failed = await batch_cli.run(items("a", "b", "c"), output)
+
+    assert failed == 1
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert lines[0] == {"index": 1, "status": "failed", "error": "b failed"}
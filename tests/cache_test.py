@@ -0,0 +1,129 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kvidgen.utils.cache import DiskLRUCache
+
+
+def _age(cache: DiskLRUCache, key: str, seconds: float) -> None:
+    """把缓存文件的访问时间调到 seconds 秒前，使淘汰顺序确定。"""
+    accessed = time.time() - seconds
+    os.utime(cache._path(key), (accessed, accessed))
+
+
+def test_get_returns_put_data_and_counts_hits(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 100)
+    assert cache.get("aa01") is None
+    cache.put("aa01", b"x" * 10)
+
+    assert cache.get("aa01") == b"x" * 10
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes_saved"]) == (1, 1, 10)
+
+
+def test_overwriting_key_does_not_double_count(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1000)
+    cache.put("aa01", b"x" * 40)
+    cache.put("bb01", b"y" * 40)
+    for _ in range(3):
+        cache.put("aa01", b"z" * 40)
+
+    assert cache.stats()["size_bytes"] == 80
+    assert cache.get("bb01") == b"y" * 40
+    assert cache.get("aa01") == b"z" * 40
+
+
+def test_put_file_overwrite_does_not_double_count(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache"), 1000)
+    for index in range(3):
+        src = tmp_path / f"src{index}"
+        src.write_bytes(b"x" * 40)
+        path = cache.put_file("aa01", str(src))
+
+    assert cache.stats()["size_bytes"] == 40
+    assert not src.exists()
+    assert cache.get_path("aa01") == path
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 100)
+    for index, key in enumerate(["aa01", "bb01", "cc01"]):
+        cache.put(key, b"x" * 30)
+        _age(cache, key, 100 - index)
+    # 读取刷新访问时间，aa01 变为最近使用
+    assert cache.get("aa01") is not None
+    cache.put("dd01", b"x" * 30)
+
+    assert cache.get_path("bb01") is None
+    assert all(cache.get_path(key) for key in ["aa01", "cc01", "dd01"])
+    assert cache.stats()["size_bytes"] == 90
+
+
+def test_skips_data_larger_than_capacity(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 10)
+    cache.put("aa01", b"x" * 11)
+
+    assert cache.get("aa01") is None
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_memory_layer_serves_hot_keys_within_budget(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1000, memory_bytes=20)
+    cache.put("aa01", b"a" * 10)
+    cache.put("bb01", b"b" * 10)
+    cache.put("cc01", b"c" * 10)
+
+    assert cache.stats()["memory_bytes"] == 20
+    assert list(cache._memory) == ["bb01", "cc01"]
+    # 内存命中不读磁盘
+    os.remove(cache._path("cc01"))
+    assert cache.get("cc01") == b"c" * 10
+
+
+def test_size_survives_reopen(tmp_path):
+    DiskLRUCache(str(tmp_path), 100).put("aa01", b"x" * 30)
+    assert DiskLRUCache(str(tmp_path), 100).stats()["size_bytes"] == 30
+
+
+def test_concurrent_writers_keep_size_consistent(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 10_000)
+    keys = [f"{i % 4:02d}key" for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda key: cache.put(key, b"x" * 25), keys))
+
+    assert cache.stats()["size_bytes"] == 4 * 25
+    assert not any(
+        name.startswith(".tmp") for _, _, files in os.walk(tmp_path) for name in files
+    )
+
+
+def test_evicts_to_low_water_without_rescanning(tmp_path, monkeypatch):
+    cache = DiskLRUCache(str(tmp_path), 100)
+    for index in range(10):
+        cache.put(f"{index:02d}key", b"x" * 10)
+
+    def scan():
+        raise AssertionError("eviction must not rescan the cache directory")
+
+    monkeypatch.setattr(cache, "_scan", scan)
+    cache.put("10key", b"x" * 10)
+
+    # 淘汰到 90 字节以下，下一次写入不再触发淘汰
+    assert cache.stats()["size_bytes"] == 90
+    assert cache.get_path("00key") is None and cache.get_path("01key") is None
+    cache.put("11key", b"x" * 10)
+    assert cache.stats()["size_bytes"] == 100
+    assert cache.get_path("02key") is not None
+
+
+def test_reopen_restores_access_order(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 100)
+    for index, key in enumerate(["aa01", "bb01", "cc01"]):
+        cache.put(key, b"x" * 30)
+        _age(cache, key, 100 - index * 10)
+    _age(cache, "aa01", 0)
+
+    reopened = DiskLRUCache(str(tmp_path), 100)
+    reopened.put("dd01", b"x" * 30)
+    assert reopened.get_path("bb01") is None
+    assert reopened.get_path("aa01") is not None
@@ -0,0 +1,208 @@
+import asyncio
+import random
+import re
+
+import pytest
+
+from benchmark.split_text import make_text
+from kvidgen.utils.common import (
+    SentenceSegmenter,
+    _segment_units,
+    gather_with_concurrency,
+    retry_async,
+    split_text,
+)
+
+# 以句末标点（可带右引号与空白）结尾
+_ENDS_WITH_SENTENCE = re.compile(r"(?:[。！？!?…]|\.\s|[\r\n])[”’\"'）)」』]*\s*$")
+
+
+class Flaky:
+    """前 failures 次调用抛出 error，之后返回调用次数。"""
+
+    def __init__(self, failures: int, error: Exception = ValueError("boom")):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return self.calls
+
+
+async def test_retry_async_succeeds_after_failures():
+    func = Flaky(2)
+    assert await retry_async(func, retries=3, backoff=0) == 3
+    assert func.calls == 3
+
+
+async def test_retry_async_raises_after_retries_exhausted():
+    func = Flaky(10)
+    with pytest.raises(ValueError):
+        await retry_async(func, retries=2, backoff=0)
+    assert func.calls == 3
+
+
+async def test_retry_async_does_not_retry_when_rejected():
+    func = Flaky(1, KeyError("fatal"))
+    with pytest.raises(KeyError):
+        await retry_async(
+            func, backoff=0, should_retry=lambda e: isinstance(e, ValueError)
+        )
+    assert func.calls == 1
+
+
+async def test_retry_async_waits_at_least_retry_after(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    await retry_async(Flaky(2), retries=2, backoff=0.01, retry_after=lambda e: 3.0)
+    assert delays == [3.0, 3.0]
+
+
+async def test_retry_async_backoff_grows_exponentially(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    await retry_async(Flaky(3), retries=3, backoff=1.0)
+    for attempt, delay in enumerate(delays):
+        assert 0.5 * 2**attempt <= delay <= 2**attempt
+
+
+async def test_gather_with_concurrency_keeps_order_and_limit():
+    running = 0
+    peak = 0
+
+    async def work(index: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # 先启动的任务后完成，验证结果仍按传入顺序返回
+        await asyncio.sleep(0.01 * (5 - index % 5))
+        running -= 1
+        return index
+
+    results = await gather_with_concurrency(3, [work(i) for i in range(10)])
+    assert results == list(range(10))
+    assert peak == 3
+
+
+async def test_gather_with_concurrency_cancels_pending_on_failure():
+    started = []
+    finished = []
+
+    async def work(index: int) -> int:
+        started.append(index)
+        if index == 0:
+            raise ValueError("boom")
+        await asyncio.sleep(0.05)
+        finished.append(index)
+        return index
+
+    with pytest.raises(ValueError):
+        await gather_with_concurrency(2, [work(i) for i in range(6)])
+    await asyncio.sleep(0.1)
+    assert finished == []
+    # 失败释放的名额最多让一个排队任务启动，其余未启动即被取消
+    assert len(started) <= 3
+
+
+def test_split_text_keeps_short_text_whole():
+    assert split_text("你好。", 280) == ["你好。"]
+    assert split_text("", 280) == [""]
+
+
+@pytest.mark.parametrize("max_len", [20, 60, 280])
+def test_split_text_is_lossless_and_bounded(max_len):
+    for seed in range(200):
+        text = make_text(random.Random(seed).randint(1, 3000), seed)
+        chunks = split_text(text, max_len)
+        assert "".join(chunks) == text
+        assert all(0 < len(chunk) <= max_len for chunk in chunks)
+
+
+def test_split_text_prefers_sentence_boundaries():
+    sentences = [f"第{i:02d}句话讲的是一个需要帮助的家庭。" for i in range(30)]
+    chunks = split_text("".join(sentences), 100)
+
+    assert len(chunks) > 1
+    assert all(_ENDS_WITH_SENTENCE.search(chunk) for chunk in chunks)
+
+
+def test_split_text_falls_back_to_clauses_then_hard_cuts():
+    clauses = "，".join(["这是一个很长的分句"] * 40) + "。"
+    assert all(chunk.endswith(("，", "。")) for chunk in split_text(clauses, 50))
+
+    chunks = split_text("x" * 1000, 280)
+    assert [len(chunk) for chunk in chunks] == [250] * 4
+
+
+def test_split_text_balances_chunk_lengths():
+    text = "".join(f"第{i:02d}句有十个字符。"[:10] for i in range(30))
+    lengths = [len(chunk) for chunk in split_text(text, 280)]
+
+    # 300 字至少 2 段，均衡切分时两段都接近 150
+    assert len(lengths) == 2
+    assert max(lengths) - min(lengths) <= 10
+
+
+def stream_segments(text: str, max_len: int, min_len: int, seed: int) -> list:
+    """按随机长度的片段喂入文本，模拟流式生成。"""
+    rng = random.Random(seed)
+    segmenter = SentenceSegmenter(max_len, min_len)
+    segments = []
+    pos = 0
+    while pos < len(text):
+        step = rng.randint(1, 12)
+        segments.extend(segmenter.feed(text[pos : pos + step]))
+        pos += step
+    return segments + segmenter.flush()
+
+
+def boundaries(chunks: list) -> set:
+    positions, pos = set(), 0
+    for chunk in chunks:
+        pos += len(chunk)
+        positions.add(pos)
+    return positions
+
+
+@pytest.mark.parametrize("max_len", [20, 60, 280])
+def test_segmenter_units_match_split_text(max_len):
+    for seed in range(100):
+        text = make_text(random.Random(seed).randint(1, 2000), seed)
+        # min_len 为 0 时每个切分单元单独输出，应与 split_text 的单元一致
+        assert stream_segments(text, max_len, 0, seed) == _segment_units(text, max_len)
+
+
+@pytest.mark.parametrize("max_len, min_len", [(20, 10), (60, 40), (280, 40)])
+def test_segmenter_is_lossless_bounded_and_independent_of_feed(max_len, min_len):
+    for seed in range(100):
+        text = make_text(random.Random(seed).randint(1, 2000), seed)
+        segments = stream_segments(text, max_len, min_len, seed)
+        assert "".join(segments) == text
+        assert all(0 < len(segment) <= max_len for segment in segments)
+        # 分段只与文本有关，与片段到达的节奏无关
+        assert segments == stream_segments(text, max_len, min_len, seed + 1)
+        # 两种模式只在相同的切分单元边界处切分，合并方式不同
+        units = boundaries(_segment_units(text, max_len))
+        assert boundaries(segments) <= units
+        assert boundaries(split_text(text, max_len)) <= units
+
+
+def test_segmenter_emits_clauses_of_overlong_sentence_early():
+    segmenter = SentenceSegmenter(max_len=20)
+    clause = "这是一个很长的分句，"
+    segments = segmenter.feed(clause * 3)
+
+    # 超过 max_len 后先输出已完整的分句，最后一个分句等待后续标点确认
+    assert segments == [clause, clause]
+    assert segmenter.flush() == [clause]
@@ -0,0 +1,48 @@
+"""
+测试环境：在导入 kvidgen 之前填充必需的配置，缓存目录指向临时目录。
+"""
+
+import tempfile
+
+import pytest
+
+from benchmark.fake_services import configure_env
+
+configure_env(CACHE_DIR=tempfile.mkdtemp(prefix="kvidgen-test-"))
+
+
+@pytest.fixture
+def aiolib():
+    # 异步用例只在 asyncio 下运行
+    return "asyncio"
+
+
+@pytest.fixture
+async def http_client():
+    from kvidgen.utils.http_client import HttpClientManager
+
+    manager = HttpClientManager()
+    yield manager
+    await manager.shutdown()
+
+
+@pytest.fixture
+def param():
+    from kvidgen.schemas.fundraising import FundraisingRequest
+
+    return FundraisingRequest(
+        patient_info={
+            "fundraiser_name": "张三",
+            "fundraiser_patient_relation": "父子",
+            "patient_name": "张小三",
+            "patient_age": 8,
+            "patient_gender": "男",
+            "illness_type": "白血病",
+            "hospital_name": "儿童医院",
+            "spent_amount": 10000,
+            "target_amount": 300000,
+        },
+        fundraising_text="救救孩子" * 50,
+        image_urls=["http://example.com/1.jpg", "http://example.com/2.jpg"],
+        background_music_url="http://example.com/bgm.mp3",
+    )
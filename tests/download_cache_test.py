@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import pytest
+
+from kvidgen.core.config import settings
+from kvidgen.utils.download_cache import DownloadCache
+
+
+class FakeFetcher:
+    """按 URL 返回固定内容的下载函数，记录每次调用的条件请求头。"""
+
+    def __init__(self, content: bytes, etag: str = '"v1"', delay: float = 0.0):
+        self.content = content
+        self.etag = etag
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, tmp_path: str, headers):
+        self.calls.append(headers)
+        await asyncio.sleep(self.delay)
+        if headers and headers.get("If-None-Match") == self.etag:
+            return None
+        with open(tmp_path, "wb") as file:
+            file.write(self.content)
+        return {"etag": self.etag}
+
+
+@pytest.fixture
+def download_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(settings, "DOWNLOAD_CACHE_MAX_BYTES", 100)
+    # 绕过 singleton，每个用例使用独立目录的新实例
+    return type(DownloadCache())()
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+async def test_fetch_reuses_fresh_entry(download_cache, tmp_path):
+    fetcher = FakeFetcher(b"a" * 10)
+    first = await download_cache.fetch("http://x/a", str(tmp_path / "1"), fetcher)
+    second = await download_cache.fetch("http://x/a", str(tmp_path / "2"), fetcher)
+
+    assert _read(first) == _read(second) == b"a" * 10
+    assert fetcher.calls == [None]
+    assert download_cache.stats()["hits"] == 1
+    assert download_cache.stats()["misses"] == 1
+
+
+async def test_fetch_revalidates_stale_entry(download_cache, tmp_path, monkeypatch):
+    fetcher = FakeFetcher(b"a" * 10)
+    await download_cache.fetch("http://x/a", str(tmp_path / "1"), fetcher)
+    monkeypatch.setattr(settings, "DOWNLOAD_CACHE_TTL", 0)
+    path = await download_cache.fetch("http://x/a", str(tmp_path / "2"), fetcher)
+
+    assert fetcher.calls == [None, {"If-None-Match": '"v1"'}]
+    assert _read(path) == b"a" * 10
+    assert download_cache.stats()["revalidated"] == 1
+
+
+async def test_fetch_stores_identical_content_once(download_cache, tmp_path):
+    fetcher = FakeFetcher(b"same" * 5)
+    await download_cache.fetch("http://x/a", str(tmp_path / "1"), fetcher)
+    await download_cache.fetch("http://y/b", str(tmp_path / "2"), fetcher)
+
+    assert download_cache.stats()["size_bytes"] == 20
+    assert os.path.samefile(tmp_path / "1", tmp_path / "2")
+
+
+async def test_fetch_evicts_least_recently_used(download_cache, tmp_path):
+    fetchers = {name: FakeFetcher(name.encode() * 40) for name in "abc"}
+    for name, fetcher in fetchers.items():
+        await download_cache.fetch(f"http://x/{name}", str(tmp_path / name), fetcher)
+        # 拉开访问时间，保证淘汰顺序确定
+        sha256 = hashlib.sha256(fetcher.content).hexdigest()
+        accessed = time.time() - 100 + ord(name)
+        os.utime(download_cache.objects.get_path(sha256), (accessed, accessed))
+
+    # 容量 100 字节只能容纳两份 40 字节的内容，最早的 a 被淘汰
+    assert download_cache.stats()["size_bytes"] <= 100
+    await download_cache.fetch("http://x/a", str(tmp_path / "a2"), fetchers["a"])
+    assert fetchers["a"].calls == [None, None]
+    assert _read(tmp_path / "a2") == b"a" * 40
+
+
+async def test_concurrent_fetches_of_same_url_download_once(download_cache, tmp_path):
+    fetcher = FakeFetcher(b"x" * 10, delay=0.05)
+    paths = await asyncio.gather(
+        *(
+            download_cache.fetch("http://x/a", str(tmp_path / str(i)), fetcher)
+            for i in range(5)
+        )
+    )
+
+    assert len(fetcher.calls) == 1
+    assert all(_read(path) == b"x" * 10 for path in paths)
+    assert download_cache.stats()["hits"] == 4
+    # 锁释放后不残留进程内的合并状态
+    assert download_cache._inflight == {}
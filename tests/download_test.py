@@ -0,0 +1,102 @@
+import os
+
+import pytest
+from aiohttp import web
+
+from benchmark.fake_services import FakeAssetServer, FakeService
+from kvidgen.core.config import settings
+from kvidgen.utils.download import DownloadError, download_file, download_image_file
+
+CONTENT = bytes(range(256)) * 64
+
+
+@pytest.fixture(autouse=True)
+def download_settings(http_client, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DOWNLOAD_RETRY_BACKOFF", 0)
+
+
+@pytest.fixture
+async def assets():
+    async with FakeAssetServer({"a.bin": CONTENT, "b.bin": CONTENT}) as server:
+        yield server
+
+
+async def test_resumes_from_part_file(assets, tmp_path):
+    (tmp_path / "a.bin.part").write_bytes(CONTENT[:1000])
+    path = await download_file(assets.url("a.bin"), str(tmp_path), "a.bin")
+
+    assert open(path, "rb").read() == CONTENT
+    assert assets.requests == 1
+    assert not (tmp_path / "a.bin.part").exists()
+
+
+async def test_retry_resumes_truncated_response(tmp_path):
+    # 每 2 次请求截断一次：第 2 次请求只收到一半内容，第 3 次从断点续传。
+    # 截断前已写入临时文件的分块才会续传，内容需足够大
+    content = CONTENT * 40
+    server = FakeAssetServer({"a.bin": content, "b.bin": CONTENT}, truncate_every=2)
+    ranges = []
+
+    async def record_range(request, _):
+        ranges.append(request.headers.get("Range"))
+
+    server.app.on_response_prepare.append(record_range)
+    async with server:
+        await download_file(server.url("b.bin"), str(tmp_path), "b.bin")
+        path = await download_file(server.url("a.bin"), str(tmp_path), "a.bin")
+
+    assert open(path, "rb").read() == content
+    assert ranges[:2] == [None, None]
+    offset = int(ranges[2][len("bytes=") : -1])
+    assert 0 < offset <= len(content) // 2
+
+
+async def test_restarts_when_server_ignores_range(tmp_path):
+    server = FakeService()
+
+    async def handle(_):
+        return web.Response(body=CONTENT)
+
+    server.app.router.add_get("/a.bin", handle)
+    (tmp_path / "a.bin.part").write_bytes(b"stale" * 100)
+    async with server:
+        path = await download_file(f"{server.base_url}/a.bin", str(tmp_path), "a.bin")
+
+    assert open(path, "rb").read() == CONTENT
+
+
+async def test_restarts_after_unsatisfiable_range(assets, tmp_path):
+    (tmp_path / "a.bin.part").write_bytes(b"x" * (len(CONTENT) + 10))
+    path = await download_file(assets.url("a.bin"), str(tmp_path), "a.bin")
+
+    assert open(path, "rb").read() == CONTENT
+    # 416 后删除临时文件并从头重试
+    assert assets.requests == 2
+
+
+async def test_max_bytes_raises_and_cleans_up(assets, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_MAX_RETRIES", 3)
+    with pytest.raises(DownloadError, match="too large"):
+        await download_file(assets.url("a.bin"), str(tmp_path), "a.bin", 1000)
+
+    # 超出上限不重试
+    assert assets.requests == 1
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("skip_failed", [True, False])
+async def test_skip_failed_images(assets, tmp_path, skip_failed):
+    urls = [assets.url("a.bin"), assets.url("missing.bin"), assets.url("b.bin")]
+    if not skip_failed:
+        with pytest.raises(DownloadError):
+            await download_image_file(str(tmp_path), urls, skip_failed)
+        return
+
+    paths = await download_image_file(str(tmp_path), urls, skip_failed)
+    assert paths == [str(tmp_path / "0.jpg"), str(tmp_path / "2.jpg")]
+
+
+async def test_all_images_failing_raises(assets, tmp_path):
+    with pytest.raises(DownloadError, match="No image"):
+        await download_image_file(str(tmp_path), [assets.url("missing.bin")], True)
@@ -0,0 +1,147 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.outputs import Generation
+
+from kvidgen.core.agents.editor import (
+    FALLBACK_EFFECTS,
+    BatchImageEffectsOutputParser,
+    ImageEffectsArtist,
+    ImageEffectsBatcher,
+    ImageEffectsOutputParser,
+)
+from kvidgen.core.config import settings
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"effects": ["fade", "zoom"]}', ["fade", "zoom"]),
+        ('```json\n{"effects": ["shake"]}\n```', ["shake"]),
+        ("not json", None),
+        ('{"effects": []}', None),
+        ('["zoom"]', None),
+    ],
+)
+def test_image_effects_parser_marks_fallback_with_none(text, expected):
+    assert ImageEffectsOutputParser().parse_result([Generation(text=text)]) == expected
+
+
+def test_batch_parser_marks_images_without_effects():
+    text = '{"images": [{"index": 0, "effects": ["fade"]}, {"index": 1}]}'
+    parsed = BatchImageEffectsOutputParser().parse_result([Generation(text=text)])
+
+    assert parsed == {0: ["fade"], 1: None}
+    assert BatchImageEffectsOutputParser().parse_result([Generation(text="?")]) == {}
+
+
+@pytest.fixture
+def images(tmp_path):
+    """两张感知哈希相差很远的图片：水平渐变与垂直渐变。"""
+    gradient = np.tile(np.arange(0, 256, 4, dtype=np.uint8), (64, 1))
+    paths = []
+    for name, img in (("h.png", gradient), ("v.png", gradient.T.copy())):
+        path = str(tmp_path / name)
+        cv2.imwrite(path, cv2.merge([img, img, img]))
+        paths.append(path)
+    return paths
+
+
+async def test_classify_does_not_cache_fallback(images, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_CACHE_ENABLED", True)
+    calls = []
+
+    async def fake_classify(self, image_paths, keys=None):
+        calls.append(list(image_paths))
+        # 第一张图片的模型输出无法解析
+        return [None if path == images[0] else ["fade"] for path in image_paths]
+
+    monkeypatch.setattr(ImageEffectsArtist, "_classify", fake_classify)
+    artist = ImageEffectsArtist()
+
+    assert await artist.classify(images) == [FALLBACK_EFFECTS, ["fade"]]
+    assert await artist.classify(images) == [FALLBACK_EFFECTS, ["fade"]]
+    # 回退结果未缓存，第二次只重新识别第一张图片
+    assert calls == [images, images[:1]]
+
+
+async def test_classify_without_cache_replaces_fallback(images, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_CACHE_ENABLED", False)
+
+    async def fake_classify(self, image_paths, keys=None):
+        return [None, ["fade"]]
+
+    monkeypatch.setattr(ImageEffectsArtist, "_classify", fake_classify)
+    assert await ImageEffectsArtist().classify(images) == [FALLBACK_EFFECTS, ["fade"]]
+
+
+@pytest.fixture
+def batcher(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_BATCH_MAX", 8)
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_BATCH_WINDOW", 0.02)
+    calls = []
+
+    async def fake_run_batch(self, image_paths):
+        calls.append(list(image_paths))
+        return [[f"effect-{path}"] for path in image_paths]
+
+    monkeypatch.setattr(ImageEffectsArtist, "run_batch", fake_run_batch)
+    # 绕过 singleton，每个用例使用新的实例与统计
+    batcher = type(ImageEffectsBatcher())()
+    batcher.calls = calls
+    return batcher
+
+
+async def test_batcher_combines_concurrent_requests(batcher):
+    first, second = await asyncio.gather(
+        batcher.classify(["a", "b"]), batcher.classify(["b", "c"])
+    )
+
+    assert first == [["effect-a"], ["effect-b"]]
+    assert second == [["effect-b"], ["effect-c"]]
+    # 两个调用方共用一次视觉模型调用，重复图片只识别一次
+    assert batcher.calls == [["a", "b", "c"]]
+    assert batcher.stats()["deduplicated"] == 1
+
+
+async def test_batcher_sends_full_batches_immediately(batcher, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_BATCH_MAX", 2)
+    monkeypatch.setattr(settings, "IMAGE_EFFECTS_BATCH_WINDOW", 10)
+    # 满 2 张立即发送，余下 1 张等待窗口结束，因此只等待前两张
+    results = await asyncio.wait_for(batcher.classify(["a", "b"]), 1)
+
+    assert results == [["effect-a"], ["effect-b"]]
+    assert batcher.calls == [["a", "b"]]
+
+
+def _artist(batch_response: str, single_responses, monkeypatch) -> ImageEffectsArtist:
+    artist = ImageEffectsArtist()
+
+    async def image_content(image_path):
+        return {"type": "image_url", "image_url": {"url": image_path}}
+
+    monkeypatch.setattr(artist, "image_content", image_content)
+    artist.batch_chain = (
+        FakeListChatModel(responses=[batch_response]) | BatchImageEffectsOutputParser()
+    )
+    artist.chain = (
+        FakeListChatModel(responses=single_responses) | ImageEffectsOutputParser()
+    )
+    return artist
+
+
+async def test_run_batch_falls_back_per_image_when_unparsable(monkeypatch):
+    artist = _artist("not json", ['{"effects": ["fade"]}'] * 3, monkeypatch)
+
+    assert await artist.run_batch(["a", "b", "c"]) == [["fade"]] * 3
+
+
+async def test_run_batch_only_retries_missing_images(monkeypatch):
+    batch = '{"images": [{"index": 0, "effects": ["zoom"]}, {"index": 2}]}'
+    artist = _artist(batch, ['{"effects": ["fade"]}'], monkeypatch)
+
+    # 图片 1 缺失，单独补调；图片 2 的特效为空，保留 None 交由调用方回退
+    assert await artist.run_batch(["a", "b", "c"]) == [["zoom"], ["fade"], None]
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from kvidgen.core.agents.governor import LLMGovernor, TokenBucket
+from kvidgen.core.config import settings
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.01)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT", 0)
+    # 绕过 singleton，每个用例使用新的实例与统计
+    governor = type(LLMGovernor())()
+    # 近期 p95 为 0.02 秒，超过后发出对冲请求
+    governor._latencies.extend([0.02] * 5)
+    return governor
+
+
+class SlowCall:
+    """每次调用按 delays 中的耗时返回，记录被取消的调用。"""
+
+    def __init__(self, *delays: float):
+        self.delays = list(delays)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return delay
+
+
+async def test_hedge_wins_and_cancels_primary(governor):
+    func = SlowCall(1.0, 0.01)
+    assert await governor.call(func) == 0.01
+
+    assert func.calls == 2
+    assert governor.metrics["hedges"] == governor.metrics["hedge_wins"] == 1
+    await asyncio.sleep(0)
+    assert func.cancelled == 1
+    assert governor.in_flight == 0
+
+
+@pytest.mark.parametrize("cancel_after", [0.005, 0.05])
+async def test_cancelling_caller_cancels_every_attempt(governor, cancel_after):
+    # 0.005 秒时处于首次等待，0.05 秒时对冲请求已发出
+    func = SlowCall(1.0)
+    task = asyncio.ensure_future(governor.call(func))
+    await asyncio.sleep(cancel_after)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+
+    assert func.cancelled == func.calls
+    assert governor.in_flight == 0
+    assert governor._semaphore._value == settings.LLM_MAX_IN_FLIGHT
+
+
+async def test_without_latency_samples_no_hedge(governor):
+    governor._latencies.clear()
+    func = SlowCall(0.05)
+    assert await governor.call(func) == 0.05
+    assert func.calls == 1
+    assert governor.metrics["hedges"] == 0
+
+
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=2)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(5):
+        await bucket.acquire()
+    # 前 2 个令牌立即可用，其余 3 个按每秒 100 个补充
+    assert loop.time() - start >= 0.025
+
+
+async def test_queued_calls_do_not_hedge_while_waiting_for_a_slot(
+    governor, monkeypatch
+):
+    monkeypatch.setattr(settings, "LLM_MAX_IN_FLIGHT", 1)
+    governor._loop = None
+    # 每次调用 0.015 秒，低于 p95；排队的调用总耗时远超 p95 也不应对冲
+    func = SlowCall(0.015)
+    results = await asyncio.gather(*(governor.call(func) for _ in range(4)))
+
+    assert results == [0.015] * 4
+    assert func.calls == 4
+    assert governor.metrics["hedges"] == 0
+
+
+async def test_no_hedge_when_semaphore_is_saturated(governor, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_IN_FLIGHT", 2)
+    governor._loop = None
+    # 两个慢调用占满名额，超过 p95 时没有空闲名额，不发出对冲
+    func = SlowCall(0.1)
+    results = await asyncio.gather(governor.call(func), governor.call(func))
+
+    assert results == [0.1, 0.1]
+    assert func.calls == 2
+    assert governor.metrics["hedges"] == 0
+    assert governor.metrics["hedges_skipped"] == 2
+    assert governor.in_flight == 0
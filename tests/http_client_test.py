@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from benchmark.fake_services import FakeService
+from kvidgen.utils.http_client import HttpClientManager
+
+
+@pytest.fixture
+async def manager():
+    # 绕过 singleton，每个用例使用新的会话与统计
+    manager = type(HttpClientManager())()
+    yield manager
+    await manager.shutdown()
+
+
+@pytest.fixture
+async def server():
+    service = FakeService()
+
+    async def handle(_):
+        return web.Response(text="ok")
+
+    service.app.router.add_get("/", handle)
+    async with service:
+        yield service
+
+
+async def test_session_is_shared_within_a_loop(manager):
+    assert manager.session is manager.session
+
+
+async def test_other_loop_gets_its_own_session(manager):
+    session = manager.session
+    other = {}
+
+    def run():
+        async def get():
+            other["session"] = manager.session
+            await other["session"].close()
+
+        asyncio.run(get())
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+    assert other["session"] is not session
+    # 回到原事件循环时重新创建会话
+    assert manager.session is not other["session"]
+    assert not manager.session.closed
+
+
+async def test_new_session_after_close(manager):
+    session = manager.session
+    await session.close()
+    assert manager.session is not session
+    assert not manager.session.closed
+
+    await manager.shutdown()
+    assert manager._session is None
+    assert not manager.session.closed
+
+
+async def test_trace_hooks_count_requests_and_reuse(manager, server):
+    url = f"http://localhost:{server.port}/"
+    # 第三个请求让服务端关闭连接，第四个请求新建连接并命中 DNS 缓存
+    for headers in (None, None, {"Connection": "close"}, None):
+        async with manager.session.get(url, headers=headers) as resp:
+            assert await resp.text() == "ok"
+
+    stats = manager.stats()
+    assert stats["requests"] == 4
+    assert (stats["connections_created"], stats["connections_reused"]) == (2, 2)
+    assert (stats["dns_cache_misses"], stats["dns_cache_hits"]) == (1, 1)
+    assert stats["reuse_ratio"] == pytest.approx(0.5)
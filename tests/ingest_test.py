@@ -0,0 +1,44 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+from kvidgen.core.video.ingest import encode_thumbnail, normalize_image
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "image.png"
+    cv2.imwrite(str(path), np.full((300, 600, 3), 128, dtype=np.uint8))
+    return str(path)
+
+
+def _decode(content: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_normalize_and_thumbnail_downscale_the_same_way(image_path, tmp_path):
+    meta = normalize_image(image_path, str(tmp_path / "out.jpg"), 200, 90)
+    thumbnail = _decode(base64.b64decode(encode_thumbnail(image_path, 200, 90)))
+
+    assert (meta.width, meta.height) == (200, 100)
+    assert thumbnail.shape[:2] == (100, 200)
+    assert _decode((tmp_path / "out.jpg").read_bytes()).shape[:2] == (100, 200)
+
+
+def test_small_images_are_not_upscaled(image_path, tmp_path):
+    meta = normalize_image(image_path, str(tmp_path / "out.jpg"), 1000, 90)
+    thumbnail = _decode(base64.b64decode(encode_thumbnail(image_path, 1000, 90)))
+
+    assert (meta.width, meta.height) == (600, 300)
+    assert thumbnail.shape[:2] == (300, 600)
+
+
+def test_unreadable_image_raises(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    with pytest.raises(ValueError):
+        normalize_image(str(path), str(tmp_path / "out.jpg"), 200, 90)
+    with pytest.raises(ValueError):
+        encode_thumbnail(str(path), 200, 90)
@@ -0,0 +1,190 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from kvidgen.api.endpoints import video
+from kvidgen.core.config import settings
+from kvidgen.service import jobs
+from kvidgen.service.job_store import (
+    Job,
+    JobPriority,
+    JobStatus,
+    MemoryJobStore,
+    SqliteJobStore,
+    current_owner,
+)
+from kvidgen.service.jobs import JobManager, JobQueueFull
+
+
+class FakeProducer:
+    """按提交顺序记录执行的任务，release 之前阻塞全部任务。"""
+
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+        self.fail = set()
+
+    async def __call__(self, request, reject=True, submitted_at=None):
+        name = request.patient_info.patient_name
+        self.started.append(name)
+        await self.release.wait()
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        return {"object_key": f"{name}.mp4", "degradations": []}
+
+
+@pytest.fixture
+def producer(monkeypatch):
+    producer = FakeProducer()
+    monkeypatch.setattr(jobs, "produce_video", producer)
+    return producer
+
+
+@pytest.fixture
+async def manager(producer, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_WORKERS", 1)
+    # 绕过 singleton，每个用例使用独立的存储与队列
+    manager = type(JobManager())(MemoryJobStore())
+    await manager.startup()
+    yield manager
+    await manager.shutdown()
+
+
+def request_for(param, name):
+    return param.model_copy(
+        update={
+            "patient_info": param.patient_info.model_copy(update={"patient_name": name})
+        }
+    )
+
+
+async def wait_for(predicate, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def test_submit_status_and_result(manager, producer, param):
+    job = await manager.submit(request_for(param, "a"))
+    assert job.status == JobStatus.QUEUED
+    await wait_for(lambda: manager.get(job.id).status == JobStatus.RUNNING)
+
+    producer.release.set()
+    await wait_for(lambda: manager.get(job.id).finished)
+    finished = manager.get(job.id)
+    assert finished.status == JobStatus.SUCCEEDED
+    assert finished.result == {"object_key": "a.mp4", "degradations": []}
+    assert finished.started_at >= finished.created_at
+
+
+async def test_failed_job_records_error(manager, producer, param):
+    producer.fail.add("a")
+    producer.release.set()
+    job = await manager.submit(request_for(param, "a"))
+    await wait_for(lambda: manager.get(job.id).finished)
+
+    assert manager.get(job.id).status == JobStatus.FAILED
+    assert manager.get(job.id).error == "a failed"
+
+
+async def test_higher_priority_runs_first(manager, producer, param):
+    await manager.submit(request_for(param, "blocker"))
+    await wait_for(lambda: producer.started == ["blocker"])
+    for name, priority in [
+        ("low", JobPriority.LOW),
+        ("normal-1", JobPriority.NORMAL),
+        ("high", JobPriority.HIGH),
+        ("normal-2", JobPriority.NORMAL),
+    ]:
+        await manager.submit(request_for(param, name), priority)
+
+    producer.release.set()
+    await wait_for(lambda: len(producer.started) == 5)
+    assert producer.started == ["blocker", "high", "normal-1", "normal-2", "low"]
+
+
+async def test_queue_full(manager, producer, param, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_QUEUE_SIZE", 1)
+    await manager.submit(request_for(param, "running"))
+    await wait_for(lambda: producer.started == ["running"])
+    await manager.submit(request_for(param, "queued"))
+
+    with pytest.raises(JobQueueFull):
+        await manager.submit(request_for(param, "rejected"))
+
+    monkeypatch.setattr(video, "JobManager", lambda: manager)
+    app = FastAPI()
+    app.include_router(video.router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/jobs", json=param.model_dump())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.JOB_RETRY_AFTER)
+
+
+async def test_shutdown_fails_unfinished_memory_jobs(producer, param, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_WORKERS", 1)
+    manager = type(JobManager())(MemoryJobStore())
+    await manager.startup()
+    running = await manager.submit(request_for(param, "running"))
+    await wait_for(lambda: producer.started == ["running"])
+    queued = await manager.submit(request_for(param, "queued"))
+
+    await manager.shutdown()
+
+    for job in (running, queued):
+        assert manager.get(job.id).status == JobStatus.FAILED
+        assert manager.get(job.id).finished_at is not None
+
+
+async def test_shutdown_keeps_sqlite_jobs_for_recovery(producer, param, tmp_path):
+    store = SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    manager = type(JobManager())(store)
+    await manager.startup()
+    job = await manager.submit(request_for(param, "running"))
+    await wait_for(lambda: producer.started == ["running"])
+
+    await manager.shutdown()
+    assert store.get(job.id).status == JobStatus.RUNNING
+
+
+def test_sqlite_store_persists_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job = Job(request={"a": 1}, priority=JobPriority.HIGH, owner=current_owner())
+    SqliteJobStore(path).create(job)
+    SqliteJobStore(path).update(
+        job.id, status=JobStatus.SUCCEEDED, result={"object_key": "a.mp4"}
+    )
+
+    loaded = SqliteJobStore(path).get(job.id)
+    assert loaded.request == {"a": 1}
+    assert loaded.priority == JobPriority.HIGH
+    assert loaded.status == JobStatus.SUCCEEDED
+    assert loaded.result == {"object_key": "a.mp4"}
+    assert SqliteJobStore(path).unfinished() == []
+
+
+def test_recover_reclaims_jobs_of_dead_owners(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SqliteJobStore(path)
+    # pid 不会超过 pid_max，视为已退出的本机进程
+    dead_owner = f"{socket.gethostname()}:{2**22 + 1}"
+    dead = Job(request={}, status=JobStatus.RUNNING, owner=dead_owner)
+    # 其他主机的进程无法探测，视为存活
+    alive = Job(request={}, status=JobStatus.RUNNING, owner="other-host:1")
+    mine = Job(request={}, owner=current_owner())
+    for job in (dead, alive, mine):
+        store.create(job)
+
+    recovered = store.recover()
+
+    assert [job.id for job in recovered] == [dead.id]
+    assert store.get(dead.id).status == JobStatus.QUEUED
+    assert store.get(dead.id).owner == current_owner()
+    # 其他进程同时接管时条件更新失败，不会重复接管
+    assert SqliteJobStore(path).claim(dead.id, dead.owner, "other:1") is False
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from kvidgen.utils.metrics import Counter, Gauge, Histogram, Metric, MetricsRegistry
+
+
+def test_metric_requires_samples():
+    with pytest.raises(TypeError):
+        Metric("kvidgen_test", "测试")
+
+
+def test_counter_renders_prometheus_text():
+    counter = Counter("kvidgen_test_total", "测试计数", ["service", "status"])
+    counter.inc(service="oss", status="ok")
+    counter.inc(2.5, service="oss", status="ok")
+    counter.inc(service="llm", status="error")
+
+    assert counter.render() == "\n".join(
+        [
+            "# HELP kvidgen_test_total 测试计数",
+            "# TYPE kvidgen_test_total counter",
+            'kvidgen_test_total{service="llm",status="error"} 1.0',
+            'kvidgen_test_total{service="oss",status="ok"} 3.5',
+        ]
+    )
+
+
+def test_label_values_are_escaped():
+    counter = Counter("kvidgen_test_total", "测试计数", ["path"])
+    counter.inc(path='C:\\tmp\\"a"\nb')
+
+    assert counter.samples() == [
+        ("kvidgen_test_total", '{path="C:\\\\tmp\\\\\\"a\\"\\nb"}', 1.0)
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("kvidgen_test_seconds", "测试耗时", ["step"], [1, 0.1])
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, step="mix")
+
+    assert histogram.render().splitlines()[2:] == [
+        'kvidgen_test_seconds_bucket{step="mix",le="0.1"} 2.0',
+        'kvidgen_test_seconds_bucket{step="mix",le="1.0"} 3.0',
+        'kvidgen_test_seconds_bucket{step="mix",le="+Inf"} 4.0',
+        'kvidgen_test_seconds_sum{step="mix"} 3.65',
+        'kvidgen_test_seconds_count{step="mix"} 4.0',
+    ]
+
+
+def test_registry_renders_in_order_and_rejects_duplicates():
+    registry = MetricsRegistry()
+    registry.register(Gauge("kvidgen_b", "B", lambda: 2))
+    registry.register(Counter("kvidgen_a_total", "A"))
+
+    assert registry.render() == (
+        "# HELP kvidgen_b B\n# TYPE kvidgen_b gauge\nkvidgen_b 2.0\n"
+        "# HELP kvidgen_a_total A\n# TYPE kvidgen_a_total counter\n"
+    )
+    with pytest.raises(ValueError):
+        registry.register(Counter("kvidgen_b", "B"))
+
+
+def test_text_utils_import_without_settings(tmp_path):
+    # 未配置环境变量时，纯文本工具仍可导入（如 benchmark.split_text）
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {"PATH": os.environ["PATH"], "PYTHONPATH": root}
+    result = subprocess.run(
+        [sys.executable, "-c", "from kvidgen.utils.common import split_text"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from kvidgen.core.audio.mp3 import Mp3DurationCounter, mp3_duration
+
+MPEG1_FRAME_SECONDS = 1152 / 44100
+
+
+def frame(
+    version: int = 3,
+    bitrate_index: int = 9,
+    sample_rate_index: int = 0,
+    padding: int = 0,
+    size: int = 417,
+) -> bytes:
+    """构造 Layer III 帧：帧头后填充零字节到 size。默认 MPEG1 128kbps 44.1kHz。"""
+    header = bytes(
+        [
+            0xFF,
+            0xE0 | version << 3 | 1 << 1 | 1,
+            bitrate_index << 4 | sample_rate_index << 2 | padding << 1,
+            0xC4,
+        ]
+    )
+    return header + b"\x00" * (size - len(header))
+
+
+def id3_tag(body: bytes) -> bytes:
+    size = len(body)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + body
+
+
+def test_counts_mpeg1_frames():
+    assert mp3_duration(frame() * 100) == pytest.approx(100 * MPEG1_FRAME_SECONDS)
+
+
+def test_padding_frames_are_one_byte_longer():
+    data = (frame() + frame(padding=1, size=418)) * 10
+    assert mp3_duration(data) == pytest.approx(20 * MPEG1_FRAME_SECONDS)
+
+
+@pytest.mark.parametrize(
+    "version, bitrate_index, sample_rate_index, size, seconds",
+    [
+        # MPEG2 64kbps 22.05kHz：72 * 64000 // 22050 = 208 字节
+        (2, 8, 0, 208, 576 / 22050),
+        # MPEG2.5 8kbps 8kHz：72 * 8000 // 8000 = 72 字节
+        (0, 1, 2, 72, 576 / 8000),
+        # MPEG1 320kbps 48kHz：144 * 320000 // 48000 = 960 字节
+        (3, 14, 1, 960, 1152 / 48000),
+    ],
+)
+def test_frame_size_and_duration_per_version(
+    version, bitrate_index, sample_rate_index, size, seconds
+):
+    data = frame(version, bitrate_index, sample_rate_index, size=size) * 5
+    assert mp3_duration(data) == pytest.approx(5 * seconds)
+
+
+def test_partial_frames_are_counted_once_complete():
+    counter = Mp3DurationCounter()
+    data = frame() * 3
+
+    assert counter.feed(data[:500]) == pytest.approx(MPEG1_FRAME_SECONDS)
+    assert counter.feed(data[500:833]) == pytest.approx(MPEG1_FRAME_SECONDS)
+    assert counter.feed(data[833:834]) == pytest.approx(2 * MPEG1_FRAME_SECONDS)
+    assert counter.feed(data[834:]) == pytest.approx(3 * MPEG1_FRAME_SECONDS)
+
+
+def test_arbitrary_chunking_matches_whole_buffer():
+    data = id3_tag(b"\xff\xfb\x90\xc4" * 50) + frame() * 40 + frame(padding=1, size=418)
+    rng = random.Random(0)
+    for _ in range(20):
+        counter = Mp3DurationCounter()
+        pos = 0
+        while pos < len(data):
+            step = rng.randint(1, 700)
+            counter.feed(data[pos : pos + step])
+            pos += step
+        assert counter.duration == pytest.approx(mp3_duration(data))
+    assert mp3_duration(data) == pytest.approx(41 * MPEG1_FRAME_SECONDS)
+
+
+def test_id3_tag_spanning_chunks_is_skipped():
+    # 标签内容含有效的帧同步字，不跳过会被误算为音频
+    tag = id3_tag(frame() * 3)
+    counter = Mp3DurationCounter()
+    for offset in range(0, len(tag), 7):
+        assert counter.feed(tag[offset : offset + 7]) == 0
+    assert counter.feed(frame() * 2) == pytest.approx(2 * MPEG1_FRAME_SECONDS)
+
+
+def test_resyncs_after_garbage_and_invalid_headers():
+    invalid = [
+        frame(bitrate_index=15),
+        frame(sample_rate_index=3),
+        # version 1 为保留值
+        frame(version=1),
+    ]
+    data = b"junk" + frame() + b"".join(invalid) + b"\x00\xff" + frame()
+    assert mp3_duration(data) == pytest.approx(2 * MPEG1_FRAME_SECONDS)
+
+
+def test_short_input_reports_zero():
+    assert mp3_duration(b"") == 0
+    assert Mp3DurationCounter().feed(b"\xff\xfb") == 0
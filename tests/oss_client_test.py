@@ -0,0 +1,94 @@
+import asyncio_oss
+import pytest
+from asyncio_oss.exceptions import RequestError
+
+from benchmark.fake_services import FakeOSSServer
+from kvidgen.core.config import settings
+from kvidgen.utils.metrics import track_usage
+from kvidgen.utils.oss_client import AliyunOssClient
+
+
+@pytest.fixture
+async def oss_server():
+    async with FakeOSSServer(latency=0) as server:
+        yield server
+
+
+@pytest.fixture
+async def oss_client(oss_server, monkeypatch):
+    monkeypatch.setattr(settings, "OSS_RETRY_BACKOFF", 0)
+    client = AliyunOssClient()
+    monkeypatch.setattr(client, "endpoint", oss_server.base_url)
+    monkeypatch.setattr(client, "_bucket", None)
+    monkeypatch.setattr(client, "_loop", None)
+    yield client
+    await client.shutdown()
+
+
+@pytest.fixture
+def closed(monkeypatch):
+    """记录被关闭的 Bucket。"""
+    buckets = []
+    close = asyncio_oss.Bucket.close
+
+    async def record(bucket):
+        buckets.append(bucket)
+        await close(bucket)
+
+    monkeypatch.setattr(asyncio_oss.Bucket, "close", record)
+    return buckets
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"\x00" * 1024)
+    return str(path)
+
+
+async def test_upload(oss_client, oss_server, video):
+    await oss_client.upload_file(video, "video.mp4")
+    assert oss_server.objects["video.mp4"][0] == 1024
+
+
+async def test_upload_records_each_request_once(oss_client, video):
+    with track_usage() as usage:
+        await oss_client.upload_file(video, "video.mp4")
+
+    # 整体上传不再另计一次外部调用，耗时只按实际请求统计
+    assert list(usage.wall_seconds["call"]) == ["oss.put"]
+
+
+async def test_previous_bucket_is_closed_when_loop_changes(oss_client, video, closed):
+    await oss_client.upload_file(video, "a.mp4")
+    previous = oss_client._bucket
+    # 模拟在另一个事件循环中使用过客户端
+    oss_client._loop = object()
+
+    await oss_client.upload_file(video, "b.mp4")
+
+    assert oss_client._bucket is not previous
+    assert closed == [previous]
+
+
+async def test_bucket_is_closed_after_request_error(oss_client, closed, monkeypatch):
+    monkeypatch.setattr(settings, "OSS_MAX_RETRIES", 1)
+    buckets = []
+
+    async def fail(bucket):
+        buckets.append(bucket)
+        raise RequestError(IOError("connection reset"))
+
+    with pytest.raises(RequestError):
+        await oss_client._request("put", fail)
+
+    assert len(buckets) == 2 and buckets[0] is not buckets[1]
+    assert closed == buckets
+    assert oss_client._bucket is None
+
+
+async def test_shutdown_without_requests(oss_client, closed):
+    bucket = await oss_client._get_bucket()
+    await oss_client.shutdown()
+    assert oss_client._bucket is None
+    assert closed == [bucket]
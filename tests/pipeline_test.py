@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from kvidgen.core.pipline import (
+    DagVideoGenerationPipeline,
+    PipelineStep,
+    VideoGenerationPipeline,
+)
+
+
+def make_step(name, requires=(), provides=(), delay=0.0, error=None, log=None):
+    """构造一个步骤：等待 delay 秒后把 provides 中的键写为“步骤名:输入”。"""
+
+    async def process(self, data):
+        if log is not None:
+            log.append(("start", name))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(("cancelled", name))
+            raise
+        if error is not None:
+            raise error
+        inputs = ",".join(str(data[key]) for key in requires)
+        for key in provides:
+            data[key] = f"{name}({inputs})"
+        if log is not None:
+            log.append(("end", name))
+        return data
+
+    cls = type(
+        name,
+        (PipelineStep,),
+        {"requires": requires, "provides": provides, "process": process},
+    )
+    return cls()
+
+
+def diamond(log=None, delay=0.05):
+    return [
+        make_step("Text", ("request",), ("text",), log=log),
+        make_step("Audio", ("text",), ("audio",), delay, log=log),
+        make_step("Images", ("request",), ("images",), delay, log=log),
+        make_step("Video", ("audio", "images"), ("video",), log=log),
+    ]
+
+
+async def test_independent_steps_run_concurrently():
+    log = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await DagVideoGenerationPipeline(diamond(log, delay=0.1)).run({"request": "r"})
+
+    # 音频与图片步骤互不依赖，总耗时接近单个步骤而非两者之和
+    assert loop.time() - start < 0.18
+    order = [event for event in log if event[0] == "start"]
+    assert order.index(("start", "Images")) < log.index(("end", "Audio"))
+    assert log[-1] == ("end", "Video")
+
+
+async def test_failure_cancels_siblings_and_skips_dependents():
+    log = []
+    steps = [
+        make_step("Slow", ("request",), ("slow",), 1.0, log=log),
+        make_step("Broken", ("request",), ("broken",), 0.01, RuntimeError("x"), log),
+        make_step("After", ("broken",), ("after",), log=log),
+    ]
+    with pytest.raises(RuntimeError, match="x"):
+        await DagVideoGenerationPipeline(steps).run({"request": "r"})
+
+    assert ("cancelled", "Slow") in log
+    assert ("start", "After") not in log
+
+
+async def test_failure_cancels_background_prefetch():
+    prefetch = asyncio.get_running_loop().create_future()
+    steps = [make_step("Broken", ("request",), ("x",), error=RuntimeError("x"))]
+    with pytest.raises(RuntimeError):
+        await DagVideoGenerationPipeline(steps).run(
+            {"request": "r", "download": prefetch}
+        )
+    assert prefetch.cancelled()
+
+
+async def test_cycle_raises_value_error():
+    steps = [
+        make_step("A", ("b",), ("a",)),
+        make_step("B", ("a",), ("b",)),
+    ]
+    with pytest.raises(ValueError, match="cycle"):
+        await DagVideoGenerationPipeline(steps).run({})
+
+
+async def test_missing_requirement_raises_value_error():
+    steps = [make_step("A", ("missing",), ("a",))]
+    with pytest.raises(ValueError, match="missing"):
+        await DagVideoGenerationPipeline(steps).run({})
+
+
+def test_duplicate_provider_raises_value_error():
+    with pytest.raises(ValueError, match="provided by both"):
+        DagVideoGenerationPipeline(
+            [make_step("A", (), ("a",)), make_step("B", (), ("a",))]
+        )
+
+
+async def test_dag_matches_sequential_pipeline():
+    sequential = await VideoGenerationPipeline(diamond()).run({"request": "r"})
+    dag = await DagVideoGenerationPipeline(diamond()).run({"request": "r"})
+
+    assert dag == sequential
+    assert dag["video"] == "Video(Audio(Text(r)),Images(r))"
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from kvidgen.core.config import settings
+from kvidgen.utils.process_pool import ProcessPoolManager
+
+
+@pytest.fixture
+async def pool(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_POOL_ENABLED", True)
+    monkeypatch.setattr(settings, "CPU_POOL_WORKERS", 1)
+    monkeypatch.setattr(settings, "CPU_POOL_MAX_TASKS_PER_CHILD", 0)
+    # 绕过 singleton，每个用例使用独立的进程池与统计
+    manager = type(ProcessPoolManager())()
+    yield manager
+    await manager.shutdown()
+
+
+async def test_runs_in_child_process(pool):
+    pids = {await pool.run(os.getpid) for _ in range(3)}
+
+    assert len(pids) == 1 and os.getpid() not in pids
+    stats = pool.stats()
+    assert (stats["started"], stats["completed"], stats["in_flight"]) == (True, 3, 0)
+
+
+async def test_child_is_replaced_after_max_tasks(pool, monkeypatch):
+    monkeypatch.setattr(settings, "CPU_POOL_MAX_TASKS_PER_CHILD", 1)
+    first = await pool.run(os.getpid)
+    second = await pool.run(os.getpid)
+
+    assert first != second
+
+
+async def test_broken_pool_is_rebuilt(pool):
+    await pool.run(os.getpid)
+    broken = pool._executor
+    with pytest.raises(BrokenProcessPool):
+        # 子进程直接退出，模拟被 OOM 杀死
+        await pool.run(os._exit, 1)
+
+    assert pool._executor is None
+    assert pool.stats()["failed"] == 1
+    assert await pool.run(os.getpid) != os.getpid()
+    assert pool._executor is not broken
+
+
+async def test_shutdown_releases_pool(pool):
+    await pool.run(os.getpid)
+    executor = pool._executor
+    await pool.shutdown()
+
+    assert pool.stats()["started"] is False
+    with pytest.raises(RuntimeError):
+        executor.submit(os.getpid)
+    # 关闭后再次使用时重新创建
+    assert await pool.run(os.getpid) != os.getpid()
+
+
+async def test_disabled_pool_runs_in_thread(pool, monkeypatch):
+    monkeypatch.setattr(settings, "CPU_POOL_ENABLED", False)
+    assert await pool.run(os.getpid) == os.getpid()
+    assert pool.stats()["started"] is False
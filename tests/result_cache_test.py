@@ -0,0 +1,113 @@
+import asyncio
+import fcntl
+import os
+import time
+
+import pytest
+
+from kvidgen.core.config import settings
+from kvidgen.service.result_cache import VideoResultCache
+
+
+@pytest.fixture
+def result_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    # 绕过 singleton，每个用例使用独立目录的新实例
+    return type(VideoResultCache())()
+
+
+def _age(cache: VideoResultCache, fingerprint: str, seconds: float) -> None:
+    written = time.time() - seconds
+    os.utime(cache._entry_path(fingerprint), (written, written))
+
+
+def _producer(result: dict, calls: list):
+    async def produce():
+        calls.append(result)
+        await asyncio.sleep(0.01)
+        return result
+
+    return produce
+
+
+async def test_run_caches_and_coalesces(result_cache):
+    calls = []
+    results = await asyncio.gather(
+        *(
+            result_cache.run("f1", _producer({"object_key": "a"}, calls))
+            for _ in range(3)
+        )
+    )
+    assert results == [{"object_key": "a"}] * 3
+    assert await result_cache.run("f1", _producer({"object_key": "b"}, calls)) == {
+        "object_key": "a"
+    }
+
+    assert len(calls) == 1
+    stats = result_cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 2, 1)
+
+
+async def test_expired_entries_are_removed_on_put(result_cache, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_TTL", 100)
+    for fingerprint in ("old", "fresh"):
+        result_cache.put(fingerprint, {"object_key": fingerprint})
+        open(os.path.join(result_cache.locks_dir, fingerprint), "w").close()
+    _age(result_cache, "old", 200)
+
+    await result_cache.run("new", _producer({"object_key": "new"}, []))
+
+    assert sorted(os.listdir(result_cache.entries_dir)) == ["fresh.json", "new.json"]
+    assert "old" not in os.listdir(result_cache.locks_dir)
+    assert result_cache.stats()["evicted"] == 1
+
+
+async def test_oldest_entries_are_evicted_above_limit(result_cache, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_MAX_ENTRIES", 2)
+    for index in range(3):
+        result_cache.put(f"f{index}", {"object_key": index})
+        _age(result_cache, f"f{index}", 10 - index)
+
+    await result_cache.run("f3", _producer({"object_key": 3}, []))
+
+    assert sorted(os.listdir(result_cache.entries_dir)) == ["f2.json", "f3.json"]
+    assert result_cache.get("f0") is None
+
+
+def test_locked_entries_are_not_removed(result_cache, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_TTL", 100)
+    result_cache.put("busy", {"object_key": "busy"})
+    _age(result_cache, "busy", 200)
+    fd = os.open(os.path.join(result_cache.locks_dir, "busy"), os.O_CREAT | os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        result_cache.collect_garbage()
+        assert os.path.exists(result_cache._entry_path("busy"))
+    finally:
+        os.close(fd)
+
+    result_cache.collect_garbage()
+    assert not os.path.exists(result_cache._entry_path("busy"))
+
+
+async def test_file_lock_relocks_when_lock_file_is_replaced(result_cache):
+    path = os.path.join(result_cache.locks_dir, "f1")
+    fd = os.open(path, os.O_CREAT | os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+    async def waiter():
+        async with result_cache._file_lock("f1"):
+            # 持有的必须是当前路径上的锁文件，其他 worker 才会被互斥
+            probe = os.open(path, os.O_RDWR)
+            try:
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(probe, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            finally:
+                os.close(probe)
+
+    task = asyncio.ensure_future(waiter())
+    await asyncio.sleep(0.1)
+    # 模拟清理：持锁删除锁文件后释放
+    os.remove(path)
+    os.close(fd)
+    await asyncio.wait_for(task, 3)
@@ -0,0 +1,180 @@
+import gzip
+import os
+
+import pytest
+
+from benchmark.fake_services import FakeTTSServer
+from kvidgen.core.audio.mp3 import mp3_duration
+from kvidgen.core.config import settings
+from kvidgen.utils.cache import DiskLRUCache
+from kvidgen.utils.tts_client import TTSClient, TTSError, _parse_ws_response
+
+CHUNKS = ["生命是如此脆弱。", "却又充满希望，" * 3, "请伸出援手！" * 2]
+
+
+@pytest.fixture
+async def tts_server():
+    async with FakeTTSServer(latency=0.01, stream_interval=0) as server:
+        yield server
+
+
+@pytest.fixture
+def tts_client(tts_server, http_client, tmp_path, monkeypatch):
+    client = TTSClient()
+    monkeypatch.setattr(client, "api_url", tts_server.api_url)
+    monkeypatch.setattr(
+        client, "cache", DiskLRUCache(str(tmp_path / "cache"), 1024 * 1024)
+    )
+    monkeypatch.setattr(client, "ws_url", tts_server.ws_url)
+    monkeypatch.setattr(settings, "TTS_RETRY_BACKOFF", 0)
+    return client
+
+
+def _durations(paths):
+    result = []
+    for path in paths:
+        with open(path, "rb") as file:
+            result.append(mp3_duration(file.read()))
+    return result
+
+
+@pytest.mark.parametrize("stream", [False, True])
+async def test_synthesize_chunks_returns_paths_in_order(
+    tts_client, tts_server, tmp_path, stream
+):
+    progress = {}
+    paths = await tts_client.synthesize_chunks(
+        CHUNKS,
+        str(tmp_path),
+        concurrency=2,
+        on_progress=lambda index, seconds: progress.__setitem__(index, seconds),
+        stream=stream,
+    )
+
+    assert paths == [str(tmp_path / f"tts{i}.mp3") for i in range(len(CHUNKS))]
+    durations = _durations(paths)
+    # 替身服务按每秒 5 个字符生成音频，时长与分段长度成正比
+    for chunk, duration in zip(CHUNKS, durations):
+        assert duration == pytest.approx(len(chunk) / 5, abs=0.05)
+    assert progress == pytest.approx(dict(enumerate(durations)))
+    assert tts_server.requests == len(CHUNKS)
+
+
+async def test_synthesize_chunks_retries_server_errors(
+    tts_client, tts_server, tmp_path
+):
+    tts_server.fail_every = 2
+    paths = await tts_client.synthesize_chunks(CHUNKS, str(tmp_path), concurrency=1)
+
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    assert tts_server.requests > len(CHUNKS)
+
+
+async def test_synthesize_chunks_reuses_cache(tts_client, tts_server, tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = await tts_client.synthesize_chunks(CHUNKS, str(tmp_path / "a"))
+    requests = tts_server.requests
+    second = await tts_client.synthesize_chunks(CHUNKS, str(tmp_path / "b"))
+
+    assert tts_server.requests == requests
+    for a, b in zip(first, second):
+        with open(a, "rb") as file_a, open(b, "rb") as file_b:
+            assert file_a.read() == file_b.read()
+
+
+async def test_synthesize_chunks_raises_when_retries_exhausted(
+    tts_client, tts_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "TTS_MAX_RETRIES", 1)
+    tts_server.fail_every = 1
+    with pytest.raises(TTSError):
+        await tts_client.synthesize_chunks(CHUNKS[:1], str(tmp_path))
+    assert tts_server.requests == 2
+
+
+def _ws_message(message_type: int, flags: int, payload: bytes, gzipped=False):
+    header = bytes([0x11, message_type << 4 | flags, 0x10 | gzipped, 0x00])
+    return header + payload
+
+
+def _audio_message(sequence: int, audio: bytes, extra: bytes = b"") -> bytes:
+    payload = sequence.to_bytes(4, "big", signed=True) + len(audio).to_bytes(4, "big")
+    return _ws_message(0xB, 1 if sequence > 0 else 3, payload + audio + extra)
+
+
+def _error_message(code: int, message: bytes, gzipped: bool) -> bytes:
+    body = gzip.compress(message) if gzipped else message
+    payload = code.to_bytes(4, "big") + len(body).to_bytes(4, "big") + body
+    return _ws_message(0xF, 0, payload, gzipped)
+
+
+def test_parse_ws_response_audio_frames():
+    # 不带序号的确认消息
+    assert _parse_ws_response(_ws_message(0xB, 0, b"")) == (b"", False)
+    assert _parse_ws_response(_audio_message(1, b"abc")) == (b"abc", False)
+    assert _parse_ws_response(_audio_message(-2, b"xyz")) == (b"xyz", True)
+    # 只取 size 字段声明的长度
+    assert _parse_ws_response(_audio_message(3, b"abc", b"tail")) == (b"abc", False)
+
+
+def test_parse_ws_response_respects_header_size():
+    # 头长字段为 2（8 字节），音频负载从第 8 字节开始
+    message = _audio_message(1, b"abc")
+    extended = bytes([0x12]) + message[1:4] + b"\x00" * 4 + message[4:]
+    assert _parse_ws_response(extended) == (b"abc", False)
+
+
+def test_parse_ws_response_ignores_unknown_messages():
+    assert _parse_ws_response(_ws_message(0x9, 0, b"{}")) == (b"", False)
+
+
+@pytest.mark.parametrize("gzipped", [False, True])
+@pytest.mark.parametrize("code, retryable", [(3031, True), (3010, False)])
+def test_parse_ws_response_error_frames(gzipped, code, retryable):
+    message = _error_message(code, '{"message": "服务繁忙"}'.encode(), gzipped)
+    with pytest.raises(TTSError) as exc_info:
+        _parse_ws_response(message)
+
+    assert f"code={code}" in str(exc_info.value)
+    assert "服务繁忙" in str(exc_info.value)
+    assert exc_info.value.retryable is retryable
+
+
+async def test_stream_reports_progress_across_partial_mp3_frames(
+    tts_client, tts_server, tmp_path
+):
+    # 7 条消息切分音频，MP3 帧跨消息边界
+    tts_server.stream_frames = 7
+    progress = []
+    path = await tts_client.synthesize(
+        "生命是如此脆弱，却又充满希望。" * 2,
+        str(tmp_path / "tts.mp3"),
+        stream=True,
+        on_progress=progress.append,
+    )
+
+    with open(path, "rb") as file:
+        duration = mp3_duration(file.read())
+    assert len(progress) == 7
+    assert progress == sorted(progress)
+    assert progress[0] < duration
+    assert progress[-1] == pytest.approx(duration)
+
+
+async def test_stream_retries_error_frames(tts_client, tts_server, tmp_path):
+    tts_server.fail_every = 2
+    paths = await tts_client.synthesize_chunks(
+        CHUNKS, str(tmp_path), concurrency=1, stream=True
+    )
+
+    assert _durations(paths) == pytest.approx([len(c) / 5 for c in CHUNKS], abs=0.05)
+    assert tts_server.requests > len(CHUNKS)
+
+
+def test_host_override_applies_to_http_and_websocket():
+    # 绕过 singleton，以指定的 host 构造
+    client = type(TTSClient())(host="tts.example.com")
+    assert client.api_url == "https://tts.example.com/api/v1/tts"
+    assert client.ws_url == "wss://tts.example.com/api/v1/tts/ws_binary"
+    assert type(TTSClient())().ws_url == settings.TTS_WS_URL
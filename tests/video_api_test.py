@@ -0,0 +1,82 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from kvidgen.api.endpoints import video
+from kvidgen.utils.metrics import add_bytes, observe_cpu
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(video.router)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def fake_generate_video(_):
+    return {
+        "video_url": "http://oss/video.mp4",
+        "object_key": "video.mp4",
+        "renditions": {},
+        "render_profile": "720p",
+        "degradations": ["spotlight->grayscale"],
+    }
+
+
+async def test_generate_returns_url_as_data(client, param, monkeypatch):
+    monkeypatch.setattr(video, "generate_video", fake_generate_video)
+    async with client:
+        response = await client.post("/generate", json=param.model_dump())
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "code": 200,
+        "message": "ok",
+        "data": "http://oss/video.mp4",
+    }
+
+
+async def test_generate_with_deadline_reports_render_in_metadata(
+    client, param, monkeypatch
+):
+    monkeypatch.setattr(video, "generate_video", fake_generate_video)
+    payload = param.model_dump()
+    payload["deadline_seconds"] = 60
+    async with client:
+        response = await client.post("/generate", json=payload)
+
+    body = response.json()
+    assert body["data"] == "http://oss/video.mp4"
+    assert body["metadata"] == {
+        "render_profile": "720p",
+        "degradations": ["spotlight->grayscale"],
+    }
+
+
+async def fake_generate_video_with_usage(param):
+    # 管道内的指标钩子累加到端点 track_usage 创建的 ResourceUsage
+    observe_cpu("ffmpeg", "mix", 1.5)
+    add_bytes("oss", "out", 1024)
+    return await fake_generate_video(param)
+
+
+@pytest.mark.parametrize("deadline_seconds", [None, 60])
+async def test_generate_reports_usage_only_when_requested(
+    client, param, monkeypatch, deadline_seconds
+):
+    monkeypatch.setattr(video, "generate_video", fake_generate_video_with_usage)
+    payload = param.model_dump()
+    payload["deadline_seconds"] = deadline_seconds
+    async with client:
+        with_usage = await client.post(
+            "/generate", params={"include_usage": "true"}, json=payload
+        )
+        without_usage = await client.post("/generate", json=payload)
+
+    usage = with_usage.json()["metadata"]["usage"]
+    assert usage["cpu_seconds"] == 1.5
+    assert usage["cpu_seconds_by_step"] == {"other": 1.5}
+    assert usage["bytes_uploaded"] == 1024
+    assert usage["transfer_bytes"] == {"oss": {"out": 1024}}
+    assert "usage" not in (without_usage.json().get("metadata") or {})
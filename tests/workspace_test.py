@@ -0,0 +1,52 @@
+import pytest
+
+from kvidgen.core.audio.audio_mixer import FfmpegAudioMixer
+from kvidgen.core.audio.audio_video import FfmpegAudioVideoMerger
+from kvidgen.core.workspace import Workspace
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    return Workspace(str(tmp_path / "job"))
+
+
+def test_record_and_restore(workspace, tmp_path):
+    path = tmp_path / "mix.m4a"
+    path.write_bytes(b"audio")
+    workspace.record("AudioProcessingStep", {"mixed_audio": str(path)}, ["mixed_audio"])
+
+    restored = Workspace(workspace.path).restore("AudioProcessingStep")
+    assert restored == {"mixed_audio": str(path)}
+
+    path.write_bytes(b"changed")
+    assert Workspace(workspace.path).restore("AudioProcessingStep") is None
+
+
+@pytest.mark.parametrize(
+    "value", [None, "", [], "missing.m4a", [{"path": "missing.jpg"}]]
+)
+def test_record_refuses_missing_artifacts(workspace, value):
+    with pytest.raises(ValueError):
+        workspace.record("AudioProcessingStep", {"mixed_audio": value}, ["mixed_audio"])
+
+    assert Workspace(workspace.path).restore("AudioProcessingStep") is None
+
+
+def test_non_artifact_outputs_may_be_empty(workspace):
+    workspace.record("TextGenerationStep", {"generated_text": None}, [])
+    assert Workspace(workspace.path).restore("TextGenerationStep") == {
+        "generated_text": None
+    }
+
+
+@pytest.mark.parametrize("ffmpeg_path", ["false", "/nonexistent/ffmpeg"])
+def test_ffmpeg_failures_raise(tmp_path, ffmpeg_path):
+    # 绕过 singleton，使用指定的 ffmpeg 路径
+    mixer = type(FfmpegAudioMixer())(ffmpeg_path)
+    merger = FfmpegAudioVideoMerger(ffmpeg_path)
+    output = str(tmp_path / "out")
+
+    with pytest.raises((RuntimeError, FileNotFoundError)):
+        mixer.mix_audio("a.mp3", "b.mp3", output)
+    with pytest.raises((RuntimeError, FileNotFoundError)):
+        merger.merge("v.mp4", "a.m4a", output)